@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from weakref import WeakKeyDictionary
+
+from models import Gorod, Ulica, DomStroenie
+from queries import format_address
+from report_edits import UPSERT_DIALECTS
+
+# Область, к которой относятся новые города (как и раньше при сохранении поставщика)
+DEFAULT_OBLAST_ID = 1
+
+
+def parse_address(text):
+    """Разбирает строку "Город, Улица, Номер дома". При неверном формате - ValueError."""
+    city, street, house = [part.strip() for part in text.split(",", 2)]
+    if not city or not street:
+        raise ValueError("Не указан город или улица")
+    return city, street, int(house)
+
+
+class AddressIndex:
+    """Справочник адресов в памяти: город -> улица -> дом.
+
+    Загружается из базы тремя запросами при первом обращении и дополняется
+    адресами, созданными через resolve(). Используется для поиска id дома без
+    запросов к базе и для автодополнения адреса в форме поставщика.
+    """
+
+    def __init__(self):
+        self._loaded = False
+        self._cities = {}    # (id области, название города) -> id
+        self._streets = {}   # (id города, название улицы) -> id
+        self._houses = {}    # (id улицы, номер дома) -> id
+        self._pending = []   # Записи, созданные в еще не зафиксированной транзакции
+        self._completions = None
+
+    def reload(self, session):
+        self._cities = {
+            (oblast_id, name): city_id
+            for city_id, oblast_id, name in session.query(Gorod.id, Gorod.oblast_id, Gorod.nazvanie)
+        }
+        self._streets = {
+            (city_id, name): street_id
+            for street_id, city_id, name in session.query(Ulica.id, Ulica.gorod_id, Ulica.nazvanie)
+        }
+        self._houses = {
+            (street_id, nomer): house_id
+            for house_id, street_id, nomer in session.query(DomStroenie.id, DomStroenie.ulica_id, DomStroenie.nomer)
+        }
+        self._pending = []
+        self._completions = None
+        self._loaded = True
+
+    def invalidate(self):
+        # Справочник будет перечитан из базы при следующем обращении
+        self._loaded = False
+
+    def ensure_loaded(self, session):
+        if not self._loaded:
+            self.reload(session)
+
+    def completions(self, session):
+        """Все известные адреса и пары "Город, Улица, " для автодополнения (отсортированы)."""
+        self.ensure_loaded(session)
+        if self._completions is None:
+            city_names = {city_id: name for (oblast_id, name), city_id in self._cities.items()}
+            street_names = {
+                street_id: (city_names.get(city_id), name) for (city_id, name), street_id in self._streets.items()
+            }
+            items = {f"{city}, {street}, " for city, street in street_names.values() if city}
+            for (street_id, nomer) in self._houses:
+                city, street = street_names.get(street_id, (None, None))
+                if city:
+                    items.add(format_address(city, street, nomer))
+            self._completions = sorted(items, key=str.lower)
+        return self._completions
+
+    @contextmanager
+    def transaction(self, session):
+        """Сохранение адреса и связанных с ним данных одной транзакцией.
+
+        При ошибке транзакция откатывается, и созданные в ней адреса не попадают в справочник.
+        """
+        try:
+            yield
+            session.commit()
+        except Exception:
+            session.rollback()
+            self._pending = []
+            raise
+        for mapping, key, value in self._pending:
+            mapping[key] = value
+        if self._pending:
+            self._completions = None
+        self._pending = []
+
+    def resolve(self, session, city, street, house):
+        """Возвращает id дома по адресу, создавая недостающие город, улицу и дом.
+
+        Уже известные уровни адреса берутся из справочника без запросов к базе.
+        Изменения не фиксируются: вызывайте внутри transaction().
+        """
+        self.ensure_loaded(session)
+        city_id = self._get_or_create(
+            session, self._cities, (DEFAULT_OBLAST_ID, city), Gorod, ["oblast_id", "nazvanie"],
+            {"nazvanie": city, "sok_nazvanie": city[:3], "oblast_id": DEFAULT_OBLAST_ID},
+        )
+        street_id = self._get_or_create(
+            session, self._streets, (city_id, street), Ulica, ["gorod_id", "nazvanie"],
+            {"gorod_id": city_id, "nazvanie": street},
+        )
+        return self._get_or_create(
+            session, self._houses, (street_id, house), DomStroenie, ["ulica_id", "nomer"],
+            {"ulica_id": street_id, "nomer": house},
+        )
+
+    def _get_or_create(self, session, mapping, key, model, key_columns, values):
+        record_id = mapping.get(key)
+        if record_id is None:
+            record_id = next((value for m, k, value in self._pending if m is mapping and k == key), None)
+        if record_id is not None:
+            return record_id
+
+        table = model.__table__
+        insert = UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+        query = session.query(model.id).filter_by(**{column: values[column] for column in key_columns})
+        if insert is not None:
+            # Запись, уже созданная другим пользователем, не вызывает ошибку: при конфликте
+            # RETURNING ничего не возвращает, и id читается запросом. DO NOTHING не меняет
+            # существующую строку, поэтому не срабатывают триггеры updated_at и outbox реплики
+            stmt = insert(table).values(**values).on_conflict_do_nothing(index_elements=key_columns)
+            record_id = session.execute(stmt.returning(table.c.id)).scalar()
+            if record_id is None:
+                record_id = query.scalar()
+        else:
+            record_id = query.scalar()
+            if record_id is None:
+                record_id = session.execute(table.insert().values(**values).returning(table.c.id)).scalar_one()
+        self._pending.append((mapping, key, record_id))
+        return record_id
+
+
+# Справочники адресов по базам: {движок: AddressIndex}. id сервера и реплики различаются,
+# поэтому у каждой базы свой справочник
+_address_indexes = WeakKeyDictionary()
+
+
+def address_index(session):
+    """Справочник адресов базы, к которой подключена session."""
+    bind = session.get_bind()
+    index = _address_indexes.get(bind)
+    if index is None:
+        index = _address_indexes[bind] = AddressIndex()
+    return index
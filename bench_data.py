@@ -0,0 +1,163 @@
+"""Детерминированные тестовые данные для замеров производительности.
+
+Заполняет пустую базу товарами, поставщиками, адресами, сотрудниками, тремя
+таблицами отчетов и итогами движения товара. Одинаковые scale и seed всегда дают
+одинаковые данные.
+
+    python bench_data.py --scale 100k --url sqlite:///bench_100k.sqlite
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, select, text
+
+from migrations import rebuild_stock_movement
+from models import (
+    Base, Oblast, Gorod, Ulica, DomStroenie, Postavshik, TipPostavshika, Tovar, TipTovara, Sotrudnik, Pol,
+    OtchetyPoPostuplenijuTovarov, OtchetyPoOstatkamTovarov, OtchetyPoUbytomuTovaru
+)
+
+# Размеры наборов данных: количество товаров и записей в каждой таблице отчетов
+SCALES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+# Отчеты распределены по REPORT_DAYS дням, начиная с BASE_DATE
+BASE_DATE = date(2025, 4, 1)
+REPORT_DAYS = 30
+
+# Сколько строк вставляется одним executemany
+BATCH_SIZE = 10_000
+
+CITY_NAMES = ["Москва", "Казань", "Тверь", "Сочи", "Омск", "Пермь", "Самара", "Тула"]
+STREET_NAMES = ["Ленина", "Мира", "Садовая", "Лесная", "Школьная", "Центральная", "Полевая"]
+
+
+def _insert(connection, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+
+
+def _report_key(index, products):
+    # (дата, id товара) без повторов: за каждый день отчеты идут по сдвинутому диапазону товаров
+    day = index % REPORT_DAYS
+    per_day = max(1, products // REPORT_DAYS)
+    return BASE_DATE + timedelta(days=day), (index // REPORT_DAYS + day * per_day) % products + 1
+
+
+def generate(connection, rows, seed=0):
+    """Заполняет пустые таблицы; rows - количество товаров и записей каждого отчета."""
+    rnd = random.Random(seed)
+    suppliers = max(1, rows // 20)
+    streets = max(1, suppliers // 10)
+    cities = max(1, streets // 10)
+    employees = max(1, rows // 100)
+
+    _insert(connection, Oblast.__table__, [{"id": 1, "nazvanie": "Московская"}])
+    _insert(connection, Gorod.__table__, (
+        {"id": i, "nazvanie": f"{CITY_NAMES[i % len(CITY_NAMES)]} {i}",
+         "sok_nazvanie": CITY_NAMES[i % len(CITY_NAMES)][:3], "oblast_id": 1}
+        for i in range(1, cities + 1)
+    ))
+    _insert(connection, Ulica.__table__, (
+        {"id": i, "nazvanie": f"{STREET_NAMES[i % len(STREET_NAMES)]} {i}", "gorod_id": i % cities + 1}
+        for i in range(1, streets + 1)
+    ))
+    # По одному дому (юридическому адресу) на поставщика
+    _insert(connection, DomStroenie.__table__, (
+        {"id": i, "nomer": i // streets + 1, "ulica_id": i % streets + 1}
+        for i in range(1, suppliers + 1)
+    ))
+    supplier_types = list(TipPostavshika)
+    _insert(connection, Postavshik.__table__, (
+        {"id": i, "nazvanie_postavshika": f"Поставщик {i}", "tip_postavshika": rnd.choice(supplier_types),
+         "kontakt_tel": f"+7900{i:07d}", "email": f"supplier{i}@example.com", "juridicheskij_adres": i}
+        for i in range(1, suppliers + 1)
+    ))
+    product_types = list(TipTovara)
+    _insert(connection, Tovar.__table__, (
+        {"id": i, "nazvanie": rnd.choice(product_types), "nomer": i, "opisanie": f"Товар {i}",
+         "cena": rnd.randint(100, 10_000), "postavshik_id": rnd.randint(1, suppliers)}
+        for i in range(1, rows + 1)
+    ))
+    _insert(connection, Sotrudnik.__table__, (
+        {"id": i, "familiya": f"Фамилия {i}", "imya": f"Имя {i}", "pol": rnd.choice([Pol.M, Pol.J])}
+        for i in range(1, employees + 1)
+    ))
+
+    arrival, stock, loss = [], [], []
+    for i in range(rows):
+        day, product_id = _report_key(i, rows)
+        arrival.append({
+            "id": i + 1, "data_postuplenija": day, "kolithestvo_postupivshih_tovarov": rnd.randint(1, 100),
+            "data_formirovaniya_otcheta": day, "tovar_id": product_id, "postavshik_id": rnd.randint(1, suppliers),
+        })
+        stock.append({
+            "id": i + 1, "kolithestvo_tovara": rnd.randint(0, 500), "data_formirovaniya_otcheta": day,
+            "tovar_id": product_id, "srok_godnosti": day + timedelta(days=1 + i % REPORT_DAYS),
+        })
+        loss.append({
+            "id": i + 1, "data_ubytija": day, "kolithestvo_ubytogo_tovara": rnd.randint(1, 10),
+            "data_formirovaniya_otcheta": day, "tovar_id": product_id,
+        })
+        if len(arrival) == BATCH_SIZE:
+            _flush_reports(connection, arrival, stock, loss)
+    _flush_reports(connection, arrival, stock, loss)
+    # Дневные итоги движения товара: в базе без миграций их не ведут триггеры
+    rebuild_stock_movement(connection)
+
+    if connection.dialect.name == "postgresql":
+        # id заданы явно, поэтому последовательности нужно сдвинуть за последние значения
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c:
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+                ))
+
+
+def _flush_reports(connection, arrival, stock, loss):
+    for table, batch in (
+        (OtchetyPoPostuplenijuTovarov.__table__, arrival),
+        (OtchetyPoOstatkamTovarov.__table__, stock),
+        (OtchetyPoUbytomuTovaru.__table__, loss),
+    ):
+        if batch:
+            connection.execute(table.insert(), batch)
+            batch.clear()
+
+
+def prepare_database(engine, rows, seed=0):
+    """Создает схему и заполняет базу, если в ней еще нет товаров. Уже заполненная база не меняется."""
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(Tovar.__table__)).scalar():
+            return False
+        generate(connection, rows, seed)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение базы тестовыми данными для замеров")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--url", default="sqlite:///bench.sqlite", help="Строка подключения к пустой базе")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    engine = create_engine(args.url)
+    if prepare_database(engine, SCALES[args.scale], args.seed):
+        print(f"База заполнена: {SCALES[args.scale]} товаров и записей каждого отчета.")
+    else:
+        print("В базе уже есть товары, данные не добавлены.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import enum
+
+from PySide6.QtCore import QObject, Signal
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class ChangeKind(enum.Enum):
+    INSERTED = "inserted"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+
+class RowChange:
+    """Изменение одной строки таблицы базы данных: имя таблицы, вид изменения и первичный ключ.
+
+    bind - движок базы, в которой зафиксировано изменение (задается при отправке сигнала).
+    """
+
+    __slots__ = ("table", "kind", "key", "bind")
+
+    def __init__(self, table, kind, key, bind=None):
+        self.table = table
+        self.kind = kind
+        self.key = key
+        self.bind = bind
+
+    def __repr__(self):
+        return f"RowChange({self.table!r}, {self.kind.value}, {self.key!r})"
+
+
+class ChangeNotifier(QObject):
+    # Список RowChange одной зафиксированной транзакции. Сигнал отправляется после commit
+    # из потока, где он выполнен; обработчики в GUI-потоке получают его через очередь событий
+    rows_changed = Signal(object)
+
+
+notifier = ChangeNotifier()
+
+
+def record_changes(session, table, kind, keys):
+    """Добавляет изменения, сделанные в обход ORM (например, пакетным DELETE), к текущей транзакции."""
+    changes = session.info.setdefault("row_changes", [])
+    changes.extend(RowChange(table, kind, key) for key in keys)
+
+
+def _primary_key(instance):
+    state = inspect(instance)
+    key = state.mapper.primary_key_from_instance(instance)
+    return key[0] if len(key) == 1 else tuple(key)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # Списки new/dirty/deleted здесь еще в состоянии до flush, а первичные ключи уже назначены
+    changes = session.info.setdefault("row_changes", [])
+    for instance in session.new:
+        changes.append(RowChange(instance.__table__.name, ChangeKind.INSERTED, _primary_key(instance)))
+    for instance in session.dirty:
+        if session.is_modified(instance, include_collections=False):
+            changes.append(RowChange(instance.__table__.name, ChangeKind.UPDATED, _primary_key(instance)))
+    for instance in session.deleted:
+        changes.append(RowChange(instance.__table__.name, ChangeKind.DELETED, _primary_key(instance)))
+
+
+@event.listens_for(Session, "after_commit")
+def _emit_changes(session):
+    changes = session.info.pop("row_changes", None)
+    if changes:
+        bind = session.get_bind()
+        for change in changes:
+            change.bind = bind
+        notifier.rows_changed.emit(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    session.info.pop("row_changes", None)
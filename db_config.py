@@ -0,0 +1,136 @@
+"""Настройки подключения к базе данных.
+
+Значения берутся по порядку: встроенные значения по умолчанию, файл database.ini
+(путь можно изменить переменной DB_CONFIG), переменные окружения. Пример файла:
+
+    [database]
+    url = sqlite:///flowers.sqlite
+    echo = false
+    timing = false
+    slow_query_ms = 200
+    slow_query_log = slow_queries.log
+    diagnostics = false
+
+    [pool]
+    pool_size = 5
+    max_overflow = 10
+
+    [sqlite]
+    journal_mode = WAL
+    synchronous = NORMAL
+
+    [replica]
+    path = replica.sqlite
+    sync_interval = 60
+
+Переменные окружения: DATABASE_URL, DB_ECHO, DB_TIMING, DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG,
+DB_DIAGNOSTICS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_REPLICA,
+DB_SYNC_INTERVAL.
+"""
+import configparser
+import os
+
+DEFAULT_DATABASE_URL = "postgresql://postgres:1@localhost:5433/postgres"
+CONFIG_FILE = "database.ini"
+DEFAULT_SYNC_INTERVAL = 60  # Секунды между синхронизациями локальной реплики
+DEFAULT_SLOW_QUERY_MS = 200  # Запросы дольше этого попадают в журнал медленных запросов
+DEFAULT_SLOW_QUERY_LOG = "slow_queries.log"
+
+# Настройки пула соединений
+DEFAULT_POOL_SETTINGS = {
+    "pool_size": 5,          # Количество постоянно открытых соединений
+    "max_overflow": 10,      # Дополнительные соединения сверх pool_size
+    "pool_pre_ping": True,   # Проверка соединения перед выдачей из пула
+    "pool_recycle": 1800,    # Пересоздание соединений старше 30 минут
+}
+
+# PRAGMA для каждого нового соединения SQLite: WAL позволяет читать во время записи
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",    # В режиме WAL надежно и без fsync на каждый commit
+    "foreign_keys": "ON",       # Как в PostgreSQL: ссылки проверяются
+    "busy_timeout": "5000",     # Ожидание блокировки другим процессом, мс
+    "cache_size": "-20000",     # Кэш страниц около 20 МБ
+    "temp_store": "MEMORY",
+}
+
+ENV_POOL_SETTINGS = {
+    "DB_POOL_SIZE": "pool_size",
+    "DB_MAX_OVERFLOW": "max_overflow",
+    "DB_POOL_RECYCLE": "pool_recycle",
+    "DB_POOL_PRE_PING": "pool_pre_ping",
+}
+
+TRUE_VALUES = {"1", "true", "yes", "on", "да"}
+
+
+def _convert(value, default):
+    # Значение из файла или окружения приводится к типу значения по умолчанию
+    if isinstance(default, bool):
+        return value.strip().lower() in TRUE_VALUES
+    if isinstance(default, int):
+        return int(value)
+    return value
+
+
+class DatabaseConfig:
+    """Строка подключения, настройки пула, PRAGMA для SQLite, замеры запросов и локальная реплика."""
+
+    def __init__(self, url=DEFAULT_DATABASE_URL, pool=None, sqlite_pragmas=None, echo=False, timing=False,
+                 replica_path=None, sync_interval=DEFAULT_SYNC_INTERVAL, slow_query_ms=DEFAULT_SLOW_QUERY_MS,
+                 slow_query_log=DEFAULT_SLOW_QUERY_LOG, diagnostics=False):
+        self.url = url
+        self.pool = dict(DEFAULT_POOL_SETTINGS if pool is None else pool)
+        self.sqlite_pragmas = dict(DEFAULT_SQLITE_PRAGMAS if sqlite_pragmas is None else sqlite_pragmas)
+        self.echo = echo        # Вывод SQL-запросов (echo движка SQLAlchemy)
+        self.timing = timing    # Вывод времени выполнения каждого запроса
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log    # Файл журнала медленных запросов; пусто - не вести
+        self.diagnostics = diagnostics          # Пункт "Диагностика запросов" в меню учетной записи
+        self.replica_path = replica_path    # Файл локальной реплики; None - работа напрямую с сервером
+        self.sync_interval = sync_interval
+
+
+def load_database_config(path=None, environ=None):
+    environ = os.environ if environ is None else environ
+    path = path or environ.get("DB_CONFIG", CONFIG_FILE)
+    config = DatabaseConfig()
+
+    parser = configparser.ConfigParser()
+    if parser.read(path, encoding="utf-8"):
+        if parser.has_section("database"):
+            section = parser["database"]
+            config.url = section.get("url", config.url)
+            config.echo = _convert(section.get("echo", str(config.echo)), False)
+            config.timing = _convert(section.get("timing", str(config.timing)), False)
+            config.slow_query_ms = section.getint("slow_query_ms", config.slow_query_ms)
+            config.slow_query_log = section.get("slow_query_log", config.slow_query_log)
+            config.diagnostics = _convert(section.get("diagnostics", str(config.diagnostics)), False)
+        if parser.has_section("pool"):
+            for key, value in parser["pool"].items():
+                config.pool[key] = _convert(value, DEFAULT_POOL_SETTINGS.get(key, 0))
+        if parser.has_section("sqlite"):
+            config.sqlite_pragmas.update(parser["sqlite"])
+        if parser.has_section("replica"):
+            config.replica_path = parser["replica"].get("path") or None
+            config.sync_interval = parser["replica"].getint("sync_interval", config.sync_interval)
+
+    config.url = environ.get("DATABASE_URL", config.url)
+    if "DB_ECHO" in environ:
+        config.echo = _convert(environ["DB_ECHO"], False)
+    if "DB_TIMING" in environ:
+        config.timing = _convert(environ["DB_TIMING"], False)
+    if "DB_SLOW_QUERY_MS" in environ:
+        config.slow_query_ms = int(environ["DB_SLOW_QUERY_MS"])
+    if "DB_SLOW_QUERY_LOG" in environ:
+        config.slow_query_log = environ["DB_SLOW_QUERY_LOG"]
+    if "DB_DIAGNOSTICS" in environ:
+        config.diagnostics = _convert(environ["DB_DIAGNOSTICS"], False)
+    if "DB_REPLICA" in environ:
+        config.replica_path = environ["DB_REPLICA"] or None
+    if "DB_SYNC_INTERVAL" in environ:
+        config.sync_interval = int(environ["DB_SYNC_INTERVAL"])
+    for variable, key in ENV_POOL_SETTINGS.items():
+        if variable in environ:
+            config.pool[key] = _convert(environ[variable], DEFAULT_POOL_SETTINGS[key])
+    return config
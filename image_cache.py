@@ -0,0 +1,162 @@
+from collections import OrderedDict
+import os
+import threading
+import uuid
+
+from PySide6.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QPixmap
+
+CACHE_DIR = "thumbnail_cache"
+MEMORY_LIMIT = 32 * 1024 * 1024   # Байт в памяти (оценка по размеру пикселей)
+DISK_LIMIT = 128 * 1024 * 1024    # Байт в каталоге кэша
+
+
+def pixmap_from_bytes(data, size=None):
+    # Декодирование изображения прямо из байтов, без временных файлов
+    pixmap = QPixmap()
+    if not data or not pixmap.loadFromData(data):
+        return None
+    if size:
+        pixmap = pixmap.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return pixmap
+
+def image_to_bytes(image, fmt="JPG"):
+    # Кодирование QImage/QPixmap в байты (например, для сохранения в базу данных)
+    buffer_data = QByteArray()
+    buffer = QBuffer(buffer_data)
+    buffer.open(QIODevice.WriteOnly)
+    ok = image.save(buffer, fmt)
+    buffer.close()
+    return bytes(buffer_data.data()) if ok else None
+
+
+class ThumbnailCache:
+    """LRU-кэш миниатюр товаров: в памяти и в каталоге на диске.
+
+    Ключ - id товара, хэш изображения (Tovar.kartinka_hash) и размер миниатюры,
+    поэтому после замены изображения старая миниатюра просто перестает использоваться.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_limit=MEMORY_LIMIT, disk_limit=DISK_LIMIT):
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None  # Считается при первом обращении к диску
+        self._lock = threading.Lock()
+
+    def get(self, product_id, image_hash, loader, size):
+        """Возвращает миниатюру; loader() вызывается, только если ее нет ни в памяти, ни на диске."""
+        if not image_hash:
+            return None
+        key = (product_id, image_hash, size)
+        with self._lock:
+            pixmap = self._memory.get(key)
+            if pixmap is not None:
+                self._memory.move_to_end(key)
+                return pixmap
+
+        pixmap = self._read_disk(key)
+        if pixmap is None:
+            pixmap = pixmap_from_bytes(loader(), size)
+            if pixmap is None:
+                return None
+            self._write_disk(key, pixmap)
+        self._remember(key, pixmap)
+        return pixmap
+
+    def invalidate(self, product_id):
+        # Удаляем из памяти все миниатюры товара (файлы на диске вытеснятся по размеру)
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == product_id]:
+                self._memory_size -= self._pixmap_size(self._memory.pop(key))
+
+    # --- Память ---
+
+    @staticmethod
+    def _pixmap_size(pixmap):
+        return pixmap.width() * pixmap.height() * 4
+
+    def _remember(self, key, pixmap):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = pixmap
+            self._memory_size += self._pixmap_size(pixmap)
+            while self._memory_size > self.memory_limit and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= self._pixmap_size(evicted)
+
+    # --- Диск ---
+
+    def _path(self, key):
+        product_id, image_hash, size = key
+        return os.path.join(self.cache_dir, f"{product_id}_{image_hash}_{size}.png")
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Отмечаем файл как недавно использованный
+        except OSError:
+            return None
+        return pixmap_from_bytes(data)
+
+    def _write_disk(self, key, pixmap):
+        data = image_to_bytes(pixmap, "PNG")
+        if not data:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            # Уникальное имя временного файла: несколько окон не мешают друг другу
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Ошибка записи миниатюры в кэш: {str(e)}")
+            return
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += len(data)
+            if self._disk_size > self.disk_limit:
+                self._evict_disk()
+
+    def _cache_files(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            if not name.endswith(".png"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_disk_size(self):
+        return sum(size for _, size, _ in self._cache_files())
+
+    def _evict_disk(self):
+        # Удаляем самые давно использованные файлы, пока не уложимся в лимит
+        for _, size, path in sorted(self._cache_files()):
+            if self._disk_size <= self.disk_limit:
+                break
+            try:
+                os.remove(path)
+                self._disk_size -= size
+            except OSError:
+                pass
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,204 @@
+"""Замеры SQL-запросов по экранам приложения.
+
+Обработчики before_cursor_execute/after_cursor_execute движка записывают время
+каждого запроса, число строк и экран, с которого он выполнен (экран задается
+в GUI-потоке через set_screen()/query_screen() и передается фоновым задачам,
+см. workers.Job). По этим данным:
+
+- медленные запросы (дольше DB_CONFIG.slow_query_ms) пишутся в файл с ротацией;
+- панель диагностики показывает число запросов и p50/p95 по экранам;
+- для отмеченных экранов запоминаются последние запросы, чтобы выполнить для них
+  EXPLAIN (в PostgreSQL - EXPLAIN ANALYZE).
+"""
+from collections import deque
+from contextlib import contextmanager
+import logging
+from logging.handlers import RotatingFileHandler
+import threading
+import time
+
+from sqlalchemy import event
+
+DEFAULT_SCREEN = "Прочее"
+SAMPLE_SIZE = 2000          # Последние замеры экрана, по которым считаются p50/p95
+CAPTURE_SIZE = 50           # Запросы экрана, запоминаемые для EXPLAIN
+SLOW_LOG_MAX_BYTES = 1_000_000
+SLOW_LOG_BACKUPS = 3
+
+_state = threading.local()
+_lock = threading.Lock()
+
+slow_query_logger = logging.getLogger("slow_queries")
+slow_query_logger.propagate = False
+
+
+def current_screen():
+    return getattr(_state, "screen", None) or DEFAULT_SCREEN
+
+
+def set_screen(name):
+    """Экран, которому приписываются запросы текущего потока."""
+    _state.screen = name
+
+
+@contextmanager
+def query_screen(name):
+    previous = getattr(_state, "screen", None)
+    _state.screen = name
+    try:
+        yield
+    finally:
+        _state.screen = previous
+
+
+def percentile(values, percent):
+    # Ближайший ранг по отсортированным значениям
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+
+class ScreenStats:
+    """Счетчики запросов одного экрана."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.timings = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, elapsed, rows, slow):
+        self.count += 1
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        self.rows += max(rows, 0)
+        self.slow += slow
+        self.timings.append(elapsed)
+
+    @property
+    def p50(self):
+        return percentile(self.timings, 50)
+
+    @property
+    def p95(self):
+        return percentile(self.timings, 95)
+
+
+class QueryMonitor:
+    """Статистика запросов по экранам, журнал медленных запросов и запросы для EXPLAIN."""
+
+    def __init__(self, slow_query_ms=200, print_queries=False):
+        self.slow_query_ms = slow_query_ms
+        self.print_queries = print_queries  # Вывод каждого запроса (DB_TIMING)
+        self.stats = {}
+        self.explain_screens = set()
+        self.captured = {}
+
+    def set_log_file(self, path):
+        for handler in list(slow_query_logger.handlers):
+            slow_query_logger.removeHandler(handler)
+            handler.close()
+        if path:
+            handler = RotatingFileHandler(
+                path, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding="utf-8", delay=True
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.INFO)
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Время начала хранится в контексте выполнения: при ошибке запроса оно уходит вместе с ним
+        context._query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - context._query_start) * 1000
+        if getattr(_state, "explaining", False):
+            return
+        screen = current_screen()
+        # Для SELECT драйвер SQLite число строк не сообщает (-1)
+        rows = cursor.rowcount
+        slow = elapsed >= self.slow_query_ms
+        with _lock:
+            self.stats.setdefault(screen, ScreenStats()).add(elapsed, rows, slow)
+            if screen in self.explain_screens and not executemany and _is_select(statement):
+                self.captured.setdefault(screen, deque(maxlen=CAPTURE_SIZE)).append((statement, parameters))
+        text = " ".join(statement.split())
+        if slow:
+            slow_query_logger.info(
+                "%.1f мс, строк: %s, экран: %s: %s; параметры: %.200r",
+                elapsed, rows if rows >= 0 else "н/д", screen, text, parameters
+            )
+        if self.print_queries:
+            print(f"Запрос выполнен за {elapsed:.1f} мс ({screen}): {text[:200]}")
+
+    def snapshot(self):
+        """Строки для панели диагностики: (экран, ScreenStats), экраны по убыванию общего времени."""
+        with _lock:
+            return sorted(self.stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+
+    def reset(self):
+        with _lock:
+            self.stats.clear()
+            self.captured.clear()
+
+    def set_explain(self, screen, enabled):
+        with _lock:
+            if enabled:
+                self.explain_screens.add(screen)
+            else:
+                self.explain_screens.discard(screen)
+                self.captured.pop(screen, None)
+
+    def explain(self, engine, screen):
+        """Планы запомненных запросов экрана: список пар (запрос, план)."""
+        with _lock:
+            statements = list(dict.fromkeys(
+                (statement, _hashable(parameters)) for statement, parameters in self.captured.get(screen, ())
+            ))
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN "
+        plans = []
+        _state.explaining = True
+        try:
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    result = connection.exec_driver_sql(prefix + statement, _unhashable(parameters))
+                    plan = "\n".join(" ".join(str(value) for value in row) for row in result)
+                    # EXPLAIN ANALYZE выполняет запрос; изменения не сохраняем
+                    connection.rollback()
+                    plans.append((statement, plan))
+        finally:
+            _state.explaining = False
+        return plans
+
+
+def _is_select(statement):
+    return statement.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+def _hashable(parameters):
+    # Параметры драйвера - кортеж или словарь; для отбора повторов нужен хешируемый вид
+    if isinstance(parameters, dict):
+        return ("dict", tuple(sorted(parameters.items())))
+    return ("tuple", tuple(parameters or ()))
+
+
+def _unhashable(parameters):
+    kind, values = parameters
+    return dict(values) if kind == "dict" else values
+
+
+monitor = QueryMonitor()
+
+
+def configure(config):
+    """Настройки замеров из DatabaseConfig."""
+    monitor.slow_query_ms = config.slow_query_ms
+    monitor.print_queries = config.timing
+    monitor.set_log_file(config.slow_query_log)
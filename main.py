@@ -1,5 +1,14 @@
+import os
+import sys
+
 from PySide6.QtWidgets import  QApplication
 from main_window import AuthWindow
+from profiling import profiler, profile_directory
+
+# --profile[=каталог] или APP_PROFILE: профили действий пользователя (см. profiling.py)
+profile_dir = profile_directory(sys.argv[1:], os.environ)
+if profile_dir:
+    profiler.enable(profile_dir)
 
 app = QApplication([])
 window = AuthWindow()
@@ -2,24 +2,69 @@ import sys
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QLabel, QLineEdit, QPushButton, QVBoxLayout, QWidget, QMessageBox, 
     QTabWidget, QTableWidget, QTableWidgetItem, QHBoxLayout, QDialog, QFormLayout, QComboBox, 
-    QSpinBox, QFileDialog, QMenu, QTabBar, QDateEdit
+    QSpinBox, QFileDialog, QMenu, QTabBar, QDateEdit, QTableView, QProgressDialog, QCompleter, QInputDialog,
+    QAbstractItemView, QCheckBox, QPlainTextEdit
 )
-from PySide6.QtCore import Qt, QDate, QSize, QEvent, QPoint, QRegularExpression, QLocale
-from PySide6.QtGui import QIcon, QPixmap, QAction, QIntValidator, QRegularExpressionValidator
+from PySide6.QtCore import Qt, QDate, QSize, QEvent, QPoint, QRegularExpression, QLocale, QTimer
+from PySide6.QtGui import QIcon, QPixmap, QAction, QIntValidator, QRegularExpressionValidator, QColor
 import hashlib
-from datetime import datetime
+from datetime import date, datetime
 from models import (
     Postavshik, TipPostavshika, Tovar, TipTovara, Sotrudnik, Pol, 
-    OtchetyPoPostuplenijuTovarov, OtchetyPoOstatkamTovarov, OtchetyPoUbytomuTovaru, Gorod, Ulica, DomStroenie, Connect
+    OtchetyPoPostuplenijuTovarov, OtchetyPoOstatkamTovarov, OtchetyPoUbytomuTovaru, ZakazTovara, Connect, DB_CONFIG
 )
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from queries import (
+    suppliers_query, products_query, employees_query, SUPPLIER_COLUMNS, PRODUCT_COLUMNS, EMPLOYEE_COLUMNS,
+    get_supplier, get_product, load_product_image, report_products, arrival_reports_by_product,
+    loss_report_rows, order_rows_by_product, delete_rows, expiring_stock_query
+)
+from table_models import KeysetTableModel, SortFilterProxyModel
+from image_cache import thumbnail_cache, pixmap_from_bytes, image_to_bytes
+from workers import run_in_background
+from report_writer import register_fonts
+from report_templates import (
+    ARRIVAL_REPORT, STOCK_REPORT, ORDER_CONVERSION_REPORT, EXPIRING_REPORT, GENERAL_ACCOUNTING_REPORT,
+    INVOICE_REPORT, SPECIFICATION_REPORT, EXPIRY_WARNING_DAYS
+)
+from report_edits import ReportChangeSet, delete_reports
+from change_events import notifier, ChangeKind
+from address_service import address_index, parse_address
+from report_grid import ReportGridController, ReportGridStrategy
+from replica import open_replica
+from search import search_filter, invalidate_prefix_index, SEARCH_COLUMNS
+from stock_ledger import stock_on_hand, stock_expiry, parse_expiry
+from order_model import OrderConversion, DISCOUNT_TEXT
+from instrumentation import monitor as query_monitor, set_screen, current_screen
+from profiling import profiler
 import os
+import time
+
+# Названия экранов отчетов в статистике запросов
+REPORT_SCREENS = {
+    "arrival": "Отчет по поступлению товаров",
+    "stock": "Отчет по остаткам товаров",
+    "loss": "Отчет по убытию товаров",
+    "expiring": "Истекающий срок годности",
+    "order_conversion": "Бланк заказа",
+}
+
+def pdf_page_callback(job):
+    # Вызывается ReportLab после каждой страницы: сообщает прогресс и прерывает сборку при отмене
+    def on_page(canvas, doc):
+        job.report_progress(doc.page)
+        job.check_cancelled()
+    return on_page
+
+# Подсветка измененных, но еще не сохраненных ячеек отчета
+DIRTY_CELL_COLOR = QColor("#FFE4B5")
+# Задержка автосохранения правок отчета после последнего изменения (мс)
+REPORT_SAVE_DELAY = 1500
+# Задержка синхронизации реплики после локального изменения, мс
+SYNC_DELAY = 2000
+# Если синхронизация изменила больше строк таблицы, таблица перезагружается целиком
+SYNC_RELOAD_THRESHOLD = 500
+# Пауза после ввода в строку поиска перед выполнением запроса, мс
+SEARCH_DELAY = 250
 
 # Пользователи и их хэшированные пароли
 USERS = {
@@ -82,7 +127,7 @@ class ResizableSidebar(QWidget):
             print("Изменение размера панели завершено.")
 
 class SupplierForm(QWidget):
-    def __init__(self, parent=None, supplier=None):
+    def __init__(self, parent=None, supplier=None, addresses=()):
         super().__init__(parent)
         self.setObjectName("formWidget")
         self.supplier = supplier
@@ -131,6 +176,11 @@ class SupplierForm(QWidget):
                 f"{supplier.juridicheskij_adres_rel.nomer}"
             )
             self.address_input.setText(address_str)
+        # Автодополнение по справочнику адресов в памяти (список отсортирован, поиск без запросов к базе)
+        completer = QCompleter(list(addresses), self)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
+        self.address_input.setCompleter(completer)
         layout.addRow("Юридический адрес:", self.address_input)
 
         buttons_layout = QHBoxLayout()
@@ -145,12 +195,12 @@ class SupplierForm(QWidget):
         print("SupplierForm инициализирована.")
 
 class ProductForm(QWidget):
-    def __init__(self, parent=None, product=None, suppliers=None):
+    def __init__(self, parent=None, product=None, suppliers=None, pixmap=None):
         super().__init__(parent)
         self.setObjectName("formWidget")
         self.product = product
         self.suppliers = suppliers
-        self.image_path = None  # Для хранения пути к выбранному изображению
+        self.image_data = None  # Байты нового изображения (None - изображение не менялось)
 
         layout = QFormLayout()
         layout.setSpacing(10)
@@ -208,16 +258,10 @@ class ProductForm(QWidget):
         self.image_label.setStyleSheet("border: 1px solid #D2B48C; border-radius: 5px;")
         layout.addRow(self.image_label)
 
-        if product and product.kartinka:
-            temp_image_path = "temp_image.jpg"
-            with open(temp_image_path, "wb") as f:
-                f.write(product.kartinka)
-            pixmap = QPixmap(temp_image_path)
-            if not pixmap.isNull():
-                pixmap = pixmap.scaled(150, 150, Qt.KeepAspectRatio)
+        if product and product.kartinka_hash:
+            if pixmap is not None:
                 self.image_label.setPixmap(pixmap)
-                self.image_path = temp_image_path
-                self.image_input.setText(temp_image_path)
+                self.image_input.setText("Текущее изображение")
             else:
                 print("Ошибка: не удалось загрузить изображение из базы данных")
 
@@ -238,11 +282,11 @@ class ProductForm(QWidget):
     def select_image(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Выбрать изображение", "", "Images (*.png *.jpg *.jpeg)")
         if file_name:
-            self.image_path = file_name
+            with open(file_name, "rb") as f:
+                self.image_data = f.read()
             self.image_input.setText(file_name)
-            pixmap = QPixmap(file_name)
-            if not pixmap.isNull():
-                pixmap = pixmap.scaled(150, 150, Qt.KeepAspectRatio)
+            pixmap = pixmap_from_bytes(self.image_data, 150)
+            if pixmap is not None:
                 self.image_label.setPixmap(pixmap)
             else:
                 print(f"Ошибка: не удалось загрузить изображение {file_name}")
@@ -264,18 +308,13 @@ class ProductForm(QWidget):
         # Масштабируем изображение до размера поля отображения (150x150 пикселей)
         scaled_image = image.scaled(150, 150, Qt.KeepAspectRatio)
 
-        # Сохраняем масштабированное изображение как временный файл
-        temp_image_path = "temp_screenshot.jpg"
-        if scaled_image.save(temp_image_path, "JPG"):
-            self.image_path = temp_image_path
-            self.image_input.setText(temp_image_path)
-            pixmap = QPixmap(temp_image_path)
-            if not pixmap.isNull():
-                pixmap = pixmap.scaled(150, 150, Qt.KeepAspectRatio)
-                self.image_label.setPixmap(pixmap)
-                print(f"Скриншот успешно масштабирован, вставлен и сохранён как {temp_image_path}")
-            else:
-                print(f"Ошибка: не удалось загрузить масштабированный скриншот из {temp_image_path}")
+        # Кодируем масштабированное изображение в JPG прямо в памяти
+        image_data = image_to_bytes(scaled_image, "JPG")
+        if image_data:
+            self.image_data = image_data
+            self.image_input.setText("Скриншот из буфера обмена")
+            self.image_label.setPixmap(QPixmap.fromImage(scaled_image))
+            print("Скриншот успешно масштабирован и вставлен")
         else:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -283,10 +322,10 @@ class ProductForm(QWidget):
             msg.setStandardButtons(QMessageBox.Ok)
             msg.button(QMessageBox.Ok).setText("Хорошо")
             msg.exec_()
-            print("Ошибка: не удалось сохранить масштабированный скриншот как временный файл")
+            print("Ошибка: не удалось закодировать масштабированный скриншот")
 
 class ProductDetailsForm(QWidget):
-    def __init__(self, parent=None, product=None, main_window=None):
+    def __init__(self, parent=None, product=None, main_window=None, pixmap=None):
         super().__init__(parent)
         self.setObjectName("detailsFormWidget")
         self.product = product
@@ -324,13 +363,8 @@ class ProductDetailsForm(QWidget):
         layout.addWidget(self.image_label)
 
         # Если у товара есть изображение, отображаем его
-        if product and product.kartinka:
-            temp_image_path = "temp_image_details.jpg"
-            with open(temp_image_path, "wb") as f:
-                f.write(product.kartinka)
-            pixmap = QPixmap(temp_image_path)
-            if not pixmap.isNull():
-                pixmap = pixmap.scaled(200, 200, Qt.KeepAspectRatio)
+        if product and product.kartinka_hash:
+            if pixmap is not None:
                 self.image_label.setPixmap(pixmap)
             else:
                 self.image_label.setText("Не удалось загрузить изображение")
@@ -455,6 +489,119 @@ class DateSelectionDialog(QDialog):
     def get_selected_date(self):
         return self.date_edit.date()
 
+class QueryDiagnosticsDialog(QDialog):
+    """Число запросов и время их выполнения по экранам; планы запросов выбранного экрана."""
+
+    COLUMNS = ["Экран", "Запросов", "Всего, мс", "p50, мс", "p95, мс", "Макс., мс", "Строк", "Медленных"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Диагностика запросов")
+        self.resize(900, 600)
+        self.explain_job = None
+
+        layout = QVBoxLayout(self)
+        self.stats_table = QTableWidget(0, len(self.COLUMNS))
+        self.stats_table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.stats_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.stats_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.stats_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.stats_table.itemSelectionChanged.connect(self.update_explain_checkbox)
+        layout.addWidget(self.stats_table)
+
+        buttons_layout = QHBoxLayout()
+        self.explain_checkbox = QCheckBox("Запоминать запросы экрана для EXPLAIN")
+        self.explain_checkbox.toggled.connect(self.toggle_explain)
+        self.explain_button = QPushButton("План запросов")
+        self.explain_button.clicked.connect(self.run_explain)
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.reset_button = QPushButton("Сбросить")
+        self.reset_button.clicked.connect(self.reset)
+        buttons_layout.addWidget(self.explain_checkbox)
+        buttons_layout.addStretch()
+        for button in (self.explain_button, self.refresh_button, self.reset_button):
+            buttons_layout.addWidget(button)
+        layout.addLayout(buttons_layout)
+
+        self.plan_text = QPlainTextEdit()
+        self.plan_text.setReadOnly(True)
+        self.plan_text.setPlaceholderText(
+            "Отметьте экран, откройте его еще раз и нажмите \"План запросов\""
+        )
+        layout.addWidget(self.plan_text)
+
+        # Статистика обновляется, пока окно открыто
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(2000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def selected_screen(self):
+        rows = self.stats_table.selectionModel().selectedRows()
+        return self.stats_table.item(rows[0].row(), 0).text() if rows else None
+
+    def refresh(self):
+        selected = self.selected_screen()
+        snapshot = query_monitor.snapshot()
+        self.stats_table.setRowCount(len(snapshot))
+        for row, (screen, stats) in enumerate(snapshot):
+            values = [
+                screen, stats.count, f"{stats.total_ms:.0f}", f"{stats.p50:.1f}", f"{stats.p95:.1f}",
+                f"{stats.max_ms:.1f}", stats.rows, stats.slow,
+            ]
+            for column, value in enumerate(values):
+                self.stats_table.setItem(row, column, QTableWidgetItem(str(value)))
+            if screen == selected:
+                self.stats_table.selectRow(row)
+        self.stats_table.resizeColumnsToContents()
+
+    def reset(self):
+        query_monitor.reset()
+        self.plan_text.clear()
+        self.refresh()
+
+    def update_explain_checkbox(self):
+        screen = self.selected_screen()
+        self.explain_checkbox.blockSignals(True)
+        self.explain_checkbox.setChecked(screen in query_monitor.explain_screens)
+        self.explain_checkbox.blockSignals(False)
+
+    def toggle_explain(self, enabled):
+        screen = self.selected_screen()
+        if screen is not None:
+            query_monitor.set_explain(screen, enabled)
+
+    def run_explain(self):
+        screen = self.selected_screen()
+        if screen is None or self.explain_job is not None:
+            return
+        self.plan_text.setPlainText(f"Выполняется EXPLAIN для экрана \"{screen}\"...")
+        # EXPLAIN ANALYZE выполняет запросы повторно, поэтому в фоновом потоке
+        self.explain_job = run_in_background(
+            lambda job: query_monitor.explain(Connect.get_engine(), screen),
+            on_finished=self.show_plans,
+            on_failed=self.show_explain_error,
+        )
+
+    def show_plans(self, plans):
+        self.explain_job = None
+        if not plans:
+            self.plan_text.setPlainText(
+                "Нет запомненных запросов: отметьте экран и выполните на нем действие еще раз."
+            )
+            return
+        self.plan_text.setPlainText("\n\n".join(f"{statement}\n---\n{plan}" for statement, plan in plans))
+
+    def show_explain_error(self, error):
+        self.explain_job = None
+        self.plan_text.setPlainText(f"Ошибка при выполнении EXPLAIN: {error}")
+
+    def done(self, result):
+        self.refresh_timer.stop()
+        super().done(result)
+
 class MainWindow(QMainWindow):
     def __init__(self, user_role):
         super().__init__()
@@ -464,7 +611,17 @@ class MainWindow(QMainWindow):
 
         self.user_role = user_role
 
+        # Запросы до выбора вкладки приписываются экрану "Запуск"
+        set_screen("Запуск")
+        started = time.perf_counter()
+        # В режиме профилирования обработчики подменяются до подключения сигналов
+        profiler.wrap_slots(self)
+
         try:
+            # С локальной репликой окно читает и пишет только в нее, сервер нужен лишь для синхронизации
+            self.replica = open_replica()
+            if self.replica is None:
+                Connect.init_db()
             self.session = Connect.create_session()
             print("Подключение к базе данных успешно!")
         except Exception as e:
@@ -477,7 +634,7 @@ class MainWindow(QMainWindow):
             raise
 
         try:
-            pdfmetrics.registerFont(TTFont('TimesNewRoman', 'times.ttf'))
+            register_fonts()
         except Exception as e:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -509,6 +666,13 @@ class MainWindow(QMainWindow):
         self.logout_action.triggered.connect(self.logout)
         self.exit_action.triggered.connect(self.exit_program)
 
+        # Панель диагностики запросов включается настройкой diagnostics (DB_DIAGNOSTICS)
+        self.diagnostics_dialog = None
+        if DB_CONFIG.diagnostics:
+            self.diagnostics_action = QAction("Диагностика запросов", self)
+            self.account_menu.insertAction(self.logout_action, self.diagnostics_action)
+            self.diagnostics_action.triggered.connect(self.show_query_diagnostics)
+
         self.account_label.mousePressEvent = self.show_account_menu
 
         self.content_layout = QHBoxLayout()
@@ -525,21 +689,37 @@ class MainWindow(QMainWindow):
 
         self.hide_sidebar()
 
+        # Строки поиска вкладок и выполняющиеся поиски (ключ - имя таблицы)
+        self.search_boxes = {}
+        self.search_jobs = {}
+
         self.suppliers_tab = QWidget()
         self.tabs.addTab(self.suppliers_tab, "Поставщики")
         self.suppliers_layout = QVBoxLayout(self.suppliers_tab)
-        self.suppliers_table = QTableWidget()
+        self.create_search_box(self.suppliers_layout, Postavshik.__tablename__, "Поиск по названию поставщика")
+        self.suppliers_model = KeysetTableModel(self.session, suppliers_query, Postavshik.id, SUPPLIER_COLUMNS, parent=self)
+        self.suppliers_proxy = SortFilterProxyModel(self)
+        self.suppliers_proxy.setSourceModel(self.suppliers_model)
+        self.suppliers_table = QTableView()
+        self.suppliers_table.setModel(self.suppliers_proxy)
+        self.suppliers_table.setSelectionBehavior(QAbstractItemView.SelectRows)  # Выделение строками: удалять можно сразу несколько
+        self.enable_sorting(self.suppliers_table, self.suppliers_proxy)
         self.suppliers_layout.addWidget(self.suppliers_table)
 
+        self.supplier_buttons_layout = QHBoxLayout()
+        self.suppliers_layout.addLayout(self.supplier_buttons_layout)
+        # Полная перезагрузка таблицы только по явному запросу
+        self.refresh_suppliers_button = QPushButton("Обновить")
+        self.refresh_suppliers_button.clicked.connect(self.load_suppliers_data)
+        self.supplier_buttons_layout.addWidget(self.refresh_suppliers_button)
+
         if self.user_role == "direktor":
-            self.supplier_buttons_layout = QHBoxLayout()
             self.add_supplier_button = QPushButton("Добавить поставщика")
             self.edit_supplier_button = QPushButton("Редактировать поставщика")
             self.delete_supplier_button = QPushButton("Удалить поставщика")
             self.supplier_buttons_layout.addWidget(self.add_supplier_button)
             self.supplier_buttons_layout.addWidget(self.edit_supplier_button)
             self.supplier_buttons_layout.addWidget(self.delete_supplier_button)
-            self.suppliers_layout.addLayout(self.supplier_buttons_layout)
 
             self.add_supplier_button.clicked.connect(self.add_supplier)
             self.edit_supplier_button.clicked.connect(self.edit_supplier)
@@ -548,18 +728,32 @@ class MainWindow(QMainWindow):
         self.products_tab = QWidget()
         self.tabs.addTab(self.products_tab, "Товары")
         self.products_layout = QVBoxLayout(self.products_tab)
-        self.products_table = QTableWidget()
+        self.create_search_box(self.products_layout, Tovar.__tablename__, "Поиск по описанию товара")
+        self.products_model = KeysetTableModel(self.session, products_query, Tovar.id, PRODUCT_COLUMNS, parent=self)
+        self.products_proxy = SortFilterProxyModel(self)
+        self.products_proxy.setSourceModel(self.products_model)
+        self.products_table = QTableView()
+        self.products_table.setModel(self.products_proxy)
+        self.products_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.enable_sorting(self.products_table, self.products_proxy)
         self.products_layout.addWidget(self.products_table)
+        # Подключаем обработчик двойного нажатия
+        self.products_table.doubleClicked.connect(self.show_product_details)
+
+        self.product_buttons_layout = QHBoxLayout()
+        self.products_layout.addLayout(self.product_buttons_layout)
+        # Полная перезагрузка таблицы только по явному запросу
+        self.refresh_products_button = QPushButton("Обновить")
+        self.refresh_products_button.clicked.connect(self.load_products_data)
+        self.product_buttons_layout.addWidget(self.refresh_products_button)
 
         if self.user_role == "direktor":
-            self.product_buttons_layout = QHBoxLayout()
             self.add_product_button = QPushButton("Добавить товар")
             self.edit_product_button = QPushButton("Редактировать товар")
             self.delete_product_button = QPushButton("Удалить товар")
             self.product_buttons_layout.addWidget(self.add_product_button)
             self.product_buttons_layout.addWidget(self.edit_product_button)
             self.product_buttons_layout.addWidget(self.delete_product_button)
-            self.products_layout.addLayout(self.product_buttons_layout)
 
             self.add_product_button.clicked.connect(self.add_product)
             self.edit_product_button.clicked.connect(self.edit_product)
@@ -568,18 +762,30 @@ class MainWindow(QMainWindow):
         self.employees_tab = QWidget()
         self.tabs.addTab(self.employees_tab, "Сотрудники")
         self.employees_layout = QVBoxLayout(self.employees_tab)
-        self.employees_table = QTableWidget()
+        self.create_search_box(self.employees_layout, Sotrudnik.__tablename__, "Поиск по фамилии")
+        self.employees_model = KeysetTableModel(self.session, employees_query, Sotrudnik.id, EMPLOYEE_COLUMNS, parent=self)
+        self.employees_proxy = SortFilterProxyModel(self)
+        self.employees_proxy.setSourceModel(self.employees_model)
+        self.employees_table = QTableView()
+        self.employees_table.setModel(self.employees_proxy)
+        self.employees_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.enable_sorting(self.employees_table, self.employees_proxy)
         self.employees_layout.addWidget(self.employees_table)
 
+        self.employee_buttons_layout = QHBoxLayout()
+        self.employees_layout.addLayout(self.employee_buttons_layout)
+        # Полная перезагрузка таблицы только по явному запросу
+        self.refresh_employees_button = QPushButton("Обновить")
+        self.refresh_employees_button.clicked.connect(self.load_employees_data)
+        self.employee_buttons_layout.addWidget(self.refresh_employees_button)
+
         if self.user_role == "direktor":
-            self.employee_buttons_layout = QHBoxLayout()
             self.add_employee_button = QPushButton("Добавить сотрудника")
             self.edit_employee_button = QPushButton("Редактировать сотрудника")
             self.delete_employee_button = QPushButton("Удалить сотрудника")
             self.employee_buttons_layout.addWidget(self.add_employee_button)
             self.employee_buttons_layout.addWidget(self.edit_employee_button)
             self.employee_buttons_layout.addWidget(self.delete_employee_button)
-            self.employees_layout.addLayout(self.employee_buttons_layout)
 
             self.add_employee_button.clicked.connect(self.add_employee)
             self.edit_employee_button.clicked.connect(self.edit_employee)
@@ -591,10 +797,23 @@ class MainWindow(QMainWindow):
         self.reports_table = QTableWidget()
         self.reports_layout.addWidget(self.reports_table)
 
+        # Сигналы таблицы отчетов подключаются один раз; при смене отчета меняется только стратегия
+        self.report_grid = ReportGridController(self.reports_table)
+        self.report_strategies = {
+            "arrival": ReportGridStrategy("arrival", self.update_arrival_report, self.show_arrival_context_menu),
+            "stock": ReportGridStrategy("stock", self.update_stock_report, self.show_stock_context_menu),
+            "loss": ReportGridStrategy("loss"),
+            "expiring": ReportGridStrategy("expiring"),
+            "order_conversion": ReportGridStrategy(
+                "order_conversion", self.update_order_totals, self.show_context_menu
+            ),
+        }
+
         self.reports_menu = QMenu(self)
         self.arrival_report_action = QAction("Отчет по поступлению товаров", self)
         self.stock_report_action = QAction("Отчет по остаткам товаров", self)
         self.loss_report_action = QAction("Отчет по убытию товаров", self)
+        self.expiring_report_action = QAction("Истекающий срок годности", self)
         self.order_conversion_report_action = QAction("Бланк заказа", self)
         self.reports_menu.addAction(self.order_conversion_report_action)
         self.order_conversion_report_action.triggered.connect(self.load_order_conversion_reports)
@@ -617,29 +836,69 @@ class MainWindow(QMainWindow):
         self.reports_menu.addAction(self.arrival_report_action)
         self.reports_menu.addAction(self.stock_report_action)
         self.reports_menu.addAction(self.loss_report_action)
+        self.reports_menu.addAction(self.expiring_report_action)
 
         self.arrival_report_action.triggered.connect(self.load_arrival_reports)
         self.stock_report_action.triggered.connect(self.load_stock_reports)
         self.loss_report_action.triggered.connect(self.load_loss_reports)
+        self.expiring_report_action.triggered.connect(self.load_expiring_report)
 
         self.custom_tab_bar.set_reports_menu(self.reports_menu, self.reports_index)
 
         self.tabs.currentChanged.connect(self.handle_tab_change)
 
+        # Изменения записей применяются к таблицам построчно после завершения commit.
+        # Уведомитель общий для процесса: подключения снимаются при закрытии окна (closeEvent)
+        self.notifier_slots = [self.apply_row_changes]
+
+        # Синхронизация реплики: по таймеру и вскоре после локальных изменений
+        self.sync_job = None
+        if self.replica is not None:
+            self.sync_timer = QTimer(self)
+            self.sync_timer.setInterval(DB_CONFIG.sync_interval * 1000)
+            self.sync_timer.timeout.connect(self.start_sync)
+            self.sync_timer.start()
+            self.sync_soon_timer = QTimer(self)
+            self.sync_soon_timer.setSingleShot(True)
+            self.sync_soon_timer.setInterval(SYNC_DELAY)
+            self.sync_soon_timer.timeout.connect(self.start_sync)
+            self.notifier_slots.append(self.sync_soon)
+            self.start_sync()
+        for slot in self.notifier_slots:
+            notifier.rows_changed.connect(slot, Qt.QueuedConnection)
+
+        # Текущая фоновая загрузка данных отчета и параметры последней загрузки (для отмены правок)
+        self.report_load_job = None
+        self.last_report_load = None
+
         self.report_buttons_layout = QHBoxLayout()
         self.generate_report_button = QPushButton("Сформировать отчет")
         self.generate_report_button.clicked.connect(self.generate_pdf_report)
         self.report_buttons_layout.addWidget(self.generate_report_button)
+        self.save_report_button = QPushButton("Сохранить изменения")
+        self.save_report_button.clicked.connect(self.save_report_changes)
+        self.report_buttons_layout.addWidget(self.save_report_button)
+        self.discard_report_button = QPushButton("Отменить изменения")
+        self.discard_report_button.clicked.connect(self.discard_report_changes)
+        self.report_buttons_layout.addWidget(self.discard_report_button)
         self.reports_layout.addLayout(self.report_buttons_layout)
 
+        # Правки ячеек отчета копятся в памяти и сохраняются пакетом по таймеру или кнопкой
+        self.report_changes = None
+        self.dirty_items = []
+        self.report_save_timer = QTimer(self)
+        self.report_save_timer.setSingleShot(True)
+        self.report_save_timer.setInterval(REPORT_SAVE_DELAY)
+        self.report_save_timer.timeout.connect(self.save_report_changes)
+
         try:
             self.load_suppliers_data()
             self.load_products_data()
             self.load_employees_data()
-            self.reports_table.setRowCount(0)
-            self.reports_table.setColumnCount(0)
+            self.report_grid.clear()
             self.current_report_type = None
-            print("Данные успешно загружены!")
+            set_screen(self.tabs.tabText(self.tabs.currentIndex()))
+            print(f"Данные успешно загружены за {(time.perf_counter() - started) * 1000:.0f} мс!")
         except Exception as e:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -695,8 +954,28 @@ class MainWindow(QMainWindow):
         if event.button() == Qt.LeftButton:
             self.account_menu.exec_(self.account_label.mapToGlobal(QPoint(0, self.account_label.height())))
 
+    def show_query_diagnostics(self):
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = QueryDiagnosticsDialog(self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def closeEvent(self, event):
+        # Закрытое окно больше не получает изменения записей и не запускает синхронизацию
+        for slot in self.notifier_slots:
+            notifier.rows_changed.disconnect(slot)
+        self.notifier_slots = []
+        if self.replica is not None:
+            self.sync_timer.stop()
+            self.sync_soon_timer.stop()
+        if self.report_load_job is not None:
+            self.report_load_job.cancel()
+            self.report_load_job = None
+        super().closeEvent(event)
+
     def logout(self):
         self.close()
+        Connect.remove_session()
         self.auth_window = AuthWindow()
         self.auth_window.show()
 
@@ -712,36 +991,161 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.Yes:
             QApplication.quit()
 
+    def selected_keys(self, table, proxy):
+        # Первичные ключи выделенных строк (или текущей строки, если ничего не выделено)
+        rows = {index.row() for index in table.selectionModel().selectedIndexes()}
+        if not rows and table.currentIndex().row() >= 0:
+            rows = {table.currentIndex().row()}
+        return sorted(key for key in map(proxy.row_key, rows) if key is not None)
+
+    def enable_sorting(self, table, proxy):
+        # Сортировка по щелчку на заголовке и фильтры по колонкам из контекстного меню заголовка
+        header = table.horizontalHeader()
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        table.setSortingEnabled(True)
+        header.setContextMenuPolicy(Qt.CustomContextMenu)
+        header.customContextMenuRequested.connect(lambda position: self.show_column_menu(table, proxy, position))
+
+    def show_column_menu(self, table, proxy, position):
+        header = table.horizontalHeader()
+        column = header.logicalIndexAt(position)
+        menu = QMenu(self)
+        filter_action = None
+        if column >= 0:
+            title = proxy.sourceModel().headerData(column, Qt.Horizontal)
+            filter_action = menu.addAction(f"Фильтр по колонке «{title}»...")
+        clear_filters_action = menu.addAction("Сбросить фильтры")
+        unsort_action = menu.addAction("Без сортировки")
+        action = menu.exec_(header.mapToGlobal(position))
+        if action is None:
+            return
+        if action == filter_action:
+            text, ok = QInputDialog.getText(self, "Фильтр", f"«{title}» содержит:", text=proxy.column_filter(column))
+            if ok:
+                proxy.set_column_filter(column, text)
+        elif action == clear_filters_action:
+            proxy.clear_filters()
+        elif action == unsort_action:
+            header.setSortIndicator(-1, Qt.AscendingOrder)
+
+    def create_search_box(self, layout, table, placeholder):
+        search_box = QLineEdit()
+        search_box.setPlaceholderText(placeholder)
+        search_box.setClearButtonEnabled(True)
+        layout.addWidget(search_box)
+        # Запрос выполняется, когда ввод приостановлен на SEARCH_DELAY
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(SEARCH_DELAY)
+        timer.timeout.connect(lambda: self.start_search(table))
+        search_box.textChanged.connect(timer.start)
+        self.search_boxes[table] = search_box
+
+    def start_search(self, table):
+        # Предыдущий поиск по этой таблице больше не нужен
+        previous = self.search_jobs.pop(table, None)
+        if previous is not None:
+            previous.cancel()
+        text = self.search_boxes[table].text()
+        job = run_in_background(
+            lambda job: search_filter(Connect.create_session(), table, text, job.check_cancelled),
+            on_finished=lambda result: self.finish_search(table, job, result),
+            on_failed=lambda error: self.finish_search(table, job, None),
+        )
+        self.search_jobs[table] = job
+
+    def finish_search(self, table, job, result):
+        if self.search_jobs.get(table) is not job:
+            return
+        del self.search_jobs[table]
+        if result is None:
+            return
+        model = {
+            Postavshik.__tablename__: self.suppliers_model,
+            Tovar.__tablename__: self.products_model,
+            Sotrudnik.__tablename__: self.employees_model,
+        }[table]
+        condition, keys = result
+        model.set_filter(condition, keys)
+
     def load_suppliers_data(self):
-        suppliers = self.session.query(Postavshik).all()
-        self.suppliers_table.setRowCount(len(suppliers))
-        self.suppliers_table.setColumnCount(6)
-        self.suppliers_table.setHorizontalHeaderLabels([
-            "№", "Название", "Тип", "Телефон", "Email", "Юридический адрес"
-        ])
+        # Строки подгружаются страницами по мере прокрутки таблицы
+        self.suppliers_model.reload()
+        address_index(self.session).invalidate()
+        invalidate_prefix_index(self.session.get_bind(), Postavshik.__tablename__)
+        self.suppliers_table.resizeColumnsToContents()
 
-        for row, supplier in enumerate(suppliers):
-            self.suppliers_table.setItem(row, 0, QTableWidgetItem(str(supplier.id)))
-            self.suppliers_table.setItem(row, 1, QTableWidgetItem(supplier.nazvanie_postavshika))
-            self.suppliers_table.setItem(row, 2, QTableWidgetItem(supplier.tip_postavshika.value))
-            self.suppliers_table.setItem(row, 3, QTableWidgetItem(supplier.kontakt_tel or ""))
-            self.suppliers_table.setItem(row, 4, QTableWidgetItem(supplier.email or ""))
-            address_str = ""
-            if supplier.juridicheskij_adres_rel:
-                address_str = (
-                    f"{supplier.juridicheskij_adres_rel.ulica.gorod.nazvanie}, "
-                    f"{supplier.juridicheskij_adres_rel.ulica.nazvanie}, "
-                    f"{supplier.juridicheskij_adres_rel.nomer}"
-                )
-            self.suppliers_table.setItem(row, 5, QTableWidgetItem(address_str))
+    def apply_row_changes(self, changes):
+        # Обновляем только затронутые строки, сохраняя прокрутку и выделение
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change.table, []).append(change)
+        bind = self.session.get_bind()
+        for table in by_table.keys() & SEARCH_COLUMNS.keys():
+            # Индекс поиска той базы, где зафиксированы изменения
+            changed_binds = {change.bind or bind for change in by_table[table]}
+            for changed_bind in changed_binds:
+                invalidate_prefix_index(changed_bind, table)
+            # Результаты активного поиска могли измениться
+            if bind in changed_binds and self.search_boxes[table].text().strip():
+                self.start_search(table)
+        for table, model in ((Postavshik.__tablename__, self.suppliers_model),
+                             (Tovar.__tablename__, self.products_model),
+                             (Sotrudnik.__tablename__, self.employees_model)):
+            if table in by_table:
+                model.apply_changes(by_table[table])
+
+        # Название поставщика показывается и в таблице товаров
+        supplier_ids = {
+            change.key for change in by_table.get(Postavshik.__tablename__, [])
+            if change.kind is ChangeKind.UPDATED
+        }
+        if supplier_ids:
+            self.products_model.refresh_keys(
+                self.products_model.loaded_keys_where(Tovar.postavshik_id.in_(supplier_ids))
+            )
 
-        self.suppliers_table.resizeColumnsToContents()
+    def start_sync(self):
+        if self.sync_job is not None:
+            return
+        self.sync_job = run_in_background(
+            lambda job: self.replica.sync(), on_finished=self.finish_sync, on_failed=self.sync_failed,
+            screen="Синхронизация реплики"
+        )
+
+    def sync_soon(self, changes):
+        # Локальные изменения отправляются на сервер вскоре после commit
+        self.sync_soon_timer.start()
+
+    def finish_sync(self, changes):
+        self.sync_job = None
+        # Объекты сессии окна могли устареть: реплику изменила синхронизация
+        self.session.expire_all()
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change.table, []).append(change)
+        for table, reload in ((Postavshik.__tablename__, self.load_suppliers_data),
+                              (Tovar.__tablename__, self.load_products_data),
+                              (Sotrudnik.__tablename__, self.load_employees_data)):
+            if len(by_table.get(table, ())) > SYNC_RELOAD_THRESHOLD:
+                reload()
+                del by_table[table]
+        self.apply_row_changes([change for table_changes in by_table.values() for change in table_changes])
+        if by_table.keys() & {"gorod", "ulica", "dom_stroenie"}:
+            address_index(self.session).invalidate()
+        self.statusBar().showMessage(f"Синхронизировано в {datetime.now():%H:%M}, изменений с сервера: {len(changes)}")
+
+    def sync_failed(self, error):
+        self.sync_job = None
+        self.statusBar().showMessage(
+            f"Нет связи с сервером, изменений в очереди: {self.replica.pending_count()}"
+        )
 
     def add_supplier(self):
         print("Открытие формы добавления поставщика...")
         self.clear_sidebar()
         self.show_sidebar()
-        form = SupplierForm(self)
+        form = SupplierForm(self, addresses=address_index(self.session).completions(self.session))
         self.sidebar_layout.addWidget(form)
         form.submit_button.clicked.connect(lambda: self.save_supplier(form))
         form.cancel_button.clicked.connect(self.clear_sidebar)
@@ -749,7 +1153,7 @@ class MainWindow(QMainWindow):
     def edit_supplier(self):
         print("Открытие формы редактирования поставщика...")
         try:
-            selected = self.suppliers_table.currentRow()
+            selected = self.suppliers_table.currentIndex().row()
             if selected < 0:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
@@ -759,8 +1163,8 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 return
 
-            supplier_id = int(self.suppliers_table.item(selected, 0).text())
-            supplier = self.session.query(Postavshik).filter_by(id=supplier_id).first()
+            supplier_id = self.suppliers_proxy.row_key(selected)
+            supplier = get_supplier(self.session, supplier_id)
             if not supplier:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
@@ -772,7 +1176,7 @@ class MainWindow(QMainWindow):
 
             self.clear_sidebar()
             self.show_sidebar()
-            form = SupplierForm(self, supplier=supplier)
+            form = SupplierForm(self, supplier=supplier, addresses=address_index(self.session).completions(self.session))
             self.sidebar_layout.addWidget(form)
             form.submit_button.clicked.connect(lambda: self.save_supplier(form, supplier))
             form.cancel_button.clicked.connect(self.clear_sidebar)
@@ -823,8 +1227,7 @@ class MainWindow(QMainWindow):
                 return
 
             try:
-                city_name, street_name, house_number = [part.strip() for part in address_text.split(",", 2)]
-                house_number = int(house_number)
+                city_name, street_name, house_number = parse_address(address_text)
             except ValueError:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
@@ -834,55 +1237,32 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 return
 
-            city = self.session.query(Gorod).filter_by(nazvanie=city_name).first()
-            if not city:
-                city = Gorod(nazvanie=city_name, sok_nazvanie=city_name[:3], oblast_id=1)
-                self.session.add(city)
-                self.session.commit()
-
-            street = self.session.query(Ulica).filter_by(nazvanie=street_name, gorod_id=city.id).first()
-            if not street:
-                street = Ulica(nazvanie=street_name, gorod_id=city.id)
-                self.session.add(street)
-                self.session.commit()
-
-            house = self.session.query(DomStroenie).filter_by(nomer=house_number, ulica_id=street.id).first()
-            if not house:
-                house = DomStroenie(nomer=house_number, ulica_id=street.id)
-                self.session.add(house)
-                self.session.commit()
+            # Адрес и поставщик сохраняются одной транзакцией: при ошибке не остается частично созданного адреса
+            index = address_index(self.session)
+            with index.transaction(self.session):
+                house_id = index.resolve(self.session, city_name, street_name, house_number)
+                if supplier:
+                    supplier.nazvanie_postavshika = form.name_input.text()
+                    supplier.tip_postavshika = TipPostavshika(form.type_input.currentText())
+                    supplier.kontakt_tel = phone
+                    supplier.email = email
+                    supplier.juridicheskij_adres = house_id
+                else:
+                    self.session.add(Postavshik(
+                        nazvanie_postavshika=form.name_input.text(),
+                        tip_postavshika=TipPostavshika(form.type_input.currentText()),
+                        kontakt_tel=phone,
+                        email=email,
+                        juridicheskij_adres=house_id
+                    ))
 
-            if supplier:
-                supplier.nazvanie_postavshika = form.name_input.text()
-                supplier.tip_postavshika = TipPostavshika(form.type_input.currentText())
-                supplier.kontakt_tel = phone
-                supplier.email = email
-                supplier.juridicheskij_adres = house.id
-                self.session.commit()
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Успех")
-                msg.setText("Поставщик обновлен!")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
-            else:
-                new_supplier = Postavshik(
-                    nazvanie_postavshika=form.name_input.text(),
-                    tip_postavshika=TipPostavshika(form.type_input.currentText()),
-                    kontakt_tel=phone,
-                    email=email,
-                    juridicheskij_adres=house.id
-                )
-                self.session.add(new_supplier)
-                self.session.commit()
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Успех")
-                msg.setText("Поставщик добавлен!")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Успех")
+            msg.setText("Поставщик обновлен!" if supplier else "Поставщик добавлен!")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-            self.load_suppliers_data()
             self.clear_sidebar()
 
         except Exception as e:
@@ -895,8 +1275,8 @@ class MainWindow(QMainWindow):
             msg.exec_()
 
     def delete_supplier(self):
-        selected = self.suppliers_table.currentRow()
-        if selected < 0:
+        supplier_ids = self.selected_keys(self.suppliers_table, self.suppliers_proxy)
+        if not supplier_ids:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
             msg.setText("Выберите поставщика для удаления!")
@@ -905,59 +1285,47 @@ class MainWindow(QMainWindow):
             msg.exec_()
             return
 
-        supplier_id = int(self.suppliers_table.item(selected, 0).text())
-        supplier = self.session.query(Postavshik).filter_by(id=supplier_id).first()
-        if not supplier:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText("Поставщик не найден!")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
-            return
-
         msg = QMessageBox(self)
         msg.setWindowTitle("Подтверждение")
-        msg.setText("Вы уверены, что хотите удалить поставщика?")
+        if len(supplier_ids) == 1:
+            msg.setText("Вы уверены, что хотите удалить поставщика?")
+        else:
+            msg.setText(f"Вы уверены, что хотите удалить выбранных поставщиков ({len(supplier_ids)})?")
         msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
         msg.setDefaultButton(QMessageBox.No)
         msg.button(QMessageBox.Yes).setText("Да")
         msg.button(QMessageBox.No).setText("Нет")
         reply = msg.exec_()
         if reply == QMessageBox.Yes:
-            self.session.delete(supplier)
-            self.session.commit()
-            self.load_suppliers_data()
+            # Один DELETE ... WHERE id IN (...); строки таблицы удалит apply_row_changes после commit
+            try:
+                deleted = delete_rows(self.session, Postavshik, supplier_ids)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                print(f"Ошибка при удалении поставщика: {str(e)}")
+                msg = QMessageBox(self)
+                msg.setWindowTitle("Ошибка")
+                msg.setText(f"Произошла ошибка при удалении поставщика: {str(e)}")
+                msg.setStandardButtons(QMessageBox.Ok)
+                msg.button(QMessageBox.Ok).setText("Хорошо")
+                msg.exec_()
+                return
             msg_success = QMessageBox(self)
             msg_success.setWindowTitle("Успех")
-            msg_success.setText("Поставщик удален!")
+            msg_success.setText("Поставщик удален!" if deleted == 1 else f"Удалено поставщиков: {deleted}")
             msg_success.setStandardButtons(QMessageBox.Ok)
             msg_success.button(QMessageBox.Ok).setText("Хорошо")
             msg_success.exec_()
 
     def load_products_data(self):
-        products = self.session.query(Tovar).all()
-        self.products_table.setRowCount(len(products))
-        self.products_table.setColumnCount(6)
-        self.products_table.setHorizontalHeaderLabels([
-            "№", "Тип", "Номер", "Описание", "Цена", "Поставщик"
-        ])
-
-        for row, product in enumerate(products):
-            self.products_table.setItem(row, 0, QTableWidgetItem(str(product.id)))
-            self.products_table.setItem(row, 1, QTableWidgetItem(product.nazvanie.value))
-            self.products_table.setItem(row, 2, QTableWidgetItem(str(product.nomer)))
-            self.products_table.setItem(row, 3, QTableWidgetItem(product.opisanie or ""))
-            self.products_table.setItem(row, 4, QTableWidgetItem(str(product.cena) if product.cena else ""))
-            self.products_table.setItem(row, 5, QTableWidgetItem(product.postavshik.nazvanie_postavshika if product.postavshik else ""))
-
+        self.products_model.reload()
+        invalidate_prefix_index(self.session.get_bind(), Tovar.__tablename__)
         self.products_table.resizeColumnsToContents()
-        # Подключаем обработчик двойного нажатия
-        self.products_table.doubleClicked.connect(self.show_product_details)
 
     def show_product_details(self):
         print("Двойное нажатие на таблицу товаров...")
-        selected = self.products_table.currentRow()
+        selected = self.products_table.currentIndex().row()
         if selected < 0:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -967,7 +1335,7 @@ class MainWindow(QMainWindow):
             msg.exec_()
             return
 
-        product_id = int(self.products_table.item(selected, 0).text())
+        product_id = self.products_proxy.row_key(selected)
         product = self.session.query(Tovar).filter_by(id=product_id).first()
         if not product:
             msg = QMessageBox(self)
@@ -980,7 +1348,11 @@ class MainWindow(QMainWindow):
 
         self.clear_sidebar()
         self.show_sidebar()
-        form = ProductDetailsForm(self, product=product, main_window=self)  # Передаём self как main_window
+        # Миниатюра берется из кэша; изображение загружается из базы только при промахе
+        pixmap = thumbnail_cache.get(
+            product.id, product.kartinka_hash, lambda: load_product_image(self.session, product.id), 200
+        )
+        form = ProductDetailsForm(self, product=product, main_window=self, pixmap=pixmap)  # Передаём self как main_window
         self.sidebar_layout.addWidget(form)
         print(f"Открыта форма деталей для товара ID: {product_id}")
 
@@ -1016,7 +1388,7 @@ class MainWindow(QMainWindow):
     def edit_product(self):
         print("Открытие формы редактирования товара...")
         try:
-            selected = self.products_table.currentRow()
+            selected = self.products_table.currentIndex().row()
             if selected < 0:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
@@ -1026,8 +1398,8 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 return
 
-            product_id = int(self.products_table.item(selected, 0).text())
-            product = self.session.query(Tovar).filter_by(id=product_id).first()
+            product_id = self.products_proxy.row_key(selected)
+            product = get_product(self.session, product_id)
             if not product:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
@@ -1049,7 +1421,10 @@ class MainWindow(QMainWindow):
 
             self.clear_sidebar()
             self.show_sidebar()
-            form = ProductForm(self, product=product, suppliers=suppliers)
+            pixmap = thumbnail_cache.get(
+                product.id, product.kartinka_hash, lambda: load_product_image(self.session, product.id), 150
+            )
+            form = ProductForm(self, product=product, suppliers=suppliers, pixmap=pixmap)
             self.sidebar_layout.addWidget(form)
             form.submit_button.clicked.connect(lambda: self.save_product(form, suppliers, product))
             form.cancel_button.clicked.connect(self.clear_sidebar)
@@ -1065,10 +1440,7 @@ class MainWindow(QMainWindow):
 
     def save_product(self, form, suppliers, product=None):
         try:
-            image_data = None
-            if form.image_path:
-                with open(form.image_path, "rb") as f:
-                    image_data = f.read()
+            image_data = form.image_data
 
             # Валидация данных
             price_text = form.price_input.text().strip()
@@ -1105,7 +1477,9 @@ class MainWindow(QMainWindow):
                 product.nomer = nomer
                 product.opisanie = form.description_input.text()
                 product.cena = price
-                product.kartinka = image_data if image_data else product.kartinka
+                if image_data:
+                    product.kartinka = image_data
+                    thumbnail_cache.invalidate(product.id)
                 product.postavshik_id = suppliers[form.supplier_input.currentIndex()].id
                 self.session.commit()
                 msg = QMessageBox(self)
@@ -1134,7 +1508,6 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 print("Товар успешно добавлен.")
 
-            self.load_products_data()
             self.clear_sidebar()
 
         except Exception as e:
@@ -1149,8 +1522,8 @@ class MainWindow(QMainWindow):
     def delete_product(self):
         print("Попытка удаления товара...")
         try:
-            selected = self.products_table.currentRow()
-            if selected < 0:
+            product_ids = self.selected_keys(self.products_table, self.products_proxy)
+            if not product_ids:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
                 msg.setText("Выберите товар для удаления!")
@@ -1159,37 +1532,31 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 return
 
-            product_id = int(self.products_table.item(selected, 0).text())
-            product = self.session.query(Tovar).filter_by(id=product_id).first()
-            if not product:
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Ошибка")
-                msg.setText("Товар не найден!")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
-                return
-
             msg = QMessageBox(self)
             msg.setWindowTitle("Подтверждение")
-            msg.setText("Вы уверены, что хотите удалить товар?")
+            if len(product_ids) == 1:
+                msg.setText("Вы уверены, что хотите удалить товар?")
+            else:
+                msg.setText(f"Вы уверены, что хотите удалить выбранные товары ({len(product_ids)})?")
             msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
             msg.setDefaultButton(QMessageBox.No)
             msg.button(QMessageBox.Yes).setText("Да")
             msg.button(QMessageBox.No).setText("Нет")
             reply = msg.exec_()
             if reply == QMessageBox.Yes:
-                self.session.delete(product)
+                deleted = delete_rows(self.session, Tovar, product_ids)
                 self.session.commit()
-                self.load_products_data()
+                for product_id in product_ids:
+                    thumbnail_cache.invalidate(product_id)
                 msg_success = QMessageBox(self)
                 msg_success.setWindowTitle("Успех")
-                msg_success.setText("Товар удален!")
+                msg_success.setText("Товар удален!" if deleted == 1 else f"Удалено товаров: {deleted}")
                 msg_success.setStandardButtons(QMessageBox.Ok)
                 msg_success.button(QMessageBox.Ok).setText("Хорошо")
                 msg_success.exec_()
-                print("Товар успешно удалён.")
+                print(f"Удалено товаров: {deleted}")
         except Exception as e:
+            self.session.rollback()
             print(f"Ошибка при удалении товара: {str(e)}")
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -1199,20 +1566,8 @@ class MainWindow(QMainWindow):
             msg.exec_()
 
     def load_employees_data(self):
-        employees = self.session.query(Sotrudnik).all()
-        self.employees_table.setRowCount(len(employees))
-        self.employees_table.setColumnCount(5)
-        self.employees_table.setHorizontalHeaderLabels([
-            "№", "Фамилия", "Имя", "Отчество", "Пол"
-        ])
-
-        for row, employee in enumerate(employees):
-            self.employees_table.setItem(row, 0, QTableWidgetItem(str(employee.id)))
-            self.employees_table.setItem(row, 1, QTableWidgetItem(employee.familiya))
-            self.employees_table.setItem(row, 2, QTableWidgetItem(employee.imya))
-            self.employees_table.setItem(row, 3, QTableWidgetItem(employee.otchestvo or ""))
-            self.employees_table.setItem(row, 4, QTableWidgetItem(employee.pol.value))
-
+        self.employees_model.reload()
+        invalidate_prefix_index(self.session.get_bind(), Sotrudnik.__tablename__)
         self.employees_table.resizeColumnsToContents()
 
     def add_employee(self):
@@ -1226,7 +1581,7 @@ class MainWindow(QMainWindow):
 
     def edit_employee(self):
         print("Открытие формы редактирования сотрудника...")
-        selected = self.employees_table.currentRow()
+        selected = self.employees_table.currentIndex().row()
         if selected < 0:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
@@ -1236,7 +1591,7 @@ class MainWindow(QMainWindow):
             msg.exec_()
             return
 
-        employee_id = int(self.employees_table.item(selected, 0).text())
+        employee_id = self.employees_proxy.row_key(selected)
         employee = self.session.query(Sotrudnik).filter_by(id=employee_id).first()
         if not employee:
             msg = QMessageBox(self)
@@ -1283,12 +1638,11 @@ class MainWindow(QMainWindow):
             msg.button(QMessageBox.Ok).setText("Хорошо")
             msg.exec_()
 
-        self.load_employees_data()
         self.clear_sidebar()
 
     def delete_employee(self):
-        selected = self.employees_table.currentRow()
-        if selected < 0:
+        employee_ids = self.selected_keys(self.employees_table, self.employees_proxy)
+        if not employee_ids:
             msg = QMessageBox(self)
             msg.setWindowTitle("Ошибка")
             msg.setText("Выберите сотрудника для удаления!")
@@ -1297,32 +1651,34 @@ class MainWindow(QMainWindow):
             msg.exec_()
             return
 
-        employee_id = int(self.employees_table.item(selected, 0).text())
-        employee = self.session.query(Sotrudnik).filter_by(id=employee_id).first()
-        if not employee:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText("Сотрудник не найден!")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
-            return
-
         msg = QMessageBox(self)
         msg.setWindowTitle("Подтверждение")
-        msg.setText("Вы уверены, что хотите удалить сотрудника?")
+        if len(employee_ids) == 1:
+            msg.setText("Вы уверены, что хотите удалить сотрудника?")
+        else:
+            msg.setText(f"Вы уверены, что хотите удалить выбранных сотрудников ({len(employee_ids)})?")
         msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
         msg.setDefaultButton(QMessageBox.No)
         msg.button(QMessageBox.Yes).setText("Да")
         msg.button(QMessageBox.No).setText("Нет")
         reply = msg.exec_()
         if reply == QMessageBox.Yes:
-            self.session.delete(employee)
-            self.session.commit()
-            self.load_employees_data()
+            try:
+                deleted = delete_rows(self.session, Sotrudnik, employee_ids)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                print(f"Ошибка при удалении сотрудника: {str(e)}")
+                msg = QMessageBox(self)
+                msg.setWindowTitle("Ошибка")
+                msg.setText(f"Произошла ошибка при удалении сотрудника: {str(e)}")
+                msg.setStandardButtons(QMessageBox.Ok)
+                msg.button(QMessageBox.Ok).setText("Хорошо")
+                msg.exec_()
+                return
             msg_success = QMessageBox(self)
             msg_success.setWindowTitle("Успех")
-            msg_success.setText("Сотрудник удален!")
+            msg_success.setText("Сотрудник удален!" if deleted == 1 else f"Удалено сотрудников: {deleted}")
             msg_success.setStandardButtons(QMessageBox.Ok)
             msg_success.button(QMessageBox.Ok).setText("Хорошо")
             msg_success.exec_()
@@ -1340,73 +1696,184 @@ class MainWindow(QMainWindow):
             locale = QLocale(QLocale.Russian, QLocale.Russia)
             self.selected_arrival_date = locale.toString(selected_qdate, "d MMMM yyyy") + "г"  # Форматируем дату с русским месяцем
 
-            # Загружаем существующие отчеты по поступлению за выбранную дату
-            reports = self.session.query(OtchetyPoPostuplenijuTovarov).filter(
-                OtchetyPoPostuplenijuTovarov.data_postuplenija == self.selected_arrival_date_obj
-            ).all()
-
-            # Загружаем все товары из таблицы Tovar
-            products = self.session.query(Tovar).all()
-
-            # Сохраняем список товаров для дальнейшего использования (например, в PDF)
-            self.arrival_products = products
+            # Загружаем отчеты за выбранную дату и все товары с поставщиками в фоновом потоке
+            report_date = self.selected_arrival_date_obj
+            self.start_report_load(
+                "arrival",
+                lambda session: (arrival_reports_by_product(session, report_date), report_products(session)),
+                self.populate_arrival_report,
+            )
 
-            # Формируем таблицу
-            self.reports_table.setRowCount(len(products))
-            self.reports_table.setColumnCount(6)
-            self.reports_table.setHorizontalHeaderLabels([
-                "№", "Дата поступления", "Количество", "Товар", "Описание", "Поставщик"
-            ])
+        else:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Отмена")
+            msg.setText("Формирование отчета по поступлению товаров отменено.")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-            # Создаем словарь для быстрого поиска существующих отчетов
-            existing_reports = {report.tovar_id: report for report in reports if report.tovar_id}
+    def start_report_load(self, report_type, fetch, on_loaded):
+        # fetch(session) выполняется в фоновом потоке со своей сессией, on_loaded - в GUI-потоке
+        self.save_report_changes()
+        self.report_changes = None
+        self.last_report_load = (report_type, fetch, on_loaded)
+        set_screen(REPORT_SCREENS[report_type])
+        if self.report_load_job is not None:
+            self.report_load_job.cancel()
+
+        def loaded(result):
+            # Результат устаревшей загрузки (пользователь уже выбрал другой отчет) игнорируем
+            if job is not self.report_load_job or self.current_report_type != report_type:
+                return
+            self.report_load_job = None
+            # Заполнение таблицы не должно попадать в правки отчета: обработчики включаются после него
+            self.report_grid.populate(self.report_strategies[report_type], on_loaded, result)
+
+        job = run_in_background(
+            lambda job: fetch(Connect.create_session()),
+            on_finished=loaded,
+            on_failed=self.show_report_load_error,
+        )
+        self.report_load_job = job
+
+    def mark_dirty(self, item):
+        # Подсвечиваем ячейку без повторного вызова обработчика itemChanged
+        with self.report_grid.quiet():
+            item.setBackground(DIRTY_CELL_COLOR)
+        self.dirty_items.append(item)
+        self.report_save_timer.start()  # Перезапуск таймера: сохраняем после паузы в правках
+
+    def clear_dirty_marks(self):
+        with self.report_grid.quiet():
+            for item in self.dirty_items:
+                try:
+                    item.setData(Qt.BackgroundRole, None)
+                except RuntimeError:
+                    pass  # Строка уже удалена из таблицы
+        self.dirty_items = []
+
+    def save_report_changes(self):
+        self.report_save_timer.stop()
+        if not self.report_changes:
+            return
+        try:
+            count = self.report_changes.flush(self.session)
+            self.clear_dirty_marks()
+            print(f"Сохранено изменений отчета: {count}")
+        except Exception as e:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Ошибка")
+            msg.setText(f"Ошибка при сохранении отчета: {str(e)}")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-            for row, product in enumerate(products):
-                # № (порядковый номер строки, начиная с 1)
-                self.reports_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-                self.reports_table.item(row, 0).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+    def discard_report_changes(self):
+        # Отбрасываем весь пакет несохраненных правок и перечитываем отчет из базы
+        self.report_save_timer.stop()
+        if not self.report_changes:
+            return
+        self.report_changes.clear()
+        self.dirty_items = []
+        if self.last_report_load is not None:
+            self.start_report_load(*self.last_report_load)
+
+    def show_report_load_error(self, error):
+        self.report_load_job = None
+        self.current_report_type = None
+        self.report_grid.clear()
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Ошибка")
+        msg.setText(f"Ошибка при загрузке данных отчета: {error}")
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.button(QMessageBox.Ok).setText("Хорошо")
+        msg.exec_()
+
+    def run_pdf_job(self, build, success_text, error_text):
+        # build(job) формирует PDF в фоновом потоке и возвращает имя файла
+        progress = QProgressDialog("Формирование отчета...", "Отмена", 0, 0, self)
+        progress.setWindowTitle("Отчет")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+
+        def on_progress(done, total):
+            progress.setLabelText(f"Формирование отчета... страница {done}")
+
+        def finished(filename):
+            progress.close()
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Успех")
+            msg.setText(f"{success_text}: {filename}")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-                # Проверяем, есть ли отчет для этого товара
-                report = existing_reports.get(product.id)
+        def failed(error):
+            progress.close()
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Ошибка")
+            msg.setText(f"{error_text}: {error}")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-                # Дата поступления: редактируемая, из отчета или выбранная дата по умолчанию
-                date_str = str(report.data_postuplenija) if report else str(self.selected_arrival_date_obj)
-                date_item = QTableWidgetItem(date_str)
-                self.reports_table.setItem(row, 1, date_item)
+        def cancelled():
+            progress.close()
+            print("Формирование отчета отменено пользователем.")
+
+        job = run_in_background(
+            build, on_finished=finished, on_failed=failed, on_cancelled=cancelled, on_progress=on_progress,
+            screen=f"{current_screen()}: PDF"
+        )
+        progress.canceled.connect(job.cancel)
+        return job
+
+    def populate_arrival_report(self, result):
+        existing_reports, products = result
+
+        # Сохраняем список товаров для дальнейшего использования (например, в PDF)
+        self.arrival_products = products
+        self.report_changes = ReportChangeSet(OtchetyPoPostuplenijuTovarov, OtchetyPoPostuplenijuTovarov.data_postuplenija)
+        self.dirty_items = []
+
+        # Формируем таблицу
+        self.reports_table.setRowCount(len(products))
+        self.reports_table.setColumnCount(6)
+        self.reports_table.setHorizontalHeaderLabels([
+            "№", "Дата поступления", "Количество", "Товар", "Описание", "Поставщик"
+        ])
 
-                # Количество: редактируемое, из отчета или 0 по умолчанию
-                quantity = report.kolithestvo_postupivshih_tovarov if report else 0
-                quantity_item = QTableWidgetItem(str(quantity))
-                self.reports_table.setItem(row, 2, quantity_item)
+        for row, product in enumerate(products):
+            # № (порядковый номер строки, начиная с 1)
+            self.reports_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
+            self.reports_table.item(row, 0).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-                # Товар: берем из Tovar.nazvanie
-                self.reports_table.setItem(row, 3, QTableWidgetItem(product.nazvanie.value if product.nazvanie else ""))
-                self.reports_table.item(row, 3).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Проверяем, есть ли отчет для этого товара
+            report = existing_reports.get(product.id)
 
-                # Описание: берем из Tovar.opisanie
-                self.reports_table.setItem(row, 4, QTableWidgetItem(product.opisanie if product.opisanie else ""))
-                self.reports_table.item(row, 4).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Дата поступления: редактируемая, из отчета или выбранная дата по умолчанию
+            date_str = str(report.data_postuplenija) if report else str(self.selected_arrival_date_obj)
+            date_item = QTableWidgetItem(date_str)
+            self.reports_table.setItem(row, 1, date_item)
 
-                # Поставщик: берем из Postavshik.nazvanie_postavshika
-                self.reports_table.setItem(row, 5, QTableWidgetItem(product.postavshik.nazvanie_postavshika if product.postavshik else ""))
-                self.reports_table.item(row, 5).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Количество: редактируемое, из отчета или 0 по умолчанию
+            quantity = report.kolithestvo_postupivshih_tovarov if report else 0
+            quantity_item = QTableWidgetItem(str(quantity))
+            self.reports_table.setItem(row, 2, quantity_item)
 
-            self.reports_table.resizeColumnsToContents()
+            # Товар: берем из Tovar.nazvanie
+            self.reports_table.setItem(row, 3, QTableWidgetItem(product.nazvanie.value if product.nazvanie else ""))
+            self.reports_table.item(row, 3).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-            # Подключаем обработчик изменения данных
-            self.reports_table.itemChanged.connect(self.update_arrival_report)
+            # Описание: берем из Tovar.opisanie
+            self.reports_table.setItem(row, 4, QTableWidgetItem(product.opisanie if product.opisanie else ""))
+            self.reports_table.item(row, 4).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-            # Добавляем контекстное меню для удаления строк
-            self.reports_table.setContextMenuPolicy(Qt.CustomContextMenu)
-            self.reports_table.customContextMenuRequested.connect(self.show_arrival_context_menu)
+            # Поставщик: берем из Postavshik.nazvanie_postavshika
+            self.reports_table.setItem(row, 5, QTableWidgetItem(product.nazvanie_postavshika or ""))
+            self.reports_table.item(row, 5).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-        else:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Отмена")
-            msg.setText("Формирование отчета по поступлению товаров отменено.")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+        self.reports_table.resizeColumnsToContents()
 
     def load_loss_reports(self):
         self.current_report_type = "loss"
@@ -1421,38 +1888,13 @@ class MainWindow(QMainWindow):
             locale = QLocale(QLocale.Russian, QLocale.Russia)
             self.selected_loss_date = locale.toString(selected_qdate, "d MMMM yyyy") + "г"  # Форматируем дату с русским месяцем
 
-            # Загружаем отчеты по убытию за выбранную дату
-            reports = self.session.query(OtchetyPoUbytomuTovaru).filter(
-                OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta == self.selected_loss_date_obj
-            ).all()
-
-            self.reports_table.setRowCount(len(reports))
-            self.reports_table.setColumnCount(5)
-            self.reports_table.setHorizontalHeaderLabels([
-                "№", "Дата убытия", "Количество убытого товара", "Дата отчета", "Товар"
-            ])
-
-            for row, report in enumerate(reports):
-                self.reports_table.setItem(row, 0, QTableWidgetItem(str(report.id)))
-                # Форматируем дату убытия
-                date_loss_str = locale.toString(report.data_ubytija, "d MMMM yyyy") + "г"
-                self.reports_table.setItem(row, 1, QTableWidgetItem(date_loss_str))
-                self.reports_table.setItem(row, 2, QTableWidgetItem(str(report.kolithestvo_ubytogo_tovara)))
-                # Форматируем дату отчета
-                date_report_str = locale.toString(report.data_formirovaniya_otcheta, "d MMMM yyyy") + "г"
-                self.reports_table.setItem(row, 3, QTableWidgetItem(date_report_str))
-                self.reports_table.setItem(row, 4, QTableWidgetItem(report.tovar.nazvanie.value if report.tovar else ""))
-
-            self.reports_table.resizeColumnsToContents()
-
-            # Если данных нет, показываем сообщение
-            if not reports:
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Информация")
-                msg.setText(f"Нет данных об убытии товаров на {self.selected_loss_date}.")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
+            # Загружаем отчеты по убытию за выбранную дату в фоновом потоке
+            report_date = self.selected_loss_date_obj
+            self.start_report_load(
+                "loss",
+                lambda session: loss_report_rows(session, report_date),
+                self.populate_loss_report,
+            )
 
         else:
             msg = QMessageBox(self)
@@ -1463,8 +1905,87 @@ class MainWindow(QMainWindow):
             msg.exec_()
             # Сбрасываем состояние
             self.current_report_type = None
-            self.reports_table.setRowCount(0)
-            self.reports_table.setColumnCount(0)
+            self.report_grid.clear()
+
+    def populate_loss_report(self, reports):
+        locale = QLocale(QLocale.Russian, QLocale.Russia)
+
+        self.reports_table.setRowCount(len(reports))
+        self.reports_table.setColumnCount(5)
+        self.reports_table.setHorizontalHeaderLabels([
+            "№", "Дата убытия", "Количество убытого товара", "Дата отчета", "Товар"
+        ])
+
+        for row, report in enumerate(reports):
+            self.reports_table.setItem(row, 0, QTableWidgetItem(str(report.id)))
+            # Форматируем дату убытия
+            date_loss_str = locale.toString(report.data_ubytija, "d MMMM yyyy") + "г"
+            self.reports_table.setItem(row, 1, QTableWidgetItem(date_loss_str))
+            self.reports_table.setItem(row, 2, QTableWidgetItem(str(report.kolithestvo_ubytogo_tovara)))
+            # Форматируем дату отчета
+            date_report_str = locale.toString(report.data_formirovaniya_otcheta, "d MMMM yyyy") + "г"
+            self.reports_table.setItem(row, 3, QTableWidgetItem(date_report_str))
+            self.reports_table.setItem(row, 4, QTableWidgetItem(report.tovar_nazvanie.value if report.tovar_nazvanie else ""))
+
+        self.reports_table.resizeColumnsToContents()
+
+        # Если данных нет, показываем сообщение
+        if not reports:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Информация")
+            msg.setText(f"Нет данных об убытии товаров на {self.selected_loss_date}.")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
+
+    def load_expiring_report(self):
+        self.current_report_type = "expiring"
+        days, accepted = QInputDialog.getInt(
+            self, "Истекающий срок годности", "Показать товары, срок годности которых истекает в течение (дней):",
+            EXPIRY_WARNING_DAYS, 0, 365
+        )
+        if not accepted:
+            self.current_report_type = None
+            return
+        self.expiry_days = days
+        self.expiry_report_date = date.today()
+
+        # Один запрос по диапазону дат (индекс по сроку годности) в фоновом потоке
+        today = self.expiry_report_date
+        self.start_report_load(
+            "expiring", lambda session: expiring_stock_query(session, today, days).all(), self.populate_expiring_report
+        )
+
+    def populate_expiring_report(self, rows):
+        self.reports_table.setRowCount(len(rows))
+        self.reports_table.setColumnCount(6)
+        self.reports_table.setHorizontalHeaderLabels([
+            "№", "Товар", "Поставщик", "Количество товара", "Срок годности", "Осталось дней"
+        ])
+
+        for row, record in enumerate(rows):
+            values = [
+                row + 1,
+                record.opisanie or "Описание отсутствует",
+                record.nazvanie_postavshika or "Не указан",
+                record.kolithestvo_tovara,
+                record.srok_godnosti,
+                (record.srok_godnosti - self.expiry_report_date).days,
+            ]
+            for column, value in enumerate(values):
+                value_item = QTableWidgetItem(str(value))
+                value_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
+                self.reports_table.setItem(row, column, value_item)
+
+        self.reports_table.resizeColumnsToContents()
+
+        if not rows:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Информация")
+            msg.setText(f"Нет товаров, срок годности которых истекает в ближайшие {self.expiry_days} дн.")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
     def load_order_conversion_reports(self):
         self.current_report_type = "order_conversion"
@@ -1479,94 +2000,103 @@ class MainWindow(QMainWindow):
             locale = QLocale(QLocale.Russian, QLocale.Russia)
             self.selected_order_date = locale.toString(selected_qdate, "d MMMM yyyy") + "г"  # Строковое представление для PDF
 
-            # Загружаем все товары из таблицы Tovar
-            products = self.session.query(Tovar).all()
-
-            # Сохраняем список товаров для дальнейшего использования (например, в PDF)
-            self.order_products = products
-
-            # Формируем таблицу
-            self.reports_table.setRowCount(len(products))
-            self.reports_table.setColumnCount(7)  # Добавляем колонку "Условия получения"
-            self.reports_table.setHorizontalHeaderLabels([
-                "№ п/п", "Товар", "Количество", "Цена", "Сумма", "Возможная цена", "Условия получения"
-            ])
-
-            for row, product in enumerate(products):
-                # № п/п (порядковый номер строки, начиная с 1)
-                self.reports_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-                self.reports_table.item(row, 0).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Загружаем все товары и сохраненный заказ на эту дату в фоновом потоке
+            order_date = self.selected_order_date_obj
+            self.start_report_load(
+                "order_conversion",
+                lambda session: (report_products(session), order_rows_by_product(session, order_date)),
+                self.populate_order_conversion_report,
+            )
 
-                # Товар: берем из Tovar.opisanie
-                self.reports_table.setItem(row, 1, QTableWidgetItem(product.opisanie if product.opisanie else ""))
-                self.reports_table.item(row, 1).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+        else:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Отмена")
+            msg.setText("Формирование бланка заказа отменено.")
+            msg.setStandardButtons(QMessageBox.Ok)
+            msg.button(QMessageBox.Ok).setText("Хорошо")
+            msg.exec_()
 
-                # Количество: изначально 0, редактируемое
-                quantity_item = QTableWidgetItem("0")
-                self.reports_table.setItem(row, 2, quantity_item)
+    def populate_order_conversion_report(self, result):
+        products, saved = result
+        # Сохраняем список товаров для дальнейшего использования (например, в PDF)
+        self.order_products = products
+        # Количества, цены и итоги заказа хранятся в колонках, таблица только показывает их
+        self.order = OrderConversion.from_products(products, saved)
+        self.report_changes = ReportChangeSet(ZakazTovara, ZakazTovara.data_zakaza)
+        self.dirty_items = []
+
+        # Формируем таблицу
+        self.reports_table.setRowCount(len(products))
+        self.reports_table.setColumnCount(7)  # Добавляем колонку "Условия получения"
+        self.reports_table.setHorizontalHeaderLabels([
+            "№ п/п", "Товар", "Количество", "Цена", "Сумма", "Возможная цена", "Условия получения"
+        ])
 
-                # Цена: берем из Tovar.cena
-                price = float(product.cena) if product.cena else 0.00
-                self.reports_table.setItem(row, 3, QTableWidgetItem(f"{price:.2f}"))
-                self.reports_table.item(row, 3).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+        for row, product in enumerate(products):
+            # № п/п (порядковый номер строки, начиная с 1)
+            self.reports_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
+            self.reports_table.item(row, 0).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-                # Сумма: изначально 0 (Количество * Цена)
-                self.reports_table.setItem(row, 4, QTableWidgetItem("0.00"))
-                self.reports_table.item(row, 4).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Товар: берем из Tovar.opisanie
+            self.reports_table.setItem(row, 1, QTableWidgetItem(product.opisanie if product.opisanie else ""))
+            self.reports_table.item(row, 1).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-                # Возможная цена: изначально 0 (Сумма * 0.03)
-                self.reports_table.setItem(row, 5, QTableWidgetItem("0.00"))
-                self.reports_table.item(row, 5).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Количество: из сохраненного заказа или 0, редактируемое
+            quantity_item = QTableWidgetItem(str(self.order.quantities[row]))
+            self.reports_table.setItem(row, 2, quantity_item)
 
-                # Условия получения: фиксированное значение "3% скидка"
-                self.reports_table.setItem(row, 6, QTableWidgetItem("3% скидка"))
-                self.reports_table.item(row, 6).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            # Цена: на момент заказа или текущая Tovar.cena
+            self.reports_table.setItem(row, 3, QTableWidgetItem(str(self.order.price(row))))
+            self.reports_table.item(row, 3).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-            self.reports_table.resizeColumnsToContents()
+            # Сумма (Количество * Цена) и возможная цена (3% от суммы)
+            line_sum, discount = self.order.line(row)
+            self.reports_table.setItem(row, 4, QTableWidgetItem(str(line_sum)))
+            self.reports_table.item(row, 4).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
+            self.reports_table.setItem(row, 5, QTableWidgetItem(str(discount)))
+            self.reports_table.item(row, 5).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-            # Подключаем обработчик изменения количества
-            self.reports_table.itemChanged.connect(self.update_order_totals)
+            # Условия получения: фиксированное значение "3% скидка"
+            self.reports_table.setItem(row, 6, QTableWidgetItem(DISCOUNT_TEXT))
+            self.reports_table.item(row, 6).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Запрещаем редактирование
 
-            # Добавляем контекстное меню для удаления строк
-            self.reports_table.setContextMenuPolicy(Qt.CustomContextMenu)
-            self.reports_table.customContextMenuRequested.connect(self.show_context_menu)
+        self.reports_table.resizeColumnsToContents()
+        self.show_order_totals()
 
-        else:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Отмена")
-            msg.setText("Формирование бланка заказа отменено.")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+    def show_order_totals(self):
+        self.statusBar().showMessage(
+            f"Итого по заказу: {self.order.total}, возможная цена: {self.order.discount_total}"
+        )
 
     def update_order_totals(self, item):
         # Проверяем, что изменена колонка "Количество" (индекс 2)
-        if item.column() == 2:
-            row = item.row()
-            try:
-                quantity = int(item.text())  # Получаем новое количество
-                if quantity < 0:
-                    quantity = 0
-                    item.setText("0")
-            except ValueError:
+        if item.column() != 2:
+            return
+        row = item.row()
+        try:
+            quantity = int(item.text())  # Получаем новое количество
+            if quantity < 0:
                 quantity = 0
                 item.setText("0")
+        except ValueError:
+            quantity = 0
+            item.setText("0")
 
-            # Получаем цену (индекс 3)
-            price_item = self.reports_table.item(row, 3)
-            price = float(price_item.text()) if price_item else 0.00
-
-            # Вычисляем сумму (Количество * Цена)
-            total = quantity * price
-            self.reports_table.setItem(row, 4, QTableWidgetItem(f"{total:.2f}"))
-
-            # Вычисляем возможную цену (Сумма * 0.03)
-            possible_price = total * 0.03
-            self.reports_table.setItem(row, 5, QTableWidgetItem(f"{possible_price:.2f}"))
+        # Пересчитываем только эту строку; итоги заказа меняются на разницу
+        self.order.set_quantity(row, quantity)
+        line_sum, discount = self.order.line(row)
+        self.reports_table.item(row, 4).setText(str(line_sum))
+        self.reports_table.item(row, 5).setText(str(discount))
+        self.show_order_totals()
 
-            # Обновляем № п/п после возможного удаления строк
-            for i in range(self.reports_table.rowCount()):
-                self.reports_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
+        # Запоминаем правку для пакетного сохранения вместе с ценой на момент заказа
+        if self.report_changes is None:
+            return
+        self.report_changes.set(
+            self.order.product_ids[row], self.selected_order_date_obj,
+            kolithestvo=quantity, cena=self.order.price(row)
+        )
+        self.mark_dirty(item)
 
     def update_arrival_report(self, item):
         # Проверяем, что изменена редактируемая колонка ("Дата поступления" или "Количество")
@@ -1609,38 +2139,16 @@ class MainWindow(QMainWindow):
             item.setText("0")
             quantity = 0
 
-        # Ищем существующий отчет для этого товара и даты
-        report = self.session.query(OtchetyPoPostuplenijuTovarov).filter(
-            OtchetyPoPostuplenijuTovarov.tovar_id == product.id,
-            OtchetyPoPostuplenijuTovarov.data_postuplenija == date
-        ).first()
-
-        try:
-            if report:
-                # Обновляем существующий отчет
-                report.data_postuplenija = date
-                report.kolithestvo_postupivshih_tovarov = quantity
-                report.data_formirovaniya_otcheta = self.selected_arrival_date_obj  # Устанавливаем дату формирования
-            else:
-                # Создаем новый отчет
-                new_report = OtchetyPoPostuplenijuTovarov(
-                    data_postuplenija=date,
-                    kolithestvo_postupivshih_tovarov=quantity,
-                    data_formirovaniya_otcheta=self.selected_arrival_date_obj,  # Устанавливаем дату формирования
-                    tovar_id=product.id,
-                    postavshik_id=product.postavshik_id
-                )
-                self.session.add(new_report)
-
-            self.session.commit()
-        except Exception as e:
-            self.session.rollback()
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText(f"Ошибка при сохранении отчета: {str(e)}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+        # Запоминаем правку; в базу она попадет вместе с остальными при сохранении пакета
+        if self.report_changes is None:
+            return
+        self.report_changes.set(
+            product.id, date,
+            kolithestvo_postupivshih_tovarov=quantity,
+            data_formirovaniya_otcheta=self.selected_arrival_date_obj,  # Устанавливаем дату формирования
+            postavshik_id=product.postavshik_id
+        )
+        self.mark_dirty(item)
 
     def show_context_menu(self, pos):
         # Показываем контекстное меню для удаления строк
@@ -1649,12 +2157,31 @@ class MainWindow(QMainWindow):
         action = menu.exec_(self.reports_table.mapToGlobal(pos))
 
         if action == delete_action:
-            selected_rows = sorted(set(index.row() for index in self.reports_table.selectedIndexes()), reverse=True)
-            for row in selected_rows:
-                self.reports_table.removeRow(row)
-            # Обновляем № п/п после удаления
-            for i in range(self.reports_table.rowCount()):
-                self.reports_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
+            self.save_report_changes()  # Сначала сохраняем накопленные правки
+            selected_rows = self.report_grid.selected_rows()
+            if not selected_rows:
+                return
+            removed_ids = {self.order.product_ids[row] for row in selected_rows}
+            # Строки заказа всех выбранных товаров за дату удаляются одним запросом
+            try:
+                delete_reports(
+                    self.session, ZakazTovara, ZakazTovara.data_zakaza, self.selected_order_date_obj, removed_ids
+                )
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                msg = QMessageBox(self)
+                msg.setWindowTitle("Ошибка")
+                msg.setText(f"Ошибка при удалении строк заказа: {str(e)}")
+                msg.setStandardButtons(QMessageBox.Ok)
+                msg.button(QMessageBox.Ok).setText("Хорошо")
+                msg.exec_()
+                return
+
+            self.order.remove_rows(selected_rows)
+            self.order_products = [product for product in self.order_products if product.id not in removed_ids]
+            self.report_grid.remove_rows(selected_rows)
+            self.show_order_totals()
                 
     def show_arrival_context_menu(self, pos):
         # Показываем контекстное меню для удаления строк в отчете по поступлению
@@ -1663,13 +2190,11 @@ class MainWindow(QMainWindow):
         action = menu.exec_(self.reports_table.mapToGlobal(pos))
 
         if action == delete_action:
-            selected_rows = sorted(set(index.row() for index in self.reports_table.selectedIndexes()), reverse=True)
-            for row in selected_rows:
-                # Удаляем строку из таблицы
-                self.reports_table.removeRow(row)
-            # Обновляем № после удаления
-            for i in range(self.reports_table.rowCount()):
-                self.reports_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
+            self.save_report_changes()  # Сначала сохраняем накопленные правки
+            selected_rows = self.report_grid.selected_rows()
+            removed_ids = {self.arrival_products[row].id for row in selected_rows}
+            self.arrival_products = [product for product in self.arrival_products if product.id not in removed_ids]
+            self.report_grid.remove_rows(selected_rows)
             
     def update_stock_report(self, item):
         # Обрабатываем изменение только в колонках "Количество товара" (3) или "Срок годности" (4)
@@ -1698,41 +2223,41 @@ class MainWindow(QMainWindow):
                 item.setText("0")
                 quantity = 0
 
-            # Ищем существующий отчет
-            report = self.session.query(OtchetyPoOstatkamTovarov).filter(
-                OtchetyPoOstatkamTovarov.tovar_id == product.id,
-                OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta == self.selected_stock_date_obj
-            ).first()
+            # Запоминаем правку для пакетного сохранения; срок годности партии переносится в новую запись
+            if self.report_changes is None:
+                return
+            expiry = parse_expiry(self.reports_table.item(row, 4).text(), self.selected_stock_date_obj)
+            self.report_changes.set(
+                product.id, self.selected_stock_date_obj, kolithestvo_tovara=quantity, srok_godnosti=expiry
+            )
+            self.mark_dirty(item)
 
+        elif item.column() == 4:  # Срок годности: дата или число дней от даты отчета
             try:
-                if report:
-                    # Обновляем существующий отчет
-                    report.kolithestvo_tovara = quantity
-                else:
-                    # Создаем новый отчет
-                    new_report = OtchetyPoOstatkamTovarov(
-                        data_formirovaniya_otcheta=self.selected_stock_date_obj,
-                        kolithestvo_tovara=quantity,
-                        tovar_id=product.id
-                    )
-                    self.session.add(new_report)
-
-                self.session.commit()
-            except Exception as e:
-                self.session.rollback()
+                expiry = parse_expiry(item.text(), self.selected_stock_date_obj)
+            except ValueError:
                 msg = QMessageBox(self)
                 msg.setWindowTitle("Ошибка")
-                msg.setText(f"Ошибка при сохранении отчета: {str(e)}")
+                msg.setText("Введите срок годности датой ГГГГ-ММ-ДД или числом дней (например, 10 дней)!")
                 msg.setStandardButtons(QMessageBox.Ok)
                 msg.button(QMessageBox.Ok).setText("Хорошо")
                 msg.exec_()
+                item.setText("")
+                expiry = None
+            item.setText(str(expiry) if expiry else "")
 
-        elif item.column() == 4:  # Срок годности
-            expiry = item.text().strip()
-            if not expiry:
-                expiry = "10 дней"
-                item.setText(expiry)
-            self.expiry_data[row] = expiry  # Сохраняем значение в памяти
+            # Срок сохраняется в отчете по остаткам за дату вместе с количеством из таблицы
+            if self.report_changes is None:
+                return
+            quantity_item = self.reports_table.item(row, 3)
+            try:
+                quantity = max(int(quantity_item.text()), 0)
+            except ValueError:
+                quantity = 0
+            self.report_changes.set(
+                product.id, self.selected_stock_date_obj, kolithestvo_tovara=quantity, srok_godnosti=expiry
+            )
+            self.mark_dirty(item)
 
     def show_stock_context_menu(self, pos):
         # Контекстное меню для удаления строк
@@ -1741,22 +2266,17 @@ class MainWindow(QMainWindow):
         action = menu.exec_(self.reports_table.mapToGlobal(pos))
 
         if action == delete_action:
-            selected_rows = sorted(set(index.row() for index in self.reports_table.selectedIndexes()), reverse=True)
-            for row in selected_rows:
-                product = self.stock_products[row]
-                # Удаляем отчет из базы, если он существует
-                report = self.session.query(OtchetyPoOstatkamTovarov).filter(
-                    OtchetyPoOstatkamTovarov.tovar_id == product.id,
-                    OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta == self.selected_stock_date_obj
-                ).first()
-                if report:
-                    self.session.delete(report)
-                self.reports_table.removeRow(row)
-                # Удаляем данные о сроке годности
-                if row in self.expiry_data:
-                    del self.expiry_data[row]
-
+            self.save_report_changes()  # Сначала сохраняем накопленные правки
+            selected_rows = self.report_grid.selected_rows()
+            if not selected_rows:
+                return
+            removed_ids = {self.stock_products[row].id for row in selected_rows}
+            # Отчеты всех выбранных товаров за дату удаляются одним запросом
             try:
+                delete_reports(
+                    self.session, OtchetyPoOstatkamTovarov, OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta,
+                    self.selected_stock_date_obj, removed_ids
+                )
                 self.session.commit()
             except Exception as e:
                 self.session.rollback()
@@ -1766,32 +2286,21 @@ class MainWindow(QMainWindow):
                 msg.setStandardButtons(QMessageBox.Ok)
                 msg.button(QMessageBox.Ok).setText("Хорошо")
                 msg.exec_()
+                return
+
+            self.stock_products = [product for product in self.stock_products if product.id not in removed_ids]
+            self.report_grid.remove_rows(selected_rows)
 
-            # Обновляем нумерацию и данные о сроках годности
-            new_expiry_data = {}
-            for i in range(self.reports_table.rowCount()):
-                self.reports_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
-                old_row = i + sum(1 for r in selected_rows if r <= i)  # Смещение из-за удаленных строк
-                if old_row in self.expiry_data:
-                    new_expiry_data[i] = self.expiry_data[old_row]
-                    self.reports_table.setItem(i, 4, QTableWidgetItem(self.expiry_data[old_row]))
-                else:
-                    new_expiry_data[i] = "10 дней"
-                    self.reports_table.setItem(i, 4, QTableWidgetItem("10 дней"))
-            self.expiry_data = new_expiry_data
-
-            # Обновляем список товаров
-            remaining_products = []
-            for i in range(self.reports_table.rowCount()):
-                remaining_products.append(self.stock_products[i])
-            self.stock_products = remaining_products
-            
     def handle_tab_change(self, index):
         # Сбрасываем состояние таблицы и текущий тип отчета при переключении вкладок
         if index != self.reports_index:
+            self.save_report_changes()
+            self.report_changes = None
+            if self.report_load_job is not None:
+                self.report_load_job.cancel()
+                self.report_load_job = None
             self.current_report_type = None
-            self.reports_table.setRowCount(0)
-            self.reports_table.setColumnCount(0)
+            self.report_grid.clear()
             # Сбрасываем сохраненные даты
             if hasattr(self, 'selected_arrival_date_obj'):
                 delattr(self, 'selected_arrival_date_obj')
@@ -1802,6 +2311,9 @@ class MainWindow(QMainWindow):
             if hasattr(self, 'selected_order_date_obj'):
                 delattr(self, 'selected_order_date_obj')
 
+        # Дальнейшие запросы GUI-потока приписываются выбранной вкладке
+        set_screen(self.tabs.tabText(index))
+
         if index == self.reports_index:
             # Если выбрана вкладка "Отчеты", показываем меню отчетов
             tab_rect = self.custom_tab_bar.tabRect(self.reports_index)
@@ -1822,108 +2334,15 @@ class MainWindow(QMainWindow):
             locale = QLocale(QLocale.Russian, QLocale.Russia)
             self.selected_stock_date = locale.toString(selected_qdate, "d MMMM yyyy") + "г"
 
-            # Загружаем все товары из таблицы Tovar
-            try:
-                products = self.session.query(Tovar).all()
-                if not products:
-                    msg = QMessageBox(self)
-                    msg.setWindowTitle("Информация")
-                    msg.setText("В базе данных нет товаров для формирования отчета.")
-                    msg.setStandardButtons(QMessageBox.Ok)
-                    msg.button(QMessageBox.Ok).setText("Хорошо")
-                    msg.exec_()
-                    self.current_report_type = None
-                    self.reports_table.setRowCount(0)
-                    self.reports_table.setColumnCount(0)
-                    return
-                self.stock_products = products  # Сохраняем для использования в обработчиках
-            except Exception as e:
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Ошибка")
-                msg.setText(f"Ошибка при загрузке товаров: {str(e)}")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
-                self.current_report_type = None
-                self.reports_table.setRowCount(0)
-                self.reports_table.setColumnCount(0)
-                return
-
-            # Загружаем существующие отчеты по остаткам за выбранную дату
-            try:
-                reports = self.session.query(OtchetyPoOstatkamTovarov).filter(
-                    OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta == self.selected_stock_date_obj
-                ).all()
-            except Exception as e:
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Ошибка")
-                msg.setText(f"Ошибка при загрузке отчетов: {str(e)}")
-                msg.setStandardButtons(QMessageBox.Ok)
-                msg.button(QMessageBox.Ok).setText("Хорошо")
-                msg.exec_()
-                self.current_report_type = None
-                self.reports_table.setRowCount(0)
-                self.reports_table.setColumnCount(0)
-                return
-
-            # Создаем словарь для быстрого поиска отчетов
-            report_dict = {report.tovar_id: report for report in reports if report.tovar_id}
-
-            # Настраиваем таблицу
-            self.reports_table.setRowCount(len(products))
-            self.reports_table.setColumnCount(5)
-            self.reports_table.setHorizontalHeaderLabels([
-                "№", "Товар", "Поставщик", "Количество товара", "Срок годности"
-            ])
-
-            # Очищаем словарь для хранения временных значений срока годности
-            self.expiry_data = {}
-
-            for row, product in enumerate(products):
-                # № (порядковый номер)
-                number_item = QTableWidgetItem(str(row + 1))
-                number_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
-                self.reports_table.setItem(row, 0, number_item)
-
-                # Товар (из Tovar.opisanie)
-                opisanie = str(product.opisanie) if product.opisanie else "Описание отсутствует"
-                product_item = QTableWidgetItem(opisanie)
-                product_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
-                self.reports_table.setItem(row, 1, product_item)
-
-                # Поставщик (из Postavshik.nazvanie_postavshika)
-                supplier_name = "Не указан"
-                if product.postavshik_id:
-                    try:
-                        supplier = self.session.query(Postavshik).filter_by(id=product.postavshik_id).first()
-                        supplier_name = str(supplier.nazvanie_postavshika) if supplier else "Поставщик не найден"
-                    except Exception as e:
-                        supplier_name = f"Ошибка: {str(e)}"
-                supplier_item = QTableWidgetItem(supplier_name)
-                supplier_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
-                self.reports_table.setItem(row, 2, supplier_item)
-
-                # Количество товара (всегда 0 изначально)
-                quantity = "0"
-                quantity_item = QTableWidgetItem(quantity)
-                quantity_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable)  # Редактируемое
-                self.reports_table.setItem(row, 3, quantity_item)
-
-                # Срок годности (по умолчанию "10 дней", редактируемое)
-                expiry = "10 дней"
-                expiry_item = QTableWidgetItem(expiry)
-                expiry_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable)  # Редактируемое
-                self.reports_table.setItem(row, 4, expiry_item)
-                self.expiry_data[row] = expiry  # Сохраняем начальное значение
-
-            self.reports_table.resizeColumnsToContents()
-
-            # Подключаем обработчик изменения данных
-            self.reports_table.itemChanged.connect(self.update_stock_report)
-
-            # Включаем контекстное меню для удаления строк
-            self.reports_table.setContextMenuPolicy(Qt.CustomContextMenu)
-            self.reports_table.customContextMenuRequested.connect(self.show_stock_context_menu)
+            # Загружаем все товары и их остатки на выбранную дату в фоновом потоке
+            report_date = self.selected_stock_date_obj
+            self.start_report_load(
+                "stock",
+                lambda session: (
+                    report_products(session), stock_on_hand(session, report_date), stock_expiry(session, report_date)
+                ),
+                self.populate_stock_report,
+            )
 
         else:
             msg = QMessageBox(self)
@@ -1933,204 +2352,86 @@ class MainWindow(QMainWindow):
             msg.button(QMessageBox.Ok).setText("Хорошо")
             msg.exec_()
             self.current_report_type = None
-            self.reports_table.setRowCount(0)
-            self.reports_table.setColumnCount(0)
-
+            self.report_grid.clear()
 
-    def generate_general_accounting_report(self):
-        """Генерирует пустой отчет 'Общий учет' в формате PDF."""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"general_accounting_report_{timestamp}.pdf"
-            doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
-            elements = []
-
-            styles = getSampleStyleSheet()
-            title_style = styles['Heading1']
-            title_style.fontName = 'TimesNewRoman'
-            title_style.alignment = 1
-            title = "Общий учет"
-            title_paragraph = Paragraph(title, title_style)
-            elements.append(title_paragraph)
-
-            normal_style = styles['Normal']
-            normal_style.fontName = 'TimesNewRoman'
-            normal_style.fontSize = 10
-            normal_style.leading = 14
-
-            elements.append(Paragraph("<br/>", normal_style))
-
-            # Заголовки таблицы
-            headers = ["№", "Дата", "Наименование", "Количество", "Ед. изм.", "Цена", "Сумма"]
-            data = [headers]
-
-            # Создаем пустую таблицу
-            col_widths = [30, 80, 150, 50, 50, 60, 60]
-            table = Table(data, colWidths=col_widths)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'TimesNewRoman'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph("Итого: -", normal_style))
-
-            doc.build(elements)
+    def populate_stock_report(self, result):
+        products, on_hand, expiry_by_product = result
+        if not products:
             msg = QMessageBox(self)
-            msg.setWindowTitle("Успех")
-            msg.setText(f"Отчет 'Общий учет' успешно создан: {filename}")
+            msg.setWindowTitle("Информация")
+            msg.setText("В базе данных нет товаров для формирования отчета.")
             msg.setStandardButtons(QMessageBox.Ok)
             msg.button(QMessageBox.Ok).setText("Хорошо")
             msg.exec_()
+            self.current_report_type = None
+            self.report_grid.clear()
+            return
+        self.stock_products = products  # Сохраняем для использования в обработчиках
+        self.report_changes = ReportChangeSet(OtchetyPoOstatkamTovarov, OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta)
+        self.dirty_items = []
+
+        # Настраиваем таблицу
+        self.reports_table.setRowCount(len(products))
+        self.reports_table.setColumnCount(5)
+        self.reports_table.setHorizontalHeaderLabels([
+            "№", "Товар", "Поставщик", "Количество товара", "Срок годности"
+        ])
 
-        except Exception as e:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText(f"Ошибка при создании отчета 'Общий учет': {str(e)}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+        for row, product in enumerate(products):
+            # № (порядковый номер)
+            number_item = QTableWidgetItem(str(row + 1))
+            number_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
+            self.reports_table.setItem(row, 0, number_item)
+
+            # Товар (из Tovar.opisanie)
+            opisanie = str(product.opisanie) if product.opisanie else "Описание отсутствует"
+            product_item = QTableWidgetItem(opisanie)
+            product_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
+            self.reports_table.setItem(row, 1, product_item)
+
+            # Поставщик (из Postavshik.nazvanie_postavshika, загружен вместе с товарами)
+            supplier_name = "Не указан"
+            if product.postavshik_id:
+                supplier_name = str(product.nazvanie_postavshika) if product.nazvanie_postavshika else "Поставщик не найден"
+            supplier_item = QTableWidgetItem(supplier_name)
+            supplier_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Нередактируемое
+            self.reports_table.setItem(row, 2, supplier_item)
+
+            # Количество товара: остаток на дату (последняя инвентаризация + поступило - убыло).
+            # Исправленное значение сохраняется как инвентаризация на эту дату
+            quantity = str(on_hand.get(product.id, 0))
+            quantity_item = QTableWidgetItem(quantity)
+            quantity_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable)  # Редактируемое
+            self.reports_table.setItem(row, 3, quantity_item)
+
+            # Срок годности партии (из последней инвентаризации), редактируемое
+            expiry = expiry_by_product.get(product.id)
+            expiry_item = QTableWidgetItem(str(expiry) if expiry else "")
+            expiry_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable)  # Редактируемое
+            self.reports_table.setItem(row, 4, expiry_item)
+
+        self.reports_table.resizeColumnsToContents()
+
+    def generate_general_accounting_report(self):
+        """Генерирует пустой отчет 'Общий учет' в формате PDF."""
+        self.run_pdf_job(
+            lambda job: GENERAL_ACCOUNTING_REPORT.render(on_page=pdf_page_callback(job)),
+            "Отчет 'Общий учет' успешно создан", "Ошибка при создании отчета 'Общий учет'"
+        )
 
     def generate_invoice_report(self):
         """Генерирует пустой отчет 'Счет-фактура' в формате PDF."""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"invoice_report_{timestamp}.pdf"
-            doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
-            elements = []
-
-            styles = getSampleStyleSheet()
-            title_style = styles['Heading1']
-            title_style.fontName = 'TimesNewRoman'
-            title_style.alignment = 1
-            title = "Счет-фактура"
-            title_paragraph = Paragraph(title, title_style)
-            elements.append(title_paragraph)
-
-            normal_style = styles['Normal']
-            normal_style.fontName = 'TimesNewRoman'
-            normal_style.fontSize = 10
-            normal_style.leading = 14
-
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph("Поставщик: ____________________________", normal_style))
-            elements.append(Paragraph("Покупатель: __________________________", normal_style))
-            elements.append(Paragraph("Дата: _______________________________", normal_style))
-            elements.append(Paragraph("<br/>", normal_style))
-
-            # Заголовки таблицы
-            headers = ["№", "Наименование товара", "Количество", "Цена", "Сумма", "НДС", "Сумма с НДС"]
-            data = [headers]
-
-            # Создаем пустую таблицу
-            col_widths = [30, 150, 50, 60, 60, 50, 60]
-            table = Table(data, colWidths=col_widths)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'TimesNewRoman'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph("Итого: -", normal_style))
-            elements.append(Paragraph("Сумма НДС: -", normal_style))
-            elements.append(Paragraph("Всего с НДС: -", normal_style))
-
-            doc.build(elements)
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Успех")
-            msg.setText(f"Отчет 'Счет-фактура' успешно создан: {filename}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
-
-        except Exception as e:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText(f"Ошибка при создании отчета 'Счет-фактура': {str(e)}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+        self.run_pdf_job(
+            lambda job: INVOICE_REPORT.render(on_page=pdf_page_callback(job)),
+            "Отчет 'Счет-фактура' успешно создан", "Ошибка при создании отчета 'Счет-фактура'"
+        )
 
     def generate_specification_report(self):
         """Генерирует пустой отчет 'Спецификация' в формате PDF."""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"specification_report_{timestamp}.pdf"
-            doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
-            elements = []
-
-            styles = getSampleStyleSheet()
-            title_style = styles['Heading1']
-            title_style.fontName = 'TimesNewRoman'
-            title_style.alignment = 1
-            title = "Спецификация"
-            title_paragraph = Paragraph(title, title_style)
-            elements.append(title_paragraph)
-
-            normal_style = styles['Normal']
-            normal_style.fontName = 'TimesNewRoman'
-            normal_style.fontSize = 10
-            normal_style.leading = 14
-
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph("Договор №: __________________________", normal_style))
-            elements.append(Paragraph("Дата: _______________________________", normal_style))
-            elements.append(Paragraph("<br/>", normal_style))
-
-            # Заголовки таблицы
-            headers = ["№", "Наименование", "Ед. изм.", "Количество", "Цена за ед.", "Общая сумма"]
-            data = [headers]
-
-            # Создаем пустую таблицу
-            col_widths = [30, 150, 50, 50, 60, 60]
-            table = Table(data, colWidths=col_widths)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'TimesNewRoman'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph("Итого: -", normal_style))
-
-            doc.build(elements)
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Успех")
-            msg.setText(f"Отчет 'Спецификация' успешно создан: {filename}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
-
-        except Exception as e:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Ошибка")
-            msg.setText(f"Ошибка при создании отчета 'Спецификация': {str(e)}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
+        self.run_pdf_job(
+            lambda job: SPECIFICATION_REPORT.render(on_page=pdf_page_callback(job)),
+            "Отчет 'Спецификация' успешно создан", "Ошибка при создании отчета 'Спецификация'"
+        )
 
     def generate_pdf_report(self):
         if not self.current_report_type:
@@ -2152,94 +2453,18 @@ class MainWindow(QMainWindow):
                 msg.exec_()
                 return
 
-            # Формируем данные для PDF на основе текущего состояния таблицы
+            # Строки читаются из базы порциями во время верстки, несохраненные правки сначала записываем
+            self.save_report_changes()
             title = f"Отчет по поступлению товаров на {self.selected_arrival_date}"
-            headers = ["№", "Дата поступления", "Количество", "Товар", "Описание", "Поставщик"]
-            data = [headers]
-
-            total_quantity = 0
-
-            for row in range(self.reports_table.rowCount()):
-                number = self.reports_table.item(row, 0).text()  # №
-                arrival_date = self.reports_table.item(row, 1).text()  # Дата поступления
-                quantity = int(self.reports_table.item(row, 2).text())  # Количество
-                product_name = self.reports_table.item(row, 3).text()  # Товар
-                description = self.reports_table.item(row, 4).text()  # Описание
-                supplier = self.reports_table.item(row, 5).text()  # Поставщик
-
-                total_quantity += quantity
-
-                data.append([
-                    number,
-                    arrival_date,
-                    str(quantity),
-                    product_name,
-                    description,
-                    supplier
-                ])
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"arrival_report_{timestamp}.pdf"
-            doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
-            elements = []
-
-            styles = getSampleStyleSheet()
-            title_style = styles['Heading1']
-            title_style.fontName = 'TimesNewRoman'
-            title_style.alignment = 1
-            title_paragraph = Paragraph(title, title_style)
-            elements.append(title_paragraph)
-
-            normal_style = styles['Normal']
-            normal_style.fontName = 'TimesNewRoman'
-            normal_style.fontSize = 10
-            normal_style.leading = 14
-
-            elements.append(Paragraph("<br/>", normal_style))
-
-            # Создаем стиль для текста с переносом в колонках "Товар" и "Описание"
-            cell_style = ParagraphStyle(
-                name='CellStyle',
-                fontName='TimesNewRoman',
-                fontSize=8,
-                leading=10,
-                wordWrap='CJK',
-                alignment=1
+            context = {
+                "report_date": self.selected_arrival_date_obj,
+                "visible_ids": {product.id for product in self.arrival_products},  # Без строк, удаленных из таблицы
+            }
+            self.run_pdf_job(
+                lambda job: ARRIVAL_REPORT.render(Connect.create_session(), context, title, pdf_page_callback(job)),
+                "Отчет успешно создан", "Ошибка при создании отчета"
             )
 
-            # Преобразуем данные в колонках "Товар" и "Описание" в Paragraph для переноса текста
-            for row in range(1, len(data)):  # Пропускаем заголовок
-                data[row][3] = Paragraph(data[row][3], cell_style)  # Товар
-                data[row][4] = Paragraph(data[row][4], cell_style)  # Описание
-
-            # Таблица с заданной шириной колонок
-            col_widths = [30, 100, 50, 100, 150, 100]  # Ширина колонок в пунктах
-            table = Table(data, colWidths=col_widths)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'TimesNewRoman'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-
-            # Итоговое количество
-            elements.append(Paragraph("<br/>", normal_style))
-            elements.append(Paragraph(f"Итого поступило: {total_quantity} единиц", normal_style))
-
-            doc.build(elements)
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Успех")
-            msg.setText(f"Отчет успешно создан: {filename}")
-            msg.setStandardButtons(QMessageBox.Ok)
-            msg.button(QMessageBox.Ok).setText("Хорошо")
-            msg.exec_()
-
         elif self.current_report_type == "stock":
                 if not hasattr(self, 'selected_stock_date_obj') or self.selected_stock_date_obj is None:
                     msg = QMessageBox(self)
@@ -2250,87 +2475,46 @@ class MainWindow(QMainWindow):
                     msg.exec_()
                     return
 
+                self.save_report_changes()
                 title = f"Отчет по остаткам товаров на {self.selected_stock_date}"
-                headers = ["№", "Товар", "Поставщик", "Количество товара", "Срок годности"]
-                data = [headers]
-
-                total_quantity = 0
-
-                for row in range(self.reports_table.rowCount()):
-                    number = self.reports_table.item(row, 0).text()
-                    product = self.reports_table.item(row, 1).text()
-                    supplier = self.reports_table.item(row, 2).text()
-                    quantity = int(self.reports_table.item(row, 3).text() or 0)
-                    expiry = self.reports_table.item(row, 4).text()
-
-                    total_quantity += quantity
-
-                    data.append([
-                        number,
-                        product,
-                        supplier,
-                        str(quantity),
-                        expiry
-                    ])
-
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"stock_report_{timestamp}.pdf"
-                doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
-                elements = []
-
-                styles = getSampleStyleSheet()
-                title_style = styles['Heading1']
-                title_style.fontName = 'TimesNewRoman'
-                title_style.alignment = 1
-                title_paragraph = Paragraph(title, title_style)
-                elements.append(title_paragraph)
-
-                normal_style = styles['Normal']
-                normal_style.fontName = 'TimesNewRoman'
-                normal_style.fontSize = 10
-                normal_style.leading = 14
-
-                elements.append(Paragraph("<br/>", normal_style))
-
-                cell_style = ParagraphStyle(
-                    name='CellStyle',
-                    fontName='TimesNewRoman',
-                    fontSize=8,
-                    leading=10,
-                    wordWrap='CJK',
-                    alignment=1
+                context = {
+                    "report_date": self.selected_stock_date_obj,
+                    "visible_ids": {product.id for product in self.stock_products},  # Без строк, удаленных из таблицы
+                }
+                self.run_pdf_job(
+                    lambda job: STOCK_REPORT.render(Connect.create_session(), context, title, pdf_page_callback(job)),
+                    "Отчет успешно создан", "Ошибка при создании отчета"
                 )
 
-                for row in range(1, len(data)):
-                    data[row][1] = Paragraph(data[row][1], cell_style)  # Товар
-                    data[row][2] = Paragraph(data[row][2], cell_style)  # Поставщик
-                    data[row][4] = Paragraph(data[row][4], cell_style)  # Срок годности
-
-                col_widths = [30, 150, 100, 70, 100]
-                table = Table(data, colWidths=col_widths)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, -1), 'TimesNewRoman'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ]))
-                elements.append(table)
-
-                elements.append(Paragraph("<br/>", normal_style))
-                elements.append(Paragraph(f"Итого остаток: {total_quantity} единиц", normal_style))
-
-                doc.build(elements)
+        elif self.current_report_type == "expiring":
+            title = f"Товары с истекающим сроком годности (в течение {self.expiry_days} дн.) на {self.expiry_report_date:%d.%m.%Y}"
+            context = {"report_date": self.expiry_report_date, "days": self.expiry_days}
+            self.run_pdf_job(
+                lambda job: EXPIRING_REPORT.render(Connect.create_session(), context, title, pdf_page_callback(job)),
+                "Отчет успешно создан", "Ошибка при создании отчета"
+            )
+
+        elif self.current_report_type == "order_conversion":
+            if not hasattr(self, 'selected_order_date_obj') or self.selected_order_date_obj is None:
                 msg = QMessageBox(self)
-                msg.setWindowTitle("Успех")
-                msg.setText(f"Отчет успешно создан: {filename}")
+                msg.setWindowTitle("Ошибка")
+                msg.setText("Дата для бланка заказа не выбрана!")
                 msg.setStandardButtons(QMessageBox.Ok)
                 msg.button(QMessageBox.Ok).setText("Хорошо")
                 msg.exec_()
+                return
+
+            # Бланк читается из базы, поэтому сначала сохраняем правки
+            self.save_report_changes()
+            title = f"Бланк заказа на {self.selected_order_date}"
+            context = {
+                "report_date": self.selected_order_date_obj,
+                "visible_ids": set(self.order.product_ids),  # Без строк, удаленных из таблицы
+            }
+            self.run_pdf_job(
+                lambda job: ORDER_CONVERSION_REPORT.render(Connect.create_session(), context, title, pdf_page_callback(job)),
+                "Бланк заказа успешно создан", "Ошибка при создании бланка заказа"
+            )
 
 class AuthWindow(QMainWindow):
     def __init__(self):
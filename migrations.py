@@ -0,0 +1,336 @@
+import hashlib
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+# Таблица с номерами примененных миграций (отдельные метаданные: в модели она не входит)
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("opisanie", String(250)),
+)
+
+
+def add_kartinka_hash(connection, metadata):
+    # Колонка с хэшем изображения товара (create_all не добавляет колонки в существующие таблицы)
+    columns = {column["name"] for column in inspect(connection).get_columns("tovar")}
+    if "kartinka_hash" in columns:
+        return
+    connection.execute(text("ALTER TABLE tovar ADD COLUMN kartinka_hash VARCHAR(64)"))
+    rows = connection.execute(text("SELECT id, kartinka FROM tovar WHERE kartinka IS NOT NULL"))
+    hashes = [{"id": row.id, "hash": hashlib.sha256(row.kartinka).hexdigest()} for row in rows]
+    if hashes:
+        connection.execute(text("UPDATE tovar SET kartinka_hash = :hash WHERE id = :id"), hashes)
+
+
+def create_indexes(connection, table):
+    # Индексы по колонкам, которых в базе еще нет, создаст миграция, добавляющая эти колонки
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    for index in table.indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(connection, checkfirst=True)
+
+
+def add_missing_columns(connection, table):
+    # Колонки модели, которых еще нет в таблице базы (create_all существующие таблицы не меняет).
+    # Подходит только для колонок без NOT NULL
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def remove_duplicate_reports(connection, table, date_column, sum_column=None):
+    """Оставляет одну запись на (tovar_id, дата) - с наибольшим id.
+
+    Если указан sum_column, количество дублей складывается в оставшуюся запись
+    (для отчетов, где каждая запись - отдельное событие), иначе побеждает последняя запись.
+    """
+    latest = (
+        f"SELECT MAX(id) FROM {table} WHERE tovar_id IS NOT NULL "
+        f"GROUP BY {date_column}, tovar_id"
+    )
+    if sum_column:
+        connection.execute(text(
+            f"UPDATE {table} SET {sum_column} = ("
+            f"SELECT SUM(d.{sum_column}) FROM {table} d "
+            f"WHERE d.tovar_id = {table}.tovar_id AND d.{date_column} = {table}.{date_column}) "
+            f"WHERE id IN ({latest} HAVING COUNT(*) > 1)"
+        ))
+    removed = connection.execute(text(
+        f"DELETE FROM {table} WHERE tovar_id IS NOT NULL AND id NOT IN ({latest})"
+    )).rowcount
+    if removed:
+        print(f"Удалено дублирующихся записей из {table}: {removed}")
+
+
+def add_report_indexes(connection, metadata):
+    # Перед созданием уникальных индексов убираем дубли, накопившиеся без ограничения
+    remove_duplicate_reports(connection, "otchety_po_postupleniju_tovarov", "data_postuplenija")
+    remove_duplicate_reports(connection, "otchety_po_ostatkom_tovarov", "data_formirovaniya_otcheta")
+    remove_duplicate_reports(
+        connection, "otchety_po_ubytomu_tovaru", "data_ubytija", sum_column="kolithestvo_ubytogo_tovara"
+    )
+    for table_name in ("otchety_po_postupleniju_tovarov", "otchety_po_ostatkom_tovarov", "otchety_po_ubytomu_tovaru"):
+        create_indexes(connection, metadata.tables[table_name])
+
+
+def merge_duplicates(connection, table, columns, references):
+    """Объединяет строки table с одинаковыми columns в строку с наименьшим id.
+
+    Ссылки на удаляемые дубли (references - пары (таблица, колонка)) переводятся на оставшуюся строку.
+    """
+    not_null = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+    keep = f"SELECT MIN(id) FROM {table} WHERE {not_null} GROUP BY {', '.join(columns)}"
+    duplicates = f"SELECT id FROM {table} WHERE {not_null} AND id NOT IN ({keep})"
+    same_key = " AND ".join(f"k.{column} = d.{column}" for column in columns)
+    for ref_table, ref_column in references:
+        connection.execute(text(
+            f"UPDATE {ref_table} SET {ref_column} = ("
+            f"SELECT MIN(k.id) FROM {table} k JOIN {table} d ON {same_key} WHERE d.id = {ref_table}.{ref_column}) "
+            f"WHERE {ref_column} IN ({duplicates})"
+        ))
+    removed = connection.execute(text(f"DELETE FROM {table} WHERE id IN ({duplicates})")).rowcount
+    if removed:
+        print(f"Объединено дублирующихся записей в {table}: {removed}")
+
+
+def add_address_keys(connection, metadata):
+    # Сверху вниз: после объединения городов могут появиться одинаковые улицы одного города
+    merge_duplicates(connection, "gorod", ["oblast_id", "nazvanie"], [("ulica", "gorod_id")])
+    merge_duplicates(connection, "ulica", ["gorod_id", "nazvanie"], [("dom_stroenie", "ulica_id")])
+    merge_duplicates(connection, "dom_stroenie", ["ulica_id", "nomer"], [("postavshik", "juridicheskij_adres")])
+    for table_name in ("gorod", "ulica", "dom_stroenie"):
+        create_indexes(connection, metadata.tables[table_name])
+
+
+# Триггеры PostgreSQL: время изменения строки и запись об удалении для синхронизации реплик
+POSTGRESQL_ROW_VERSION_FUNCTIONS = [
+    "CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$ "
+    "BEGIN NEW.updated_at := now(); RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION record_deleted_row() RETURNS trigger AS $$ "
+    "BEGIN INSERT INTO udalennye_zapisi (tablica, zapis_id) VALUES (TG_TABLE_NAME, OLD.id); RETURN OLD; END $$ "
+    "LANGUAGE plpgsql",
+]
+POSTGRESQL_ROW_VERSION_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_{table}_updated_at ON {table}",
+    "CREATE TRIGGER trg_{table}_updated_at BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE PROCEDURE touch_updated_at()",
+    "DROP TRIGGER IF EXISTS trg_{table}_deleted ON {table}",
+    "CREATE TRIGGER trg_{table}_deleted AFTER DELETE ON {table} FOR EACH ROW EXECUTE PROCEDURE record_deleted_row()",
+]
+# В SQLite у добавленной через ALTER TABLE колонки нет DEFAULT CURRENT_TIMESTAMP, его заменяет триггер вставки
+SQLITE_ROW_VERSION_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_inserted AFTER INSERT ON {table} WHEN NEW.updated_at IS NULL "
+    "BEGIN UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END",
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_updated_at AFTER UPDATE ON {table} "
+    "WHEN NEW.updated_at IS OLD.updated_at "
+    "BEGIN UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END",
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_deleted AFTER DELETE ON {table} "
+    "BEGIN INSERT INTO udalennye_zapisi (tablica, zapis_id, udaleno) VALUES ('{table}', OLD.id, CURRENT_TIMESTAMP); END",
+]
+
+
+def add_row_versions(connection, metadata):
+    # updated_at и учет удалений для таблиц, которые забирает локальная реплика
+    dialect = connection.dialect.name
+    metadata.tables["udalennye_zapisi"].create(connection, checkfirst=True)
+    if dialect == "postgresql":
+        for statement in POSTGRESQL_ROW_VERSION_FUNCTIONS:
+            connection.execute(text(statement))
+    for table in metadata.sorted_tables:
+        if "updated_at" in table.c:
+            add_row_version(connection, table)
+
+
+def add_row_version(connection, table):
+    # Колонка updated_at (если ее еще нет), индекс по ней и триггеры одной таблицы
+    dialect = connection.dialect.name
+    columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    if "updated_at" not in columns:
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN updated_at TIMESTAMP"))
+        connection.execute(text(f"UPDATE {table.name} SET updated_at = CURRENT_TIMESTAMP"))
+        if dialect == "postgresql":
+            connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN updated_at SET DEFAULT now()"))
+    create_indexes(connection, table)
+
+    if dialect == "postgresql":
+        triggers = POSTGRESQL_ROW_VERSION_TRIGGERS
+    elif dialect == "sqlite":
+        triggers = SQLITE_ROW_VERSION_TRIGGERS
+    else:
+        return
+    for statement in triggers:
+        connection.execute(text(statement.format(table=table.name)))
+
+# Колонки поиска на вкладках (см. search.py): индексы pg_trgm ускоряют поиск по регулярному выражению ~*
+SEARCH_INDEXES = [
+    ("ix_tovar_opisanie_trgm", "tovar", "opisanie"),
+    ("ix_postavshik_nazvanie_trgm", "postavshik", "nazvanie_postavshika"),
+    ("ix_sotrudnik_familiya_trgm", "sotrudnik", "familiya"),
+]
+
+
+def add_search_indexes(connection, metadata):
+    # В SQLite поиск идет по индексу в памяти, в базе ничего не создается
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        # Без прав на расширение поиск работает, но без индекса
+        print(f"Расширение pg_trgm не установлено, поиск будет без индекса: {e}")
+        return
+    for name, table, column in SEARCH_INDEXES:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)"))
+
+
+# Отчеты, из которых складываются дневные итоги dvizhenie_tovara:
+# (таблица, колонка даты, колонка количества, колонка итогов)
+STOCK_MOVEMENT_SOURCES = [
+    ("otchety_po_postupleniju_tovarov", "data_postuplenija", "kolithestvo_postupivshih_tovarov", "postupilo"),
+    ("otchety_po_ubytomu_tovaru", "data_ubytija", "kolithestvo_ubytogo_tovara", "ubylo"),
+]
+# Вычесть старую строку отчета из итогов дня и удалить опустевшие итоги
+# (иначе строка итогов не дала бы удалить товар)
+STOCK_MOVEMENT_SUBTRACT = (
+    "UPDATE dvizhenie_tovara SET {total} = {total} - OLD.{quantity} "
+    "WHERE tovar_id = OLD.tovar_id AND data = OLD.{date}; "
+    "DELETE FROM dvizhenie_tovara "
+    "WHERE tovar_id = OLD.tovar_id AND data = OLD.{date} AND postupilo = 0 AND ubylo = 0;"
+)
+POSTGRESQL_STOCK_MOVEMENT_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION {table}_movement() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP IN ('UPDATE', 'DELETE') THEN " + STOCK_MOVEMENT_SUBTRACT + " END IF; "
+    "IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.tovar_id IS NOT NULL THEN "
+    "INSERT INTO dvizhenie_tovara (tovar_id, data, {total}) VALUES (NEW.tovar_id, NEW.{date}, NEW.{quantity}) "
+    "ON CONFLICT (tovar_id, data) DO UPDATE SET {total} = dvizhenie_tovara.{total} + EXCLUDED.{total}; "
+    "END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql"
+)
+POSTGRESQL_STOCK_MOVEMENT_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_{table}_movement ON {table}",
+    "CREATE TRIGGER trg_{table}_movement AFTER INSERT OR UPDATE OR DELETE ON {table} "
+    "FOR EACH ROW EXECUTE PROCEDURE {table}_movement()",
+]
+# WHERE после SELECT обязателен: без него SQLite принял бы ON CONFLICT за условие соединения
+SQLITE_STOCK_MOVEMENT_ADD = (
+    "INSERT INTO dvizhenie_tovara (tovar_id, data, {total}) "
+    "SELECT NEW.tovar_id, NEW.{date}, NEW.{quantity} WHERE NEW.tovar_id IS NOT NULL "
+    "ON CONFLICT (tovar_id, data) DO UPDATE SET {total} = {total} + excluded.{total};"
+)
+SQLITE_STOCK_MOVEMENT_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_movement_inserted AFTER INSERT ON {table} "
+    "BEGIN " + SQLITE_STOCK_MOVEMENT_ADD + " END",
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_movement_updated AFTER UPDATE ON {table} "
+    "BEGIN " + STOCK_MOVEMENT_SUBTRACT + " " + SQLITE_STOCK_MOVEMENT_ADD + " END",
+    "CREATE TRIGGER IF NOT EXISTS trg_{table}_movement_deleted AFTER DELETE ON {table} "
+    "BEGIN " + STOCK_MOVEMENT_SUBTRACT + " END",
+]
+
+
+def rebuild_stock_movement(connection):
+    """Пересчитывает dvizhenie_tovara целиком по отчетам о поступлении и убытии."""
+    parts = " UNION ALL ".join(
+        f"SELECT tovar_id, {date} AS data, "
+        + ", ".join(f"{quantity if column == total else 0} AS {column}" for column in ("postupilo", "ubylo"))
+        + f" FROM {table} WHERE tovar_id IS NOT NULL AND {date} IS NOT NULL AND {quantity} IS NOT NULL"
+        for table, date, quantity, total in STOCK_MOVEMENT_SOURCES
+    )
+    connection.execute(text("DELETE FROM dvizhenie_tovara"))
+    connection.execute(text(
+        "INSERT INTO dvizhenie_tovara (tovar_id, data, postupilo, ubylo) "
+        f"SELECT tovar_id, data, SUM(postupilo), SUM(ubylo) FROM ({parts}) d GROUP BY tovar_id, data"
+    ))
+
+
+def add_stock_movement_triggers(connection):
+    # Триггеры итогов на таблицах отчетов (используются и локальной репликой)
+    dialect = connection.dialect.name
+    for source, date, quantity, total in STOCK_MOVEMENT_SOURCES:
+        names = {"table": source, "date": date, "quantity": quantity, "total": total}
+        if dialect == "postgresql":
+            statements = [POSTGRESQL_STOCK_MOVEMENT_FUNCTION] + POSTGRESQL_STOCK_MOVEMENT_TRIGGERS
+        elif dialect == "sqlite":
+            statements = SQLITE_STOCK_MOVEMENT_TRIGGERS
+        else:
+            statements = []
+        for statement in statements:
+            connection.execute(text(statement.format(**names)))
+
+
+def add_stock_movement(connection, metadata):
+    # Итоги по дням ведут триггеры, поэтому расчет остатка не просматривает все отчеты
+    table = metadata.tables["dvizhenie_tovara"]
+    table.create(connection, checkfirst=True)
+    rebuild_stock_movement(connection)
+    add_stock_movement_triggers(connection)
+    add_row_version(connection, table)
+
+
+def add_orders(connection, metadata):
+    # Бланки заказа сохраняются в базе, а не только в таблице на экране
+    table = metadata.tables["zakaz_tovara"]
+    table.create(connection, checkfirst=True)
+    add_row_version(connection, table)
+
+
+def add_expiry_dates(connection, metadata):
+    # Срок годности партии хранится датой с индексом для выборки "истекает в ближайшие N дней"
+    table = metadata.tables["otchety_po_ostatkom_tovarov"]
+    add_missing_columns(connection, table)
+    create_indexes(connection, table)
+
+
+def scope_city_names(connection, metadata):
+    # Миграция 3 делала название города уникальным во всей базе; ключ города - (область, название).
+    # Города, объединенные прежней миграцией, не разделяются
+    connection.execute(text("DROP INDEX IF EXISTS uq_gorod_nazvanie"))
+    create_indexes(connection, metadata.tables["gorod"])
+
+
+# Миграции применяются по порядку номеров, каждая в своей транзакции.
+# Функции должны быть безопасны и для новой базы, где create_all уже создал все объекты.
+MIGRATIONS = [
+    (1, "Хэш изображения товара", add_kartinka_hash),
+    (2, "Уникальность и индексы отчетов по (tovar_id, дата)", add_report_indexes),
+    (3, "Уникальность уровней адреса (город, улица, дом)", add_address_keys),
+    (4, "Время изменения и учет удаленных записей для реплик", add_row_versions),
+    (5, "Индексы поиска по товарам, поставщикам и сотрудникам", add_search_indexes),
+    (6, "Дневные итоги движения товара для расчета остатков", add_stock_movement),
+    (7, "Сохраненные бланки заказа", add_orders),
+    (8, "Срок годности товара в отчете по остаткам", add_expiry_dates),
+    (9, "Уникальность названия города в пределах области", scope_city_names),
+]
+
+
+def current_version(connection):
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def run_migrations(engine, metadata):
+    """Применяет к базе миграции, которые еще не были применены. Возвращает их количество."""
+    version_metadata.create_all(engine)
+    applied = 0
+    for version, opisanie, migrate in MIGRATIONS:
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                # Несколько одновременно запущенных приложений применяют миграции по очереди
+                connection.execute(text("LOCK TABLE schema_version IN EXCLUSIVE MODE"))
+            if current_version(connection) >= version:
+                continue
+            print(f"Применение миграции {version}: {opisanie}")
+            migrate(connection, metadata)
+            connection.execute(schema_version.insert().values(version=version, opisanie=opisanie))
+            applied += 1
+    return applied
+
+
+if __name__ == "__main__":
+    # Обновление схемы существующей базы: python migrations.py
+    from models import Connect
+    Connect.init_db()
+    print("Схема базы данных обновлена.")
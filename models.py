@@ -1,6 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, Numeric, Enum, LargeBinary
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy import (
+    create_engine, event, func, Column, Index, Integer, String, ForeignKey, Date, DateTime, Numeric, Enum, LargeBinary,
+    FetchedValue
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, scoped_session, deferred, validates
 import enum
+import hashlib
+
+from db_config import load_database_config
+from instrumentation import configure as configure_instrumentation, monitor as query_monitor
+from migrations import run_migrations
 
 Base = declarative_base()
 
@@ -30,11 +39,17 @@ class TipPostavshika(enum.Enum):
     IP = "ИП"
     ZAO = "ЗАО"
 
+def updated_at_column():
+    # Время последнего изменения записи. Значение ставит сама база (DEFAULT и триггер, см. migrations),
+    # по нему локальная реплика забирает только изменившиеся строки
+    return Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue(), index=True)
+
 # Таблицы базы данных
 class Oblast(Base):
     __tablename__ = "oblast"
     id = Column(Integer, primary_key=True)
     nazvanie = Column(String(100), nullable=False)
+    updated_at = updated_at_column()
     goroda = relationship("Gorod", back_populates="oblast")
 
 class Gorod(Base):
@@ -43,24 +58,32 @@ class Gorod(Base):
     nazvanie = Column(String(100), nullable=False)
     sok_nazvanie = Column(String(100), nullable=False)
     oblast_id = Column(Integer, ForeignKey("oblast.id"))
+    updated_at = updated_at_column()
     oblast = relationship("Oblast", back_populates="goroda")
     ulicy = relationship("Ulica", back_populates="gorod")
+    # Уникальные ключи уровней адреса нужны для INSERT ... ON CONFLICT при сохранении адреса.
+    # Одноименные города разных областей допустимы
+    __table_args__ = (Index("uq_gorod_oblast_nazvanie", "oblast_id", "nazvanie", unique=True),)
 
 class Ulica(Base):
     __tablename__ = "ulica"
     id = Column(Integer, primary_key=True)
     nazvanie = Column(String(100), nullable=False)
     gorod_id = Column(Integer, ForeignKey("gorod.id"))
+    updated_at = updated_at_column()
     gorod = relationship("Gorod", back_populates="ulicy")
     doma = relationship("DomStroenie", back_populates="ulica")
+    __table_args__ = (Index("uq_ulica_gorod_nazvanie", "gorod_id", "nazvanie", unique=True),)
 
 class DomStroenie(Base):
     __tablename__ = "dom_stroenie"
     id = Column(Integer, primary_key=True)
     nomer = Column(Integer, nullable=False)
     ulica_id = Column(Integer, ForeignKey("ulica.id"))
+    updated_at = updated_at_column()
     ulica = relationship("Ulica", back_populates="doma")
     postavshiki = relationship("Postavshik", back_populates="juridicheskij_adres_rel")
+    __table_args__ = (Index("uq_dom_ulica_nomer", "ulica_id", "nomer", unique=True),)
 
 class Postavshik(Base):
     __tablename__ = "postavshik"
@@ -70,6 +93,7 @@ class Postavshik(Base):
     kontakt_tel = Column(String(100))
     email = Column(String(100))
     juridicheskij_adres = Column(Integer, ForeignKey("dom_stroenie.id"))
+    updated_at = updated_at_column()
     juridicheskij_adres_rel = relationship("DomStroenie", back_populates="postavshiki") 
     podrobnosti = relationship("PodrobnaiaInformacijaOPostavshike", back_populates="postavshik")
     tovar = relationship("Tovar", back_populates="postavshik")
@@ -100,12 +124,22 @@ class Tovar(Base):
     nomer = Column(Integer, nullable=False)
     opisanie = Column(String(100))
     cena = Column(Numeric(10, 2))
-    kartinka = Column(LargeBinary)
+    # Изображение не загружается вместе с товаром, только при явном обращении
+    kartinka = deferred(Column(LargeBinary))
+    # SHA-256 изображения: позволяет проверить кэш без загрузки самого изображения
+    kartinka_hash = Column(String(64))
     postavshik_id = Column(Integer, ForeignKey("postavshik.id"))
+    updated_at = updated_at_column()
     postavshik = relationship("Postavshik", back_populates="tovar")
     otchety_postuplenija = relationship("OtchetyPoPostuplenijuTovarov", back_populates="tovar")
     otchety_ostatki = relationship("OtchetyPoOstatkamTovarov", back_populates="tovar")
     otchety_ubytie = relationship("OtchetyPoUbytomuTovaru", back_populates="tovar")
+    zakazy = relationship("ZakazTovara", back_populates="tovar")
+
+    @validates("kartinka")
+    def _update_kartinka_hash(self, key, value):
+        self.kartinka_hash = hashlib.sha256(value).hexdigest() if value else None
+        return value
 
 class Sotrudnik(Base):
     __tablename__ = "sotrudnik"
@@ -117,6 +151,7 @@ class Sotrudnik(Base):
     inn = Column(Integer)
     snils = Column(Integer)
     pol = Column(Enum(Pol), nullable=False)
+    updated_at = updated_at_column()
     podrobnosti = relationship("PodrobnaiaInformacijaOSotrudnike", back_populates="sotrudnik")
 
 class PodrobnaiaInformacijaOSotrudnike(Base):
@@ -154,16 +189,29 @@ class OtchetyPoPostuplenijuTovarov(Base):
     data_formirovaniya_otcheta = Column(Date, nullable=False)
     tovar_id = Column(Integer, ForeignKey("tovar.id"))
     postavshik_id = Column(Integer, ForeignKey("postavshik.id"))
+    updated_at = updated_at_column()
     tovar = relationship("Tovar", back_populates="otchety_postuplenija")
     postavshik = relationship("Postavshik", back_populates="otchety_postuplenija")
+    __table_args__ = (
+        # Одна запись на товар за дату; дата первой - индекс подходит и для выборки отчета за дату
+        Index("uq_postuplenie_data_tovar", "data_postuplenija", "tovar_id", unique=True),
+        Index("ix_postuplenie_tovar_data", "tovar_id", "data_postuplenija"),
+    )
 
 class OtchetyPoOstatkamTovarov(Base):
     __tablename__ = "otchety_po_ostatkom_tovarov"
     id = Column(Integer, primary_key=True)
     kolithestvo_tovara = Column(Integer, nullable=False)
     data_formirovaniya_otcheta = Column(Date, nullable=False)
+    srok_godnosti = Column(Date)  # Годен до (для партии на дату инвентаризации)
     tovar_id = Column(Integer, ForeignKey("tovar.id"))
+    updated_at = updated_at_column()
     tovar = relationship("Tovar", back_populates="otchety_ostatki")
+    __table_args__ = (
+        Index("uq_ostatki_data_tovar", "data_formirovaniya_otcheta", "tovar_id", unique=True),
+        Index("ix_ostatki_tovar_data", "tovar_id", "data_formirovaniya_otcheta"),
+        Index("ix_ostatki_srok_godnosti", "srok_godnosti"),
+    )
 
 class OtchetyPoUbytomuTovaru(Base):
     __tablename__ = "otchety_po_ubytomu_tovaru"
@@ -172,13 +220,141 @@ class OtchetyPoUbytomuTovaru(Base):
     kolithestvo_ubytogo_tovara = Column(Integer, nullable=False)
     data_formirovaniya_otcheta = Column(Date, nullable=False)
     tovar_id = Column(Integer, ForeignKey("tovar.id"))
+    updated_at = updated_at_column()
     tovar = relationship("Tovar", back_populates="otchety_ubytie")
+    __table_args__ = (
+        Index("uq_ubytie_data_tovar", "data_ubytija", "tovar_id", unique=True),
+        Index("ix_ubytie_tovar_data", "tovar_id", "data_ubytija"),
+        # Отчет по убытию выбирается по дате формирования
+        Index("ix_ubytie_data_formirovaniya", "data_formirovaniya_otcheta"),
+    )
+
+class ZakazTovara(Base):
+    # Строка бланка заказа на дату: количество и цена на момент заказа
+    __tablename__ = "zakaz_tovara"
+    id = Column(Integer, primary_key=True)
+    data_zakaza = Column(Date, nullable=False)
+    kolithestvo = Column(Integer, nullable=False)
+    cena = Column(Numeric(10, 2))
+    tovar_id = Column(Integer, ForeignKey("tovar.id"))
+    updated_at = updated_at_column()
+    tovar = relationship("Tovar", back_populates="zakazy")
+    __table_args__ = (
+        Index("uq_zakaz_data_tovar", "data_zakaza", "tovar_id", unique=True),
+    )
+
+class DvizhenieTovara(Base):
+    # Поступление и убытие товара за день. Ведется триггерами по таблицам отчетов (миграция 6),
+    # из приложения не изменяется; используется для расчета остатков (stock_ledger.py)
+    __tablename__ = "dvizhenie_tovara"
+    id = Column(Integer, primary_key=True)
+    tovar_id = Column(Integer, ForeignKey("tovar.id"), nullable=False)
+    data = Column(Date, nullable=False)
+    postupilo = Column(Integer, nullable=False, server_default="0")
+    ubylo = Column(Integer, nullable=False, server_default="0")
+    updated_at = updated_at_column()
+    __table_args__ = (
+        Index("uq_dvizhenie_tovar_data", "tovar_id", "data", unique=True),
+    )
+
+class UdalennyeZapisi(Base):
+    # Удаленные записи таблиц с updated_at (заполняется триггером): реплика удаляет их у себя
+    __tablename__ = "udalennye_zapisi"
+    id = Column(Integer, primary_key=True)
+    tablica = Column(String(100), nullable=False)
+    zapis_id = Column(Integer, nullable=False)
+    udaleno = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+# Строка подключения и настройки пула: database.ini и переменные окружения (см. db_config)
+DB_CONFIG = load_database_config()
+DATABASE_URL = DB_CONFIG.url
+POOL_SETTINGS = DB_CONFIG.pool
+configure_instrumentation(DB_CONFIG)
+
+
+def engine_settings(url, pool_settings):
+    """Параметры create_engine для строки подключения."""
+    url = make_url(url)
+    settings = dict(POOL_SETTINGS)
+    settings.update(pool_settings)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # База в памяти существует в одном соединении, настройки пула к ней неприменимы
+        return dict(pool_settings)
+    return settings
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in DB_CONFIG.sqlite_pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 
 class Connect:
-    @staticmethod
-    def create_session():
-        engine = create_engine("postgresql://postgres:1@localhost:5433/postgres") 
+    # База по умолчанию; в автономном режиме это локальная реплика (см. replica.open_replica)
+    default_url = DATABASE_URL
+    # Общие для всего процесса движки и фабрики сессий (ключ - строка подключения)
+    _engines = {}
+    _session_factories = {}
+    _initialized_urls = set()
+
+    @classmethod
+    def get_engine(cls, url=None, **pool_settings):
+        url = url or cls.default_url
+        engine = cls._engines.get(url)
+        if engine is None:
+            engine = create_engine(url, echo=DB_CONFIG.echo, **engine_settings(url, pool_settings))
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _set_sqlite_pragmas)
+            # Время запросов по экранам и журнал медленных запросов (instrumentation.py)
+            query_monitor.install(engine)
+            cls._engines[url] = engine
+        return engine
+
+    @classmethod
+    def init_db(cls, url=None):
+        """Создает схему базы данных один раз за время работы процесса."""
+        url = url or cls.default_url
+        if url in cls._initialized_urls:
+            return
+        engine = cls.get_engine(url)
         Base.metadata.create_all(engine)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        return session
\ No newline at end of file
+        # Изменения схемы для баз, созданных предыдущими версиями приложения
+        run_migrations(engine, Base.metadata)
+        cls._initialized_urls.add(url)
+
+    @classmethod
+    def session_factory(cls, url=None):
+        url = url or cls.default_url
+        factory = cls._session_factories.get(url)
+        if factory is None:
+            factory = scoped_session(sessionmaker(bind=cls.get_engine(url)))
+            cls._session_factories[url] = factory
+        return factory
+
+    @classmethod
+    def create_session(cls, url=None):
+        # Сессия привязана к текущему потоку и берет соединения из общего пула
+        return cls.session_factory(url)()
+
+    @classmethod
+    def remove_session(cls, url=None):
+        factory = cls._session_factories.get(url or cls.default_url)
+        if factory is not None:
+            factory.remove()
+
+    @classmethod
+    def dispose(cls, close=True):
+        # close=False - в дочернем процессе: соединения родителя не закрываются, а только забываются
+        for factory in cls._session_factories.values():
+            factory.remove()
+        for engine in cls._engines.values():
+            engine.dispose(close=close)
+        cls._session_factories.clear()
+        cls._engines.clear()
+        cls._initialized_urls.clear()
+
+if __name__ == "__main__":
+    # Явное создание схемы: python models.py
+    Connect.init_db()
+    print("Схема базы данных создана.")
@@ -0,0 +1,98 @@
+"""Бланк заказа в колонках.
+
+Количества и цены хранятся в массивах целых чисел (цены - в копейках), поэтому
+деньги считаются точно, а правка одной строки обновляет ее сумму и итоги заказа
+за O(1), без пересчета остальных строк.
+"""
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+from operator import mul
+
+# "Возможная цена" - 3% от суммы строки (условия получения: "3% скидка")
+DISCOUNT_PERCENT = 3
+DISCOUNT_TEXT = f"{DISCOUNT_PERCENT}% скидка"
+
+CENT = Decimal("0.01")
+
+
+def to_cents(price):
+    return int((Decimal(price or 0) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def discount_cents(sum_cents):
+    # Округление до копейки по правилам бухгалтерии (половина - вверх)
+    return int((Decimal(sum_cents * DISCOUNT_PERCENT) / 100).to_integral_value(ROUND_HALF_UP))
+
+
+def order_line(quantity, price):
+    """Сумма и возможная цена строки (Decimal) для количества и цены."""
+    sum_cents = quantity * to_cents(price)
+    return from_cents(sum_cents), from_cents(discount_cents(sum_cents))
+
+
+class OrderConversion:
+    """Строки бланка заказа: id товара, цена и количество в параллельных массивах."""
+
+    def __init__(self, product_ids, prices, quantities=None):
+        self.product_ids = array("q", product_ids)
+        self.prices = array("q", (to_cents(price) for price in prices))
+        self.quantities = array("q", quantities if quantities is not None else [0] * len(self.product_ids))
+        self.recompute()
+
+    @classmethod
+    def from_products(cls, products, saved=None):
+        """Бланк по строкам report_products; saved - {tovar_id: (количество, цена)} сохраненного заказа."""
+        saved = saved or {}
+        product_ids, prices, quantities = [], [], []
+        for product in products:
+            quantity, price = saved.get(product.id, (0, product.cena))
+            product_ids.append(product.id)
+            prices.append(price if price is not None else product.cena)
+            quantities.append(quantity)
+        return cls(product_ids, prices, quantities)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def recompute(self):
+        # Итоги всего заказа за один проход по колонкам
+        sums = list(map(mul, self.quantities, self.prices))
+        self.total_cents = sum(sums)
+        self.discount_total_cents = sum(map(discount_cents, sums))
+
+    def set_quantity(self, row, quantity):
+        """Меняет количество строки и итоги заказа на разницу со старым значением."""
+        price = self.prices[row]
+        old_sum = self.quantities[row] * price
+        new_sum = quantity * price
+        self.quantities[row] = quantity
+        self.total_cents += new_sum - old_sum
+        self.discount_total_cents += discount_cents(new_sum) - discount_cents(old_sum)
+
+    def remove_rows(self, rows):
+        """Удаляет строки (номера в текущем порядке) и вычитает их из итогов."""
+        for row in sorted(set(rows), reverse=True):
+            self.set_quantity(row, 0)
+            del self.product_ids[row]
+            del self.prices[row]
+            del self.quantities[row]
+
+    def price(self, row):
+        return from_cents(self.prices[row])
+
+    def line(self, row):
+        """Сумма и возможная цена строки."""
+        sum_cents = self.quantities[row] * self.prices[row]
+        return from_cents(sum_cents), from_cents(discount_cents(sum_cents))
+
+    @property
+    def total(self):
+        return from_cents(self.total_cents)
+
+    @property
+    def discount_total(self):
+        return from_cents(self.discount_total_cents)
@@ -0,0 +1,163 @@
+"""Режим профилирования действий пользователя.
+
+Включается флагом запуска --profile (или --profile=КАТАЛОГ) либо переменной
+окружения APP_PROFILE (значение - каталог; "1" - каталог по умолчанию). Тогда
+обработчики MainWindow (загрузка, сохранение, отчеты и т. п.) и запущенные из
+них фоновые задачи выполняются под cProfile:
+
+- для действий дольше DUMP_THRESHOLD_MS сохраняется файл .pstats (его открывают
+  snakeviz, gprof2dot, flameprof или модуль pstats);
+- при выходе выводится сводка самых медленных действий сеанса (и пишется
+  в summary.txt того же каталога).
+"""
+import atexit
+import cProfile
+from contextlib import contextmanager
+import functools
+import inspect
+import itertools
+import os
+import re
+import threading
+import time
+
+PROFILE_ENV = "APP_PROFILE"
+PROFILE_FLAG = "--profile"
+DEFAULT_PROFILE_DIR = "profiles"
+DUMP_THRESHOLD_MS = 100     # Быстрые действия попадают только в сводку
+SUMMARY_SIZE = 15
+
+# Обработчики MainWindow, которые профилируются (по началу имени метода)
+PROFILED_PREFIXES = (
+    "load_", "save_", "generate_", "populate_", "delete_", "add_", "edit_", "apply_", "finish_", "handle_",
+)
+
+_state = threading.local()
+
+
+class ActionStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+
+
+class Profiler:
+    """Замеры действий: время каждого действия и профиль cProfile внешнего действия потока."""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = DEFAULT_PROFILE_DIR
+        self.actions = {}
+        self._lock = threading.Lock()
+        self._numbers = itertools.count(1)
+
+    def enable(self, directory=None):
+        self.enabled = True
+        self.directory = directory or DEFAULT_PROFILE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self.print_summary)
+        print(f"Профилирование включено, профили сохраняются в {os.path.abspath(self.directory)}")
+
+    @contextmanager
+    def span(self, name):
+        """Замер действия name; вложенные действия входят в профиль внешнего."""
+        if not self.enabled:
+            yield
+            return
+        outer = getattr(_state, "action", None)
+        profile = cProfile.Profile() if outer is None else None
+        _state.action = name
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = (time.perf_counter() - started) * 1000
+            _state.action = outer
+            with self._lock:
+                self.actions.setdefault(name, ActionStats()).add(elapsed)
+            if profile is not None and elapsed >= DUMP_THRESHOLD_MS:
+                self._dump(profile, name, elapsed)
+
+    def _dump(self, profile, name, elapsed):
+        slug = re.sub(r"\W+", "_", name).strip("_")[:60]
+        path = os.path.join(self.directory, f"{next(self._numbers):04d}_{slug}_{elapsed:.0f}ms.pstats")
+        profile.dump_stats(path)
+        print(f"Профиль действия {name} ({elapsed:.0f} мс): {path}")
+
+    def wrap(self, name, method):
+        """Обработчик сигнала, выполняемый как действие name."""
+        # Qt передает сигналу все его аргументы; лишние (например, checked у clicked) отбрасываем,
+        # как это сделал бы PySide для исходного метода
+        parameters = inspect.signature(method).parameters.values()
+        if any(parameter.kind is parameter.VAR_POSITIONAL for parameter in parameters):
+            accepted = None
+        else:
+            accepted = sum(
+                parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+                for parameter in parameters
+            )
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.span(name):
+                return method(*args[:accepted], **kwargs)
+        return wrapper
+
+    def wrap_slots(self, window, prefixes=PROFILED_PREFIXES):
+        """Подменяет обработчики окна обертками; вызывать до подключения сигналов."""
+        if not self.enabled:
+            return
+        for name, member in inspect.getmembers(type(window), inspect.isfunction):
+            if name.startswith(prefixes):
+                setattr(window, name, self.wrap(f"{type(window).__name__}.{name}", getattr(window, name)))
+
+    def summary_lines(self, limit=SUMMARY_SIZE):
+        with self._lock:
+            slowest = sorted(self.actions.items(), key=lambda item: item[1].max_ms, reverse=True)[:limit]
+        lines = [f"{'Действие':<60} {'Вызовов':>8} {'Всего, мс':>10} {'Среднее, мс':>12} {'Макс., мс':>10}"]
+        for name, stats in slowest:
+            lines.append(
+                f"{name:<60} {stats.count:>8} {stats.total_ms:>10.0f} "
+                f"{stats.total_ms / stats.count:>12.1f} {stats.max_ms:>10.0f}"
+            )
+        return lines
+
+    def print_summary(self):
+        if not self.actions:
+            return
+        lines = self.summary_lines()
+        print("Самые медленные действия сеанса:")
+        print("\n".join(lines))
+        with open(os.path.join(self.directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def current_action():
+    """Действие, выполняющееся в текущем потоке (None - профилирование не идет)."""
+    return getattr(_state, "action", None)
+
+
+def profile_directory(argv, environ):
+    # Каталог профилей из флага запуска или переменной окружения; None - режим выключен
+    for argument in argv:
+        if argument == PROFILE_FLAG:
+            return DEFAULT_PROFILE_DIR
+        if argument.startswith(PROFILE_FLAG + "="):
+            return argument.split("=", 1)[1] or DEFAULT_PROFILE_DIR
+    value = environ.get(PROFILE_ENV, "").strip()
+    if not value or value.lower() in ("0", "false", "no", "off", "нет"):
+        return None
+    return DEFAULT_PROFILE_DIR if value.lower() in ("1", "true", "yes", "on", "да") else value
+
+
+profiler = Profiler()
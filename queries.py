@@ -0,0 +1,299 @@
+from datetime import timedelta
+
+from sqlalchemy import and_, delete, exists, inspect, select, update
+from sqlalchemy.orm import aliased, joinedload, ONETOMANY
+
+from models import (
+    Postavshik, Tovar, Sotrudnik, Gorod, Ulica, DomStroenie,
+    OtchetyPoPostuplenijuTovarov, OtchetyPoOstatkamTovarov, OtchetyPoUbytomuTovaru, ZakazTovara
+)
+from stock_ledger import on_hand_column, expiry_column
+from change_events import ChangeKind, record_changes
+
+
+def format_address(city, street, house):
+    if city is None and street is None and house is None:
+        return ""
+    return f"{city}, {street}, {house}"
+
+
+# Поставщики: адрес собирается одним запросом через цепочку dom_stroenie -> ulica -> gorod
+def suppliers_query(session):
+    return (
+        session.query(
+            Postavshik.id,
+            Postavshik.nazvanie_postavshika,
+            Postavshik.tip_postavshika,
+            Postavshik.kontakt_tel,
+            Postavshik.email,
+            Gorod.nazvanie.label("gorod"),
+            Ulica.nazvanie.label("ulica"),
+            DomStroenie.nomer.label("dom"),
+        )
+        .outerjoin(DomStroenie, Postavshik.juridicheskij_adres == DomStroenie.id)
+        .outerjoin(Ulica, DomStroenie.ulica_id == Ulica.id)
+        .outerjoin(Gorod, Ulica.gorod_id == Gorod.id)
+    )
+
+SUPPLIER_COLUMNS = [
+    ("№", lambda row: row.id),
+    ("Название", lambda row: row.nazvanie_postavshika),
+    ("Тип", lambda row: row.tip_postavshika),
+    ("Телефон", lambda row: row.kontakt_tel),
+    ("Email", lambda row: row.email),
+    ("Юридический адрес", lambda row: format_address(row.gorod, row.ulica, row.dom)),
+]
+
+
+# Товары: название поставщика берется из того же запроса
+def products_query(session):
+    return (
+        session.query(
+            Tovar.id,
+            Tovar.nazvanie,
+            Tovar.nomer,
+            Tovar.opisanie,
+            Tovar.cena,
+            Tovar.postavshik_id,
+            Postavshik.nazvanie_postavshika,
+        )
+        .outerjoin(Postavshik, Tovar.postavshik_id == Postavshik.id)
+    )
+
+PRODUCT_COLUMNS = [
+    ("№", lambda row: row.id),
+    ("Тип", lambda row: row.nazvanie),
+    ("Номер", lambda row: row.nomer),
+    ("Описание", lambda row: row.opisanie),
+    ("Цена", lambda row: row.cena),
+    ("Поставщик", lambda row: row.nazvanie_postavshika),
+]
+
+
+def employees_query(session):
+    return session.query(
+        Sotrudnik.id,
+        Sotrudnik.familiya,
+        Sotrudnik.imya,
+        Sotrudnik.otchestvo,
+        Sotrudnik.pol,
+    )
+
+EMPLOYEE_COLUMNS = [
+    ("№", lambda row: row.id),
+    ("Фамилия", lambda row: row.familiya),
+    ("Имя", lambda row: row.imya),
+    ("Отчество", lambda row: row.otchestvo),
+    ("Пол", lambda row: row.pol),
+]
+
+
+# --- Загрузка отдельных записей для форм редактирования ---
+
+def get_supplier(session, supplier_id):
+    # Поставщик вместе с полной цепочкой адреса (один запрос)
+    return (
+        session.query(Postavshik)
+        .options(
+            joinedload(Postavshik.juridicheskij_adres_rel)
+            .joinedload(DomStroenie.ulica)
+            .joinedload(Ulica.gorod)
+        )
+        .filter(Postavshik.id == supplier_id)
+        .first()
+    )
+
+def load_product_image(session, product_id):
+    # Изображение товара загружается отдельно и только по запросу
+    return session.query(Tovar.kartinka).filter(Tovar.id == product_id).scalar()
+
+def get_product(session, product_id):
+    return (
+        session.query(Tovar)
+        .options(joinedload(Tovar.postavshik))
+        .filter(Tovar.id == product_id)
+        .first()
+    )
+
+
+# --- Данные для отчетов ---
+
+def report_products(session):
+    """Все товары с названием поставщика для таблиц отчетов (один запрос)."""
+    return products_query(session).order_by(Tovar.id).all()
+
+def arrival_reports_by_product(session, report_date):
+    rows = (
+        session.query(
+            OtchetyPoPostuplenijuTovarov.tovar_id,
+            OtchetyPoPostuplenijuTovarov.data_postuplenija,
+            OtchetyPoPostuplenijuTovarov.kolithestvo_postupivshih_tovarov,
+        )
+        .filter(OtchetyPoPostuplenijuTovarov.data_postuplenija == report_date)
+        .all()
+    )
+    return {row.tovar_id: row for row in rows if row.tovar_id}
+
+def stock_reports_by_product(session, report_date):
+    rows = (
+        session.query(
+            OtchetyPoOstatkamTovarov.tovar_id,
+            OtchetyPoOstatkamTovarov.kolithestvo_tovara,
+        )
+        .filter(OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta == report_date)
+        .all()
+    )
+    return {row.tovar_id: row for row in rows if row.tovar_id}
+
+def order_rows_by_product(session, order_date):
+    # Сохраненный бланк заказа: {tovar_id: (количество, цена на момент заказа)}
+    rows = (
+        session.query(ZakazTovara.tovar_id, ZakazTovara.kolithestvo, ZakazTovara.cena)
+        .filter(ZakazTovara.data_zakaza == order_date)
+        .all()
+    )
+    return {row.tovar_id: (row.kolithestvo, row.cena) for row in rows if row.tovar_id}
+
+def loss_report_rows(session, report_date):
+    return (
+        session.query(
+            OtchetyPoUbytomuTovaru.id,
+            OtchetyPoUbytomuTovaru.data_ubytija,
+            OtchetyPoUbytomuTovaru.kolithestvo_ubytogo_tovara,
+            OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta,
+            Tovar.nazvanie.label("tovar_nazvanie"),
+        )
+        .outerjoin(Tovar, OtchetyPoUbytomuTovaru.tovar_id == Tovar.id)
+        .filter(OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta == report_date)
+        .order_by(OtchetyPoUbytomuTovaru.id)
+        .all()
+    )
+
+
+# --- Потоковое чтение строк отчетов (для PDF) ---
+
+# Сколько строк читается из базы за один запрос
+REPORT_CHUNK_SIZE = 1000
+
+def iter_chunked(query, key_column, chunk_size=REPORT_CHUNK_SIZE):
+    """Строки запроса порциями по chunk_size (keyset по key_column), без загрузки всего результата."""
+    last_key = None
+    while True:
+        chunk_query = query
+        if last_key is not None:
+            chunk_query = chunk_query.filter(key_column > last_key)
+        rows = chunk_query.order_by(key_column).limit(chunk_size).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_key = getattr(rows[-1], key_column.key)
+
+def iter_arrival_report_rows(session, report_date, chunk_size=REPORT_CHUNK_SIZE):
+    # Все товары и их поступление за дату (уникальный индекс гарантирует не более одной записи)
+    query = products_query(session).add_columns(
+        OtchetyPoPostuplenijuTovarov.data_postuplenija,
+        OtchetyPoPostuplenijuTovarov.kolithestvo_postupivshih_tovarov,
+    ).outerjoin(OtchetyPoPostuplenijuTovarov, and_(
+        OtchetyPoPostuplenijuTovarov.tovar_id == Tovar.id,
+        OtchetyPoPostuplenijuTovarov.data_postuplenija == report_date,
+    ))
+    return iter_chunked(query, Tovar.id, chunk_size)
+
+def iter_stock_report_rows(session, report_date, chunk_size=REPORT_CHUNK_SIZE):
+    # Остаток на дату рассчитывается по последней инвентаризации и движению товара после нее
+    query = products_query(session).add_columns(
+        on_hand_column(report_date).label("kolithestvo_tovara"),
+        expiry_column(report_date).label("srok_godnosti"),
+    )
+    return iter_chunked(query, Tovar.id, chunk_size)
+
+def expiring_stock_query(session, today, days):
+    """Товары в наличии, срок годности которых истек или истекает в ближайшие days дней.
+
+    Строки отбираются диапазоном по индексу srok_godnosti; у каждого товара учитывается
+    только партия из последней инвентаризации на today.
+    """
+    newer = aliased(OtchetyPoOstatkamTovarov)
+    on_hand = on_hand_column(today)
+    return (
+        products_query(session)
+        .add_columns(
+            OtchetyPoOstatkamTovarov.srok_godnosti,
+            OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta,
+            on_hand.label("kolithestvo_tovara"),
+        )
+        .join(OtchetyPoOstatkamTovarov, OtchetyPoOstatkamTovarov.tovar_id == Tovar.id)
+        .filter(OtchetyPoOstatkamTovarov.srok_godnosti <= today + timedelta(days=days))
+        .filter(OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta <= today)
+        .filter(~exists().where(
+            newer.tovar_id == OtchetyPoOstatkamTovarov.tovar_id,
+            newer.data_formirovaniya_otcheta > OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta,
+            newer.data_formirovaniya_otcheta <= today,
+        ))
+        .filter(on_hand > 0)
+        .order_by(OtchetyPoOstatkamTovarov.srok_godnosti, Tovar.id)
+    )
+
+def iter_loss_report_rows(session, report_date, chunk_size=REPORT_CHUNK_SIZE):
+    query = (
+        session.query(
+            OtchetyPoUbytomuTovaru.id,
+            OtchetyPoUbytomuTovaru.data_ubytija,
+            OtchetyPoUbytomuTovaru.kolithestvo_ubytogo_tovara,
+            OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta,
+            Tovar.nazvanie.label("tovar_nazvanie"),
+        )
+        .outerjoin(Tovar, OtchetyPoUbytomuTovaru.tovar_id == Tovar.id)
+        .filter(OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta == report_date)
+    )
+    return iter_chunked(query, OtchetyPoUbytomuTovaru.id, chunk_size)
+
+def iter_order_report_rows(session, order_date, chunk_size=REPORT_CHUNK_SIZE):
+    # Все товары и их строка в бланке заказа за дату (если есть)
+    query = products_query(session).add_columns(
+        ZakazTovara.kolithestvo,
+        ZakazTovara.cena.label("cena_zakaza"),
+    ).outerjoin(ZakazTovara, and_(
+        ZakazTovara.tovar_id == Tovar.id,
+        ZakazTovara.data_zakaza == order_date,
+    ))
+    return iter_chunked(query, Tovar.id, chunk_size)
+
+def iter_report_products(session, chunk_size=REPORT_CHUNK_SIZE):
+    return iter_chunked(products_query(session), Tovar.id, chunk_size)
+
+
+# --- Пакетное удаление ---
+
+# Сколько ключей передается в одном IN (...): число параметров запроса в SQLite ограничено
+DELETE_CHUNK_SIZE = 500
+
+def key_chunks(keys, size=DELETE_CHUNK_SIZE):
+    for start in range(0, len(keys), size):
+        yield keys[start:start + size]
+
+def delete_rows(session, model, keys):
+    """Удаляет записи model по первичным ключам запросами DELETE ... WHERE id IN (...).
+
+    Как и session.delete(), обнуляет ссылки на удаляемые записи в связанных таблицах.
+    Изменения добавляются к транзакции для change_events; commit выполняет вызывающий.
+    Возвращает количество удаленных записей.
+    """
+    keys = sorted(set(keys))
+    mapper = inspect(model)
+    key_column = mapper.primary_key[0]
+    references = [
+        (relationship.mapper, remote)
+        for relationship in mapper.relationships if relationship.direction is ONETOMANY
+        for _, remote in relationship.local_remote_pairs
+    ]
+    deleted = 0
+    for chunk in key_chunks(keys):
+        for child, remote in references:
+            child_keys = session.execute(select(child.primary_key[0]).where(remote.in_(chunk))).scalars().all()
+            if child_keys:
+                session.execute(update(child.class_).where(remote.in_(chunk)).values({remote.key: None}))
+                record_changes(session, child.local_table.name, ChangeKind.UPDATED, child_keys)
+        deleted += session.execute(delete(model).where(key_column.in_(chunk))).rowcount
+    record_changes(session, mapper.local_table.name, ChangeKind.DELETED, keys)
+    return deleted
@@ -0,0 +1,315 @@
+"""Локальная реплика (SQLite) каталога и отчетов для работы без связи с сервером.
+
+Окно читает и пишет только в реплику. Изменения в реплике триггеры записывают в outbox;
+синхронизация отправляет их на сервер, а затем забирает с сервера строки, у которых
+updated_at новее последней синхронизации, и удаления из udalennye_zapisi.
+
+Записи, созданные в реплике, получают постоянный id только на сервере: после отправки
+строка в реплике переносится на серверный id вместе со ссылками на нее.
+"""
+from datetime import timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, case, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from models import Base, Connect, DB_CONFIG, UdalennyeZapisi
+from change_events import RowChange, ChangeKind
+from report_edits import UPSERT_DIALECTS
+from migrations import add_missing_columns, add_stock_movement_triggers, rebuild_stock_movement, scope_city_names
+
+# Производные таблицы: реплика ведет их сама триггерами по своим данным и не синхронизирует
+LOCAL_TABLES = [Base.metadata.tables["dvizhenie_tovara"]]
+# Таблицы реплики - все таблицы с updated_at, в порядке зависимостей (родительские раньше)
+REPLICATED_TABLES = [
+    table for table in Base.metadata.sorted_tables if "updated_at" in table.c and table not in LOCAL_TABLES
+]
+REPLICATED_BY_NAME = {table.name: table for table in REPLICATED_TABLES}
+
+# Запас по времени при загрузке изменений: транзакция на сервере могла зафиксироваться позже,
+# чем было назначено ее updated_at. Уже полученные строки повторно не записываются
+SYNC_OVERLAP = timedelta(minutes=5)
+# Сколько строк забирается с сервера одним запросом
+PULL_CHUNK_SIZE = 1000
+
+# Служебные таблицы, которые есть только в реплике
+local_metadata = MetaData()
+outbox = Table(
+    "outbox", local_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("tablica", String(100), nullable=False),
+    Column("zapis_id", Integer, nullable=False),
+    Column("operacija", String(10), nullable=False),  # insert, update, delete
+)
+sync_state = Table(
+    "sync_state", local_metadata,
+    Column("tablica", String(100), primary_key=True),
+    Column("posled_izmenenie", DateTime),  # Наибольшее updated_at (udaleno), полученное с сервера
+)
+replica_flags = Table(
+    "replica_flags", local_metadata,
+    Column("id", Integer, primary_key=True),
+    # 1, пока синхронизация записывает данные сервера: такие изменения в outbox не попадают
+    Column("primenenie", Integer, nullable=False),
+)
+
+OUTBOX_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS outbox_{table}_insert AFTER INSERT ON {table} "
+    "WHEN (SELECT primenenie FROM replica_flags) = 0 "
+    "BEGIN INSERT INTO outbox (tablica, zapis_id, operacija) VALUES ('{table}', NEW.id, 'insert'); END",
+    "CREATE TRIGGER IF NOT EXISTS outbox_{table}_update AFTER UPDATE ON {table} "
+    "WHEN (SELECT primenenie FROM replica_flags) = 0 "
+    "BEGIN INSERT INTO outbox (tablica, zapis_id, operacija) VALUES ('{table}', NEW.id, 'update'); END",
+    "CREATE TRIGGER IF NOT EXISTS outbox_{table}_delete AFTER DELETE ON {table} "
+    "WHEN (SELECT primenenie FROM replica_flags) = 0 "
+    "BEGIN INSERT INTO outbox (tablica, zapis_id, operacija) VALUES ('{table}', OLD.id, 'delete'); END",
+]
+
+
+class Replica:
+    def __init__(self, path, central_url=None):
+        self.url = f"sqlite:///{path}"
+        self.central_url = central_url or DB_CONFIG.url
+
+    def init_db(self):
+        """Создает схему реплики. Подключение к серверу не требуется."""
+        engine = Connect.get_engine(self.url)
+        Base.metadata.create_all(engine, tables=REPLICATED_TABLES + LOCAL_TABLES)
+        local_metadata.create_all(engine)
+        with engine.begin() as connection:
+            if connection.execute(select(replica_flags.c.id)).first() is None:
+                connection.execute(replica_flags.insert().values(id=1, primenenie=0))
+            for table in REPLICATED_TABLES:
+                # Реплика, созданная предыдущей версией, получает новые колонки сервера
+                add_missing_columns(connection, table)
+                for statement in OUTBOX_TRIGGERS:
+                    connection.execute(text(statement.format(table=table.name)))
+            # Ключ города в реплике тот же, что на сервере: (область, название)
+            scope_city_names(connection, Base.metadata)
+            for table in LOCAL_TABLES:
+                # Прежние версии синхронизировали итоги движения вместе с остальными таблицами
+                for operation in ("insert", "update", "delete"):
+                    connection.execute(text(f"DROP TRIGGER IF EXISTS outbox_{table.name}_{operation}"))
+                connection.execute(outbox.delete().where(outbox.c.tablica == table.name))
+            # Итоги движения товара для остатков (как миграция 6 на сервере): при первом
+            # создании триггеров итоги пересчитываются по уже загруженным отчетам
+            has_triggers = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_movement_inserted'"
+            )).first()
+            if has_triggers is None:
+                rebuild_stock_movement(connection)
+            add_stock_movement_triggers(connection)
+
+    def pending_count(self):
+        # Количество записей с изменениями, еще не отправленными на сервер
+        pending = select(outbox.c.tablica, outbox.c.zapis_id).distinct().subquery()
+        with Connect.get_engine(self.url).connect() as connection:
+            return connection.execute(select(func.count()).select_from(pending)).scalar()
+
+    def sync(self):
+        """Отправляет изменения реплики на сервер и забирает изменения сервера.
+
+        Возвращает список RowChange для строк реплики, измененных синхронизацией.
+        Если сервер недоступен, бросает исключение, и реплика остается без изменений.
+        Схему сервера синхронизация не меняет: ее создает и обновляет запуск приложения
+        без реплики или python migrations.py.
+        """
+        changes = []
+        with Connect.get_engine(self.url).begin() as local, Connect.get_engine(self.central_url).begin() as central:
+            # Первая запись берет блокировку реплики: правки из окна дождутся конца синхронизации
+            local.execute(replica_flags.update().values(primenenie=1))
+            # Перенос id записи и ссылок на нее проверяется целиком при фиксации
+            local.execute(text("PRAGMA defer_foreign_keys = ON"))
+            self._push(local, central, changes)
+            self._pull(local, central, changes)
+            local.execute(replica_flags.update().values(primenenie=0))
+        return changes
+
+    # --- Отправка изменений реплики ---
+
+    def _push(self, local, central, changes):
+        moved = {}     # (таблица, прежний id) -> новый id для записей, перенесенных во время отправки
+        deleted = []
+        # Вставки и изменения от родительских таблиц к дочерним: ссылки уже указывают на серверные id
+        for table in REPLICATED_TABLES:
+            created = func.max(case((outbox.c.operacija == "insert", 1), else_=0))
+            entries = local.execute(
+                select(outbox.c.zapis_id, created)
+                .where(outbox.c.tablica == table.name)
+                .group_by(outbox.c.zapis_id)
+                .order_by(func.min(outbox.c.id))
+            ).all()
+            for row_id, is_created in entries:
+                while (table.name, row_id) in moved:
+                    row_id = moved[(table.name, row_id)]
+                row = local.execute(select(table).where(table.c.id == row_id)).first()
+                if row is None:
+                    if not is_created:
+                        deleted.append((table, row_id))
+                    else:
+                        self._clear_outbox(local, table, row_id)  # Создана и удалена без связи
+                    continue
+                self._push_row(local, central, table, row, is_created, moved, changes)
+
+        # Удаления от дочерних таблиц к родительским
+        for table, row_id in reversed(deleted):
+            try:
+                with central.begin_nested():
+                    central.execute(table.delete().where(table.c.id == row_id))
+            except IntegrityError as e:
+                print(f"Сервер не удалил запись {table.name} id={row_id}: {e.orig}")
+                self._restore(local, central, table, row_id, changes)
+            self._clear_outbox(local, table, row_id)
+
+    def _push_row(self, local, central, table, row, is_created, moved, changes):
+        values = {name: value for name, value in row._mapping.items() if name not in ("id", "updated_at")}
+        try:
+            with central.begin_nested():
+                if is_created:
+                    new_id = self._insert_central(central, table, values)
+                    self._clear_outbox(local, table, row.id)
+                    self._move(local, table, row.id, new_id, moved, changes)
+                    return
+                if not central.execute(table.update().where(table.c.id == row.id).values(**values)).rowcount:
+                    # Запись удалена на сервере: удаление важнее правки, реплика удалит ее при загрузке
+                    print(f"Запись {table.name} id={row.id} удалена на сервере, правка не отправлена")
+        except IntegrityError as e:
+            # Сервер отверг изменение (например, ссылка на удаленную запись): берем данные сервера
+            print(f"Сервер отклонил изменение {table.name} id={row.id}: {e.orig}")
+            self._restore(local, central, table, row.id, changes)
+        self._clear_outbox(local, table, row.id)
+
+    def _insert_central(self, central, table, values):
+        # Для таблиц с уникальным ключом (адреса, отчеты) запись, уже созданная на сервере
+        # другим рабочим местом, обновляется, и реплика получает ее id
+        unique = next((index for index in table.indexes if index.unique), None)
+        insert = UPSERT_DIALECTS.get(central.dialect.name)
+        if unique is None or insert is None:
+            return central.execute(table.insert().values(**values)).inserted_primary_key[0]
+        key_columns = [column.name for column in unique.columns]
+        stmt = insert(table).values(**values)
+        update_columns = [name for name in values if name not in key_columns] or key_columns[-1:]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={name: stmt.excluded[name] for name in update_columns},
+        )
+        return central.execute(stmt.returning(table.c.id)).scalar_one()
+
+    def _move(self, local, table, old_id, new_id, moved, changes):
+        """Переносит запись реплики на id, выданный сервером, вместе со ссылками на нее."""
+        if old_id == new_id:
+            return
+        if local.execute(select(table.c.id).where(table.c.id == new_id)).first() is not None:
+            # id занят другой еще не отправленной записью - переносим ее на свободный id
+            free_id = local.execute(select(func.max(table.c.id))).scalar() + 1
+            self._move(local, table, new_id, free_id, moved, changes)
+        local.execute(table.update().where(table.c.id == old_id).values(id=new_id))
+        for child in REPLICATED_TABLES:
+            for foreign_key in child.foreign_keys:
+                if foreign_key.column is table.c.id:
+                    local.execute(
+                        child.update().where(foreign_key.parent == old_id).values({foreign_key.parent.name: new_id})
+                    )
+        local.execute(
+            outbox.update()
+            .where(outbox.c.tablica == table.name, outbox.c.zapis_id == old_id)
+            .values(zapis_id=new_id)
+        )
+        moved[(table.name, old_id)] = new_id
+        changes.append(RowChange(table.name, ChangeKind.DELETED, old_id))
+        changes.append(RowChange(table.name, ChangeKind.INSERTED, new_id))
+
+    def _restore(self, local, central, table, row_id, changes):
+        # Заменяет строку реплики строкой сервера (или удаляет, если на сервере ее нет)
+        row = central.execute(select(table).where(table.c.id == row_id)).first()
+        local.execute(table.delete().where(table.c.id == row_id))
+        if row is not None:
+            local.execute(table.insert().values(**row._mapping))
+        changes.append(RowChange(table.name, ChangeKind.UPDATED if row else ChangeKind.DELETED, row_id))
+
+    def _clear_outbox(self, local, table, row_id):
+        local.execute(outbox.delete().where(outbox.c.tablica == table.name, outbox.c.zapis_id == row_id))
+
+    # --- Загрузка изменений сервера ---
+
+    def _pull(self, local, central, changes):
+        pending = set(local.execute(select(outbox.c.tablica, outbox.c.zapis_id).distinct()).all())
+        self._pull_deletions(local, central, pending, changes)
+        for table in REPLICATED_TABLES:
+            since = self._last_change(local, table.name)
+            latest = since
+            query = select(table)
+            if since is not None:
+                query = query.where(table.c.updated_at >= since - SYNC_OVERLAP)
+            last_id = None
+            while True:
+                chunk_query = query if last_id is None else query.where(table.c.id > last_id)
+                rows = central.execute(chunk_query.order_by(table.c.id).limit(PULL_CHUNK_SIZE)).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                # Строки, которые уже есть в реплике без изменений, не перезаписываются. Сравнивается
+                # вся строка: updated_at в SQLite хранится с точностью до секунды
+                existing = {
+                    row.id: tuple(row) for row in
+                    local.execute(select(table).where(table.c.id.in_([row.id for row in rows])))
+                }
+                fresh = [
+                    dict(row._mapping) for row in rows
+                    if (table.name, row.id) not in pending and existing.get(row.id) != tuple(row)
+                ]
+                if fresh:
+                    stmt = sqlite_insert(table)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[table.c.id],
+                        set_={column.name: stmt.excluded[column.name] for column in table.c if column.name != "id"},
+                    )
+                    local.execute(stmt, fresh)
+                    changes.extend(RowChange(table.name, ChangeKind.UPDATED, row["id"]) for row in fresh)
+                latest = max([value for value in [latest] + [row.updated_at for row in rows] if value is not None],
+                             default=None)
+                if len(rows) < PULL_CHUNK_SIZE:
+                    break
+            self._save_last_change(local, table.name, latest)
+
+    def _pull_deletions(self, local, central, pending, changes):
+        tombstones = UdalennyeZapisi.__table__
+        since = self._last_change(local, tombstones.name)
+        if since is None:
+            # Первая синхронизация копирует таблицы целиком, прошлые удаления не нужны
+            latest = select(func.coalesce(func.max(tombstones.c.udaleno), func.now()))
+            self._save_last_change(local, tombstones.name, central.execute(latest).scalar())
+            return
+        rows = central.execute(
+            select(tombstones.c.tablica, tombstones.c.zapis_id, tombstones.c.udaleno)
+            .where(tombstones.c.udaleno >= since - SYNC_OVERLAP)
+        ).all()
+        for row in rows:
+            table = REPLICATED_BY_NAME.get(row.tablica)
+            if table is None or (row.tablica, row.zapis_id) in pending:
+                continue
+            if local.execute(table.delete().where(table.c.id == row.zapis_id)).rowcount:
+                changes.append(RowChange(row.tablica, ChangeKind.DELETED, row.zapis_id))
+        self._save_last_change(local, tombstones.name, max([since] + [row.udaleno for row in rows]))
+
+    def _last_change(self, local, name):
+        return local.execute(select(sync_state.c.posled_izmenenie).where(sync_state.c.tablica == name)).scalar()
+
+    def _save_last_change(self, local, name, value):
+        if value is None:
+            return
+        stmt = sqlite_insert(sync_state).values(tablica=name, posled_izmenenie=value)
+        local.execute(stmt.on_conflict_do_update(index_elements=[sync_state.c.tablica], set_={"posled_izmenenie": value}))
+
+
+def open_replica(config=DB_CONFIG):
+    """Включает автономный режим, если в настройках указан файл реплики. Возвращает Replica или None.
+
+    После вызова Connect.create_session() без аргументов открывает сессию реплики.
+    """
+    if not config.replica_path:
+        return None
+    replica = Replica(config.replica_path, config.url)
+    replica.init_db()
+    Connect.default_url = replica.url
+    return replica
@@ -0,0 +1,120 @@
+"""Формирование PDF-отчетов без графического интерфейса.
+
+Примеры:
+    python -m report_cli arrival stock --date 2025-04-12
+    python -m report_cli all --from 2025-04-01 --to 2025-04-30 --jobs 4 --output reports
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from models import Connect, DATABASE_URL
+from report_templates import ARRIVAL_REPORT, STOCK_REPORT, LOSS_REPORT, ORDER_CONVERSION_REPORT, EXPIRING_REPORT
+
+REPORTS = {
+    "arrival": ARRIVAL_REPORT,
+    "stock": STOCK_REPORT,
+    "loss": LOSS_REPORT,
+    "order_conversion": ORDER_CONVERSION_REPORT,
+    "expiring": EXPIRING_REPORT,
+}
+
+
+def report_dates(date_from, date_to):
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+
+def generate_report(name, report_date, output_dir, url=DATABASE_URL):
+    """Строит один отчет за дату и возвращает имя файла. Выполняется и в дочерних процессах."""
+    definition = REPORTS[name]
+    filename = os.path.join(output_dir, f"{definition.file_prefix}_{report_date:%Y%m%d}.pdf")
+    title = f"{definition.title} на {report_date:%d.%m.%Y}"
+    session = Connect.create_session(url)
+    try:
+        return definition.render(session, {"report_date": report_date}, title, filename=filename)
+    finally:
+        Connect.remove_session(url)
+
+
+def _init_worker():
+    # Соединения пула, унаследованные от родительского процесса, использовать нельзя
+    Connect.dispose(close=False)
+
+
+def run_jobs(tasks, jobs, url):
+    """Выполняет задачи (отчет, дата, каталог) и возвращает количество ошибок."""
+    failed = 0
+    if jobs <= 1:
+        for name, report_date, output_dir in tasks:
+            try:
+                print(f"Создан отчет: {generate_report(name, report_date, output_dir, url)}")
+            except Exception as e:
+                failed += 1
+                print(f"Ошибка при создании отчета {name} за {report_date}: {e}", file=sys.stderr)
+        return failed
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(generate_report, name, report_date, output_dir, url): (name, report_date)
+            for name, report_date, output_dir in tasks
+        }
+        for future in as_completed(futures):
+            name, report_date = futures[future]
+            try:
+                print(f"Создан отчет: {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"Ошибка при создании отчета {name} за {report_date}: {e}", file=sys.stderr)
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m report_cli", description="Формирование PDF-отчетов за дату или период")
+    parser.add_argument("reports", nargs="+", choices=sorted(REPORTS) + ["all"], help="Типы отчетов")
+    parser.add_argument("--date", type=date.fromisoformat, help="Дата отчета (ГГГГ-ММ-ДД), по умолчанию сегодня")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Начало периода (ГГГГ-ММ-ДД)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Конец периода включительно (ГГГГ-ММ-ДД)")
+    parser.add_argument("--jobs", type=int, default=1, help="Количество параллельных процессов")
+    parser.add_argument("--output", default=".", help="Каталог для PDF-файлов")
+    parser.add_argument("--url", default=DATABASE_URL, help="Строка подключения к базе данных")
+    args = parser.parse_args(argv)
+
+    if args.date and (args.date_from or args.date_to):
+        parser.error("Укажите либо --date, либо период --from/--to")
+    if args.date_from or args.date_to:
+        args.date_from = args.date_from or args.date_to
+        args.date_to = args.date_to or args.date_from
+    else:
+        args.date_from = args.date_to = args.date or date.today()
+    if args.date_from > args.date_to:
+        parser.error("Начало периода позже его конца")
+    if args.jobs < 1:
+        parser.error("--jobs должно быть не меньше 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = sorted(REPORTS) if "all" in args.reports else list(dict.fromkeys(args.reports))
+    os.makedirs(args.output, exist_ok=True)
+
+    # Схема и миграции проверяются один раз до запуска дочерних процессов
+    Connect.init_db(args.url)
+
+    tasks = [
+        (name, report_date, args.output)
+        for report_date in report_dates(args.date_from, args.date_to)
+        for name in names
+    ]
+    failed = run_jobs(tasks, args.jobs, args.url)
+    print(f"Готово: {len(tasks) - failed} из {len(tasks)} отчетов.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from change_events import ChangeKind, record_changes
+from queries import key_chunks
+
+# Диалекты с INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+class ReportChangeSet:
+    """Несохраненные правки таблицы отчета, сгруппированные по ключу (tovar_id, дата).
+
+    Повторная правка того же товара за ту же дату заменяет предыдущую, поэтому при
+    сохранении каждая запись пишется в базу один раз, а все записи - одной транзакцией.
+    Таблица должна иметь уникальный индекс по (дата, tovar_id).
+    """
+
+    def __init__(self, model, date_column):
+        self.model = model
+        self.date_column = date_column
+        self._changes = {}
+
+    def __len__(self):
+        return len(self._changes)
+
+    def set(self, tovar_id, date, **values):
+        self._changes.setdefault((tovar_id, date), {}).update(values)
+
+    def discard(self, tovar_id, date):
+        self._changes.pop((tovar_id, date), None)
+
+    def clear(self):
+        self._changes.clear()
+
+    def flush(self, session):
+        """Записывает все изменения в базу. Возвращает количество сохраненных записей."""
+        if not self._changes:
+            return 0
+
+        try:
+            dialect = session.get_bind().dialect.name
+            if dialect in UPSERT_DIALECTS:
+                ids = self._upsert(session, UPSERT_DIALECTS[dialect])
+            else:
+                ids = self._select_then_write(session)
+            # Записи пишутся в обход ORM: изменения для change_events (и синхронизации реплики)
+            record_changes(session, self.model.__table__.name, ChangeKind.UPDATED, ids)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        count = len(self._changes)
+        self._changes.clear()
+        return count
+
+    def _records(self):
+        date_key = self.date_column.key
+        for (tovar_id, date), values in self._changes.items():
+            record = dict(values, tovar_id=tovar_id)
+            record[date_key] = date
+            yield record
+
+    def _upsert(self, session, insert):
+        # INSERT ... ON CONFLICT (дата, tovar_id) DO UPDATE по уникальному индексу отчета.
+        # Записи с разным набором колонок нельзя передать одним запросом, поэтому группируем
+        groups = {}
+        for record in self._records():
+            groups.setdefault(tuple(sorted(record)), []).append(record)
+        table = self.model.__table__
+        ids = []
+        for columns, records in groups.items():
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self.date_column.key, "tovar_id"],
+                set_={name: stmt.excluded[name] for name in columns
+                      if name not in ("tovar_id", self.date_column.key)},
+            ).returning(table.c.id)
+            ids.extend(session.execute(stmt, records).scalars())
+        return ids
+
+    def _select_then_write(self, session):
+        # Для баз без ON CONFLICT: один запрос существующих записей, затем пакетные UPDATE и INSERT
+        date_key = self.date_column.key
+        existing = {
+            (row.tovar_id, getattr(row, date_key)): row.id
+            for row in session.query(self.model.id, self.model.tovar_id, self.date_column)
+            .filter(tuple_(self.model.tovar_id, self.date_column).in_(list(self._changes)))
+        }
+        updates = []
+        inserts = []
+        for record in self._records():
+            record_id = existing.get((record["tovar_id"], record[date_key]))
+            if record_id is None:
+                inserts.append(record)
+            else:
+                record["id"] = record_id
+                updates.append(record)
+        if updates:
+            session.bulk_update_mappings(self.model, updates)
+        if inserts:
+            session.bulk_insert_mappings(self.model, inserts, return_defaults=True)
+        return [record["id"] for record in updates + inserts]
+
+
+def delete_reports(session, model, date_column, report_date, tovar_ids):
+    """Удаляет записи отчета за дату для товаров tovar_ids: один DELETE на порцию ключей.
+
+    Изменения добавляются к транзакции для change_events. Возвращает количество
+    удаленных записей; commit выполняет вызывающий.
+    """
+    deleted = []
+    for chunk in key_chunks(sorted(set(tovar_ids))):
+        condition = (date_column == report_date) & model.tovar_id.in_(chunk)
+        keys = session.execute(select(model.id).where(condition)).scalars().all()
+        if keys:
+            session.execute(delete(model).where(condition))
+            deleted.extend(keys)
+    record_changes(session, model.__table__.name, ChangeKind.DELETED, deleted)
+    return len(deleted)
@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+
+from PySide6.QtCore import Qt
+
+from table_models import contiguous_ranges
+
+
+class ReportGridStrategy:
+    """Обработчики таблицы отчета одного типа.
+
+    item_changed(item) вызывается при правке ячейки пользователем,
+    context_menu(pos) - при запросе контекстного меню. Любой из них может отсутствовать.
+    """
+
+    def __init__(self, name, item_changed=None, context_menu=None):
+        self.name = name
+        self.item_changed = item_changed
+        self.context_menu = context_menu
+
+
+class ReportGridController:
+    """Единственная точка подключения сигналов таблицы отчетов.
+
+    Сигналы таблицы подключаются один раз в конструкторе и передаются обработчикам
+    текущей стратегии. При смене отчета меняется только стратегия, поэтому
+    обработчики не накапливаются от загрузки к загрузке.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.strategy = None
+        self.table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.table.itemChanged.connect(self._dispatch_item_changed)
+        self.table.customContextMenuRequested.connect(self._dispatch_context_menu)
+
+    def activate(self, strategy):
+        self.strategy = strategy
+
+    def clear(self):
+        # Отчет закрыт: таблица пуста, правки и меню никуда не передаются
+        self.strategy = None
+        with self.quiet():
+            self.table.setRowCount(0)
+            self.table.setColumnCount(0)
+
+    @contextmanager
+    def quiet(self):
+        """Программные изменения таблицы (заполнение, подсветка) без вызова itemChanged."""
+        blocked = self.table.blockSignals(True)
+        try:
+            yield
+        finally:
+            self.table.blockSignals(blocked)
+
+    def selected_rows(self):
+        return sorted({index.row() for index in self.table.selectedIndexes()})
+
+    def remove_rows(self, rows):
+        """Удаляет строки диапазонами подряд идущих и перенумеровывает колонку "№" ниже первой из них."""
+        if not rows:
+            return
+        model = self.table.model()
+        for first, last in reversed(contiguous_ranges(rows)):
+            model.removeRows(first, last - first + 1)
+        with self.quiet():
+            for row in range(min(rows), self.table.rowCount()):
+                self.table.item(row, 0).setText(str(row + 1))
+
+    def populate(self, strategy, fill, *args):
+        """Заполняет таблицу функцией fill(*args) и включает обработчики strategy."""
+        self.strategy = None
+        with self.quiet():
+            fill(*args)
+        self.activate(strategy)
+
+    def _dispatch_item_changed(self, item):
+        if self.strategy is None or self.strategy.item_changed is None:
+            return
+        # Значения, которые обработчик сам записывает в таблицу, повторно его не вызывают
+        with self.quiet():
+            self.strategy.item_changed(item)
+
+    def _dispatch_context_menu(self, pos):
+        if self.strategy is None or self.strategy.context_menu is None:
+            return
+        # Удаление строк и перенумерация из меню - тоже программные изменения
+        with self.quiet():
+            self.strategy.context_menu(pos)
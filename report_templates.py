@@ -0,0 +1,267 @@
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+from queries import (
+    iter_arrival_report_rows, iter_stock_report_rows, iter_loss_report_rows, iter_order_report_rows,
+    expiring_stock_query
+)
+from order_model import DISCOUNT_TEXT, order_line, to_cents, from_cents
+from report_writer import StreamingTable, DeferredParagraph, register_fonts, report_styles
+
+
+class ReportColumn:
+    """Колонка отчета: заголовок, ширина в пунктах и функция значения value(row, context)."""
+
+    def __init__(self, header, width, value=None, wrap=False):
+        self.header = header
+        self.width = width
+        self.value = value
+        self.wrap = wrap  # Перенос длинного текста внутри ячейки
+
+
+class ReportTotal:
+    """Итоговая строка под таблицей.
+
+    Если задан value(row, context), значения суммируются по всем строкам и
+    подставляются в text вместо {}; иначе text выводится как есть.
+    """
+
+    def __init__(self, text, value=None):
+        self.text = text
+        self.value = value
+
+
+class ReportDefinition:
+    """Описание PDF-отчета: колонки, источник строк, итоги и поля шапки.
+
+    source(session, context) возвращает итератор строк; у пустых бланков источника нет.
+    row_filter(row, context) позволяет пропустить строки (например, удаленные из таблицы).
+    Колонка "№" с порядковым номером добавляется автоматически.
+    """
+
+    def __init__(self, title, file_prefix, columns, source=None, row_filter=None, header_lines=(), totals=()):
+        self.title = title
+        self.file_prefix = file_prefix
+        self.columns = [ReportColumn("№", 30)] + list(columns)
+        self.source = source
+        self.row_filter = row_filter
+        self.header_lines = header_lines
+        self.totals = totals
+        # Заголовки, ширины и колонки с переносом вычисляются один раз при описании отчета
+        self.headers = [column.header for column in self.columns]
+        self.col_widths = [column.width for column in self.columns]
+        self.wrap_columns = [index for index, column in enumerate(self.columns) if column.wrap]
+        self.value_columns = self.columns[1:]
+
+    def _rows(self, session, context, sums):
+        if self.source is None:
+            return
+        number = 0
+        for row in self.source(session, context):
+            if self.row_filter is not None and not self.row_filter(row, context):
+                continue
+            number += 1
+            for index, total in enumerate(self.totals):
+                if total.value is not None:
+                    sums[index] += total.value(row, context)
+            yield [number] + [column.value(row, context) for column in self.value_columns]
+
+    def _total_text(self, index, sums):
+        total = self.totals[index]
+        return total.text.format(sums[index]) if total.value is not None else total.text
+
+    def render(self, session=None, context=None, title=None, on_page=None, filename=None):
+        """Строит PDF и возвращает имя файла. Строки читаются из source во время верстки."""
+        register_fonts()
+        styles = report_styles()
+        context = context or {}
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"{self.file_prefix}_{timestamp}.pdf"
+
+        doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30)
+        elements = [Paragraph(title or self.title, styles["title"]), Paragraph("<br/>", styles["normal"])]
+        if self.header_lines:
+            elements.extend(Paragraph(line, styles["normal"]) for line in self.header_lines)
+            elements.append(Paragraph("<br/>", styles["normal"]))
+
+        sums = [0] * len(self.totals)
+        elements.append(StreamingTable(
+            self.headers, self._rows(session, context, sums), self.col_widths,
+            styles["table"], cell_style=styles["cell"], wrap_columns=self.wrap_columns,
+        ))
+
+        if self.totals:
+            elements.append(Paragraph("<br/>", styles["normal"]))
+            for index in range(len(self.totals)):
+                # Суммы известны только после вывода всех строк, поэтому текст вычисляется при верстке
+                elements.append(DeferredParagraph(lambda index=index: self._total_text(index, sums), styles["normal"]))
+
+        if on_page is None:
+            doc.build(elements)
+        else:
+            doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
+        return filename
+
+
+# --- Отчеты по данным ---
+# Необязательный ключ контекста visible_ids передает окно
+# с данными, которых нет в базе; без них, как при формировании из командной строки,
+# в отчет попадают все строки со значениями по умолчанию.
+
+def arrival_quantity(row, context):
+    return row.kolithestvo_postupivshih_tovarov or 0
+
+ARRIVAL_REPORT = ReportDefinition(
+    title="Отчет по поступлению товаров",
+    file_prefix="arrival_report",
+    columns=[
+        ReportColumn("Дата поступления", 100, lambda row, context: row.data_postuplenija or context["report_date"]),
+        ReportColumn("Количество", 50, arrival_quantity),
+        ReportColumn("Товар", 100, lambda row, context: row.nazvanie.value if row.nazvanie else "", wrap=True),
+        ReportColumn("Описание", 150, lambda row, context: row.opisanie or "", wrap=True),
+        ReportColumn("Поставщик", 100, lambda row, context: row.nazvanie_postavshika or ""),
+    ],
+    source=lambda session, context: iter_arrival_report_rows(session, context["report_date"]),
+    row_filter=lambda row, context: context.get("visible_ids") is None or row.id in context["visible_ids"],
+    totals=[ReportTotal("Итого поступило: {} единиц", arrival_quantity)],
+)
+
+def stock_quantity(row, context):
+    return row.kolithestvo_tovara or 0
+
+STOCK_REPORT = ReportDefinition(
+    title="Отчет по остаткам товаров",
+    file_prefix="stock_report",
+    columns=[
+        ReportColumn("Товар", 150, lambda row, context: row.opisanie or "Описание отсутствует", wrap=True),
+        ReportColumn("Поставщик", 100, lambda row, context: row.nazvanie_postavshika or "Не указан", wrap=True),
+        ReportColumn("Количество товара", 70, stock_quantity),
+        ReportColumn("Срок годности", 100, lambda row, context: row.srok_godnosti or ""),
+    ],
+    source=lambda session, context: iter_stock_report_rows(session, context["report_date"]),
+    row_filter=lambda row, context: context.get("visible_ids") is None or row.id in context["visible_ids"],
+    totals=[ReportTotal("Итого остаток: {} единиц", stock_quantity)],
+)
+
+# Истекающий срок годности: report_date - день, от которого отсчитываются дни (days)
+EXPIRY_WARNING_DAYS = 7
+
+def days_left(row, context):
+    return (row.srok_godnosti - context["report_date"]).days
+
+EXPIRING_REPORT = ReportDefinition(
+    title="Товары с истекающим сроком годности",
+    file_prefix="expiring_report",
+    columns=[
+        ReportColumn("Товар", 150, lambda row, context: row.opisanie or "Описание отсутствует", wrap=True),
+        ReportColumn("Поставщик", 100, lambda row, context: row.nazvanie_postavshika or "Не указан", wrap=True),
+        ReportColumn("Количество товара", 70, stock_quantity),
+        ReportColumn("Срок годности", 80, lambda row, context: row.srok_godnosti),
+        ReportColumn("Осталось дней", 60, days_left),
+    ],
+    source=lambda session, context: expiring_stock_query(
+        session, context["report_date"], context.get("days", EXPIRY_WARNING_DAYS)
+    ),
+    totals=[ReportTotal("Итого к списанию: {} единиц", stock_quantity)],
+)
+
+def loss_quantity(row, context):
+    return row.kolithestvo_ubytogo_tovara or 0
+
+LOSS_REPORT = ReportDefinition(
+    title="Отчет по убытию товаров",
+    file_prefix="loss_report",
+    columns=[
+        ReportColumn("Дата убытия", 80, lambda row, context: row.data_ubytija),
+        ReportColumn("Количество убытого товара", 100, loss_quantity),
+        ReportColumn("Дата отчета", 80, lambda row, context: row.data_formirovaniya_otcheta),
+        ReportColumn("Товар", 100, lambda row, context: row.tovar_nazvanie.value if row.tovar_nazvanie else "", wrap=True),
+    ],
+    source=lambda session, context: iter_loss_report_rows(session, context["report_date"]),
+    totals=[ReportTotal("Итого убыло: {} единиц", loss_quantity)],
+)
+
+# Бланк заказа: сохраненное количество и цена на момент заказа (без заказа - 0 и текущая цена)
+def order_quantity(row, context):
+    return row.kolithestvo or 0
+
+def order_price(row):
+    return row.cena_zakaza if row.cena_zakaza is not None else row.cena
+
+def order_sum(row, context):
+    return order_line(order_quantity(row, context), order_price(row))[0]
+
+def order_discount(row, context):
+    return order_line(order_quantity(row, context), order_price(row))[1]
+
+ORDER_CONVERSION_REPORT = ReportDefinition(
+    title="Бланк заказа",
+    file_prefix="order_conversion_report",
+    columns=[
+        ReportColumn("Товар", 150, lambda row, context: row.opisanie or "", wrap=True),
+        ReportColumn("Количество", 50, order_quantity),
+        ReportColumn("Цена", 60, lambda row, context: from_cents(to_cents(order_price(row)))),
+        ReportColumn("Сумма", 60, order_sum),
+        ReportColumn("Возможная цена", 70, order_discount),
+        ReportColumn("Условия получения", 80, lambda row, context: DISCOUNT_TEXT),
+    ],
+    source=lambda session, context: iter_order_report_rows(session, context["report_date"]),
+    row_filter=lambda row, context: context.get("visible_ids") is None or row.id in context["visible_ids"],
+    totals=[ReportTotal("Итого: {:.2f}", order_sum)],
+)
+
+
+# --- Бланки (таблица без строк) ---
+
+GENERAL_ACCOUNTING_REPORT = ReportDefinition(
+    title="Общий учет",
+    file_prefix="general_accounting_report",
+    columns=[
+        ReportColumn("Дата", 80),
+        ReportColumn("Наименование", 150),
+        ReportColumn("Количество", 50),
+        ReportColumn("Ед. изм.", 50),
+        ReportColumn("Цена", 60),
+        ReportColumn("Сумма", 60),
+    ],
+    totals=[ReportTotal("Итого: -")],
+)
+
+INVOICE_REPORT = ReportDefinition(
+    title="Счет-фактура",
+    file_prefix="invoice_report",
+    columns=[
+        ReportColumn("Наименование товара", 150),
+        ReportColumn("Количество", 50),
+        ReportColumn("Цена", 60),
+        ReportColumn("Сумма", 60),
+        ReportColumn("НДС", 50),
+        ReportColumn("Сумма с НДС", 60),
+    ],
+    header_lines=[
+        "Поставщик: ____________________________",
+        "Покупатель: __________________________",
+        "Дата: _______________________________",
+    ],
+    totals=[ReportTotal("Итого: -"), ReportTotal("Сумма НДС: -"), ReportTotal("Всего с НДС: -")],
+)
+
+SPECIFICATION_REPORT = ReportDefinition(
+    title="Спецификация",
+    file_prefix="specification_report",
+    columns=[
+        ReportColumn("Наименование", 150),
+        ReportColumn("Ед. изм.", 50),
+        ReportColumn("Количество", 50),
+        ReportColumn("Цена за ед.", 60),
+        ReportColumn("Общая сумма", 60),
+    ],
+    header_lines=[
+        "Договор №: __________________________",
+        "Дата: _______________________________",
+    ],
+    totals=[ReportTotal("Итого: -")],
+)
@@ -0,0 +1,153 @@
+from collections import deque
+
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Table, TableStyle, Paragraph, Flowable
+
+REPORT_FONT = 'TimesNewRoman'
+REPORT_FONT_FILE = 'times.ttf'
+
+# Стиль таблиц отчетов: первая строка - заголовок
+REPORT_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, -1), REPORT_FONT),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+]
+
+_report_styles = None
+
+
+def register_fonts():
+    # Шрифт с кириллицей регистрируется один раз за время работы процесса
+    if REPORT_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(REPORT_FONT, REPORT_FONT_FILE))
+
+
+def report_styles():
+    """Стили отчетов, созданные один раз. Общий getSampleStyleSheet() не изменяется."""
+    global _report_styles
+    if _report_styles is None:
+        sample = getSampleStyleSheet()
+        _report_styles = {
+            "title": ParagraphStyle('ReportTitle', parent=sample['Heading1'], fontName=REPORT_FONT, alignment=1),
+            "normal": ParagraphStyle('ReportNormal', parent=sample['Normal'], fontName=REPORT_FONT,
+                                     fontSize=10, leading=14),
+            # Текст с переносом в широких колонках таблицы
+            "cell": ParagraphStyle('CellStyle', fontName=REPORT_FONT, fontSize=8, leading=10,
+                                   wordWrap='CJK', alignment=1),
+            "table": TableStyle(REPORT_TABLE_STYLE),
+        }
+    return _report_styles
+
+
+class StreamingTable(Flowable):
+    """Таблица, строки которой читаются из итератора по мере верстки страниц.
+
+    Вместо одной большой Table на каждую страницу выдается отдельная Table с заголовком
+    и теми строками, которые на нее помещаются. В памяти одновременно находятся строки
+    только текущей страницы, а каждая строка измеряется один раз.
+    """
+
+    def __init__(self, headers, rows, col_widths, style, cell_style=None, wrap_columns=()):
+        super().__init__()
+        self.headers = headers
+        self.col_widths = col_widths
+        self.style = style
+        self.cell_style = cell_style
+        self.wrap_columns = set(wrap_columns)
+        self._rows = iter(rows)
+        self._pending = deque()   # Прочитанные, но еще не выведенные строки: (ячейки, высота)
+        self._exhausted = False
+        self._header_height = None
+        self._table = None        # Последняя часть таблицы, которая выводится через draw()
+
+    def _page_table(self, rows):
+        table = Table([self.headers] + rows, colWidths=self.col_widths, repeatRows=1, splitByRow=1)
+        table.setStyle(self.style)
+        return table
+
+    def _measure(self, availWidth):
+        if self._header_height is None:
+            self._header_height = self._page_table([]).wrap(availWidth, 0)[1]
+
+    def _next_row(self, availWidth):
+        try:
+            row = next(self._rows)
+        except StopIteration:
+            self._exhausted = True
+            return False
+        cells = [
+            Paragraph(str(value), self.cell_style) if index in self.wrap_columns and self.cell_style else str(value)
+            for index, value in enumerate(row)
+        ]
+        height = self._page_table([cells]).wrap(availWidth, 0)[1] - self._header_height
+        self._pending.append((cells, height))
+        return True
+
+    def _fit(self, availWidth, availHeight):
+        # Сколько ожидающих строк помещается в availHeight вместе с заголовком
+        self._measure(availWidth)
+        height = self._header_height
+        count = 0
+        while True:
+            if count == len(self._pending) and (self._exhausted or not self._next_row(availWidth)):
+                return count, height
+            row_height = self._pending[count][1]
+            if height + row_height > availHeight:
+                return count, height
+            height += row_height
+            count += 1
+
+    def wrap(self, availWidth, availHeight):
+        count, height = self._fit(availWidth, availHeight)
+        if self._exhausted and count == len(self._pending):
+            self._table = self._page_table([cells for cells, _ in self._pending])
+            return self._table.wrap(availWidth, availHeight)
+        # Остаток не помещается: ReportLab вызовет split
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        count, _ = self._fit(availWidth, availHeight)
+        if not count:
+            return []  # Ни одной строки на оставшемся месте - переход на следующую страницу
+        rows = [self._pending.popleft()[0] for _ in range(count)]
+        if self._exhausted and not self._pending:
+            return [self._page_table(rows)]
+        # Флаг ReportLab "уже переносился" относится к прошлой странице, а не к остатку таблицы
+        self.__dict__.pop('_postponed', None)
+        return [self._page_table(rows), self]
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+
+class DeferredParagraph(Flowable):
+    """Абзац, текст которого вычисляется при верстке (например, итог после потоковой таблицы)."""
+
+    def __init__(self, text_func, style):
+        super().__init__()
+        self.text_func = text_func
+        self.style = style
+        self._paragraph = None
+
+    def _get_paragraph(self):
+        if self._paragraph is None:
+            self._paragraph = Paragraph(self.text_func(), self.style)
+        return self._paragraph
+
+    def wrap(self, availWidth, availHeight):
+        return self._get_paragraph().wrap(availWidth, availHeight)
+
+    def split(self, availWidth, availHeight):
+        return self._get_paragraph().split(availWidth, availHeight)
+
+    def draw(self):
+        self._paragraph.drawOn(self.canv, 0, 0)
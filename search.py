@@ -0,0 +1,113 @@
+"""Поиск по вкладкам Поставщики, Товары и Сотрудники.
+
+Строка находится, если каждое слово запроса начинает какое-нибудь слово колонки
+(без учета регистра, "ё" и "е" не различаются). В PostgreSQL это регулярное
+выражение ~* с началом слова \m, которое ускоряют индексы pg_trgm (миграция 5).
+В SQLite таких индексов нет, поэтому слова колонки держатся в памяти
+в отсортированном списке, и поиск по началу слов делается двоичным поиском.
+Индексы в памяти свои у каждой базы (движка): у сервера, реплики и тестовых баз.
+"""
+from bisect import bisect_left
+import re
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import and_
+
+from models import Postavshik, Tovar, Sotrudnik
+
+# Колонка поиска и первичный ключ для каждой вкладки (ключ - имя таблицы)
+SEARCH_COLUMNS = {
+    Postavshik.__tablename__: (Postavshik.nazvanie_postavshika, Postavshik.id),
+    Tovar.__tablename__: (Tovar.opisanie, Tovar.id),
+    Sotrudnik.__tablename__: (Sotrudnik.familiya, Sotrudnik.id),
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def search_words(text):
+    # Слова без учета регистра; "ё" и "е" при поиске не различаются
+    return WORD_PATTERN.findall((text or "").casefold().replace("ё", "е"))
+
+
+def word_prefix_pattern(word):
+    # Регулярное выражение PostgreSQL: слово колонки, начинающееся с word ("е" совпадает и с "ё")
+    return "\\m" + "".join("[её]" if char == "е" else re.escape(char) for char in word)
+
+
+class PrefixIndex:
+    """Отсортированный список (слово, id) одной колонки для поиска по началу слов."""
+
+    def __init__(self, column, key_column):
+        self.column = column
+        self.key_column = key_column
+        self._entries = None
+
+    def reload(self, session, check_cancelled=None):
+        entries = []
+        rows = session.query(self.key_column, self.column).yield_per(10_000)
+        for number, (key, value) in enumerate(rows):
+            entries.extend((word, key) for word in set(search_words(value)))
+            if check_cancelled is not None and number % 10_000 == 0:
+                check_cancelled()
+        entries.sort()
+        self._entries = entries
+
+    def invalidate(self):
+        # Индекс будет перестроен при следующем поиске
+        self._entries = None
+
+    def search(self, session, text, check_cancelled=None):
+        """Отсортированные ключи строк, в которых каждое слово запроса начинает какое-нибудь слово."""
+        entries = self._entries
+        if entries is None:
+            self.reload(session, check_cancelled)
+            entries = self._entries
+        # Диапазон записей, слова которых начинаются с word; начинаем с самого узкого
+        ranges = []
+        for word in search_words(text):
+            start = bisect_left(entries, (word,))
+            end = bisect_left(entries, (word + "\U0010ffff",))
+            ranges.append((end - start, start))
+        ranges.sort()
+        keys = None
+        for size, start in ranges:
+            found = {key for _, key in entries[start:start + size]}
+            keys = found if keys is None else keys & found
+            if not keys:
+                return []
+        return sorted(keys or ())
+
+
+# Индексы в памяти для SQLite: {движок: {таблица: PrefixIndex}} (для PostgreSQL не используются)
+_prefix_indexes = WeakKeyDictionary()
+
+
+def prefix_index(bind, table):
+    """Индекс в памяти колонки поиска таблицы для базы bind."""
+    indexes = _prefix_indexes.setdefault(bind, {})
+    index = indexes.get(table)
+    if index is None:
+        index = indexes[table] = PrefixIndex(*SEARCH_COLUMNS[table])
+    return index
+
+
+def invalidate_prefix_index(bind, table):
+    index = _prefix_indexes.get(bind, {}).get(table)
+    if index is not None:
+        index.invalidate()
+
+
+def search_filter(session, table, text, check_cancelled=None):
+    """Фильтр для KeysetTableModel.set_filter(): пара (условие SQL, список ключей).
+
+    Пустой запрос снимает фильтр: (None, None).
+    """
+    words = search_words(text)
+    if not words:
+        return None, None
+    column, key_column = SEARCH_COLUMNS[table]
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        return and_(*[column.regexp_match(word_prefix_pattern(word), flags="i") for word in words]), None
+    return None, prefix_index(bind, table).search(session, text, check_cancelled)
@@ -0,0 +1,92 @@
+"""Остатки товаров на дату.
+
+Остаток = последняя инвентаризация (отчет по остаткам) на эту дату или раньше
++ поступило - убыло после нее по эту дату включительно. Поступление и убытие
+берутся из дневных итогов dvizhenie_tovara, которые триггеры базы обновляют
+при каждом изменении отчетов (миграция 6), так что на товар приходится
+несколько поисков по индексам, а не просмотр всех его отчетов.
+"""
+from datetime import date, datetime, timedelta
+import re
+
+from sqlalchemy import func, select
+
+from models import DvizhenieTovara, OtchetyPoOstatkamTovarov, Tovar
+
+
+def _snapshot_date(report_date, product_id):
+    # Дата последней инвентаризации товара на report_date или раньше
+    return (
+        select(func.max(OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta))
+        .where(OtchetyPoOstatkamTovarov.tovar_id == product_id)
+        .where(OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta <= report_date)
+        .correlate_except(OtchetyPoOstatkamTovarov)
+        .scalar_subquery()
+    )
+
+
+def _snapshot_value(column, snapshot_date, product_id):
+    return (
+        select(column)
+        .where(OtchetyPoOstatkamTovarov.tovar_id == product_id)
+        .where(OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta == snapshot_date)
+        .correlate_except(OtchetyPoOstatkamTovarov)
+        .scalar_subquery()
+    )
+
+
+def on_hand_column(report_date, product_id=Tovar.id):
+    """Выражение остатка товара product_id на report_date (для запросов по товарам)."""
+    snapshot_date = _snapshot_date(report_date, product_id)
+    snapshot_quantity = _snapshot_value(OtchetyPoOstatkamTovarov.kolithestvo_tovara, snapshot_date, product_id)
+    movement = (
+        select(func.sum(DvizhenieTovara.postupilo - DvizhenieTovara.ubylo))
+        .where(DvizhenieTovara.tovar_id == product_id)
+        .where(DvizhenieTovara.data <= report_date)
+        .where(DvizhenieTovara.data > func.coalesce(snapshot_date, date.min))
+        .correlate_except(DvizhenieTovara)
+        .scalar_subquery()
+    )
+    return func.coalesce(snapshot_quantity, 0) + func.coalesce(movement, 0)
+
+
+def stock_on_hand(session, report_date):
+    """Словарь {tovar_id: остаток на report_date} для всех товаров."""
+    return dict(session.query(Tovar.id, on_hand_column(report_date)))
+
+
+def expiry_column(report_date, product_id=Tovar.id):
+    """Срок годности партии товара на report_date: из последней инвентаризации."""
+    return _snapshot_value(
+        OtchetyPoOstatkamTovarov.srok_godnosti, _snapshot_date(report_date, product_id), product_id
+    )
+
+
+def stock_expiry(session, report_date):
+    """Словарь {tovar_id: срок годности} для товаров, у партии которых срок указан."""
+    rows = session.query(Tovar.id, expiry_column(report_date))
+    return {product_id: expiry for product_id, expiry in rows if expiry is not None}
+
+
+# Срок годности в таблице остатков вводится датой или числом дней от даты отчета ("10 дней")
+EXPIRY_DAYS_PATTERN = re.compile(r"^(\d+)\s*(дн\w*|день)?$")
+
+
+def parse_expiry(text, report_date):
+    """Дата срока годности из введенного текста; пустой текст - срок не указан (None).
+
+    Неверный формат - ValueError.
+    """
+    text = text.strip().lower()
+    if not text:
+        return None
+    match = EXPIRY_DAYS_PATTERN.match(text)
+    if match:
+        return report_date + timedelta(days=int(match.group(1)))
+    for pattern in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, pattern).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Неверный срок годности: {text}")
+
@@ -0,0 +1,670 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import enum
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+
+from change_events import ChangeKind
+
+
+def format_value(value):
+    # Значение ячейки в виде строки для отображения
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    return str(value)
+
+
+def sort_key(value):
+    # Пустые значения идут первыми, строки и перечисления сравниваются без учета регистра,
+    # числа (int, Decimal) и даты - как числа и даты
+    if value is None:
+        return (0,)
+    if isinstance(value, enum.Enum):
+        value = value.value
+    if isinstance(value, str):
+        return (1, value.casefold())
+    return (1, value)
+
+
+def contiguous_ranges(rows):
+    # Номера строк, сгруппированные в диапазоны подряд идущих: [(первая, последняя), ...] по возрастанию
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(item) for item in ranges]
+
+
+# Ключей в одном запросе при чтении ключей и значений колонок порциями
+KEY_CHUNK_SIZE = 5000
+
+
+class KeysetTableModel(QAbstractTableModel):
+    """Модель таблицы, подгружающая строки из базы данных страницами по мере прокрутки.
+
+    query_factory(session) возвращает запрос-проекцию (без ORM-объектов),
+    key_column - уникальная упорядоченная колонка (обычно id) для keyset-пагинации,
+    columns - список пар (заголовок, функция получения значения из строки запроса).
+    set_filter() ограничивает строки условием SQL или заранее найденным списком ключей.
+
+    В памяти держатся ключи подгруженных строк и ограниченный кэш страниц (LRU); вытесненная
+    страница перечитывается по ключам. Для SortFilterProxyModel модель отдает значения отдельных
+    колонок в исходном виде (int, Decimal, date, перечисление) - только тех колонок, по которым
+    идет сортировка или фильтр (retain_columns).
+    """
+
+    def __init__(self, session, query_factory, key_column, columns, page_size=200, max_cached_pages=20, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.query_factory = query_factory
+        self.key_column = key_column
+        self.columns = columns
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.revision = 0  # Увеличивается при каждом изменении строк (для кэшей прокси-модели)
+        self._keys = []  # Ключи всех подгруженных строк (в порядке отображения)
+        self._pages = OrderedDict()  # Кэш страниц: номер страницы -> кортежи значений колонок (LRU)
+        self._column_values = {}  # Колонка -> значения по всем подгруженным строкам (для прокси)
+        self._exhausted = False
+        self._filter_condition = None
+        self._filter_keys = None  # Отсортированный список допустимых ключей (или None)
+        self._filter_key_set = None
+
+    # --- Интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        values = self._row_values(index.row())
+        if values is None:
+            return None
+        return format_value(values[index.column()])
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        self._fetch(self.page_size)
+
+    # --- Публичные методы ---
+
+    def reload(self):
+        # Полная перезагрузка: сбрасываем кэш и подгружаем первую страницу
+        self.beginResetModel()
+        self._keys = []
+        self._pages.clear()
+        self._column_values.clear()
+        self._exhausted = False
+        self.revision += 1
+        self.endResetModel()
+        self.fetchMore()
+
+    def fetch_all(self):
+        # Загружает ключи оставшихся строк (для сортировки всех строк); сами строки
+        # читаются страницами при показе, значения колонок - в column_values()
+        if self._exhausted:
+            return
+        keys = self._remaining_keys()
+        self._exhausted = True
+        if not keys:
+            return
+        start = len(self._keys)
+        self.beginInsertRows(QModelIndex(), start, start + len(keys) - 1)
+        self._keys.extend(keys)
+        self._drop_pages_from(start)
+        for column, values in self._column_values.items():
+            values.extend(self._scan_column(column, keys))
+        self.revision += 1
+        self.endInsertRows()
+
+    def set_filter(self, condition=None, keys=None):
+        # Фильтр остается в силе при reload(); без аргументов - показываются все строки
+        self._filter_condition = condition
+        self._filter_keys = keys
+        self._filter_key_set = None if keys is None else set(keys)
+        self.reload()
+
+    def apply_changes(self, changes):
+        """Применяет изменения строк (RowChange) к уже загруженным строкам без полной перезагрузки."""
+        deleted = {change.key for change in changes if change.kind is ChangeKind.DELETED}
+        changed = {change.key for change in changes if change.kind is not ChangeKind.DELETED} - deleted
+        self.remove_keys(deleted)
+        self.refresh_keys(changed)
+
+    def refresh_keys(self, keys):
+        # Перечитываем строки по ключам одним запросом: каждая обновляется, вставляется или удаляется
+        keys = set(keys)
+        if not keys:
+            return
+        allowed = keys if self._filter_key_set is None else keys & self._filter_key_set
+        rows = self._query().filter(self.key_column.in_(allowed)).all() if allowed else []
+        found = {self._key_of(row): row for row in rows}
+        # Строки, которые больше не попадают в запрос, убираем из таблицы
+        self.remove_keys(keys - set(found))
+        for key in sorted(found):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                self._replace_row(position, found[key])
+            elif position < len(self._keys) or self._exhausted:
+                # Новая строка внутри уже загруженного диапазона ключей
+                self.beginInsertRows(QModelIndex(), position, position)
+                self._keys.insert(position, key)
+                values = self._values_of(found[key])
+                for column, column_values in self._column_values.items():
+                    column_values.insert(position, values[column])
+                self._drop_pages_from(position)
+                self.revision += 1
+                self.endInsertRows()
+            # Иначе строка находится за последней загруженной и появится при следующем fetchMore
+
+    def remove_keys(self, keys):
+        positions = []
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                positions.append(position)
+        # Соседние строки удаляются одним диапазоном, снизу вверх, чтобы номера выше не сдвигались
+        for first, last in reversed(contiguous_ranges(positions)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._keys[first:last + 1]
+            for values in self._column_values.values():
+                del values[first:last + 1]
+            self._drop_pages_from(first)
+            self.revision += 1
+            self.endRemoveRows()
+
+    def loaded_keys_where(self, condition):
+        """Ключи всех подгруженных строк, удовлетворяющих условию SQL (один запрос по ключам)."""
+        if not self._keys:
+            return []
+        query = self._query().with_entities(self.key_column).filter(condition)
+        if not self._exhausted:
+            query = query.filter(self.key_column <= self._keys[-1])
+        keys = []
+        for (key,) in query:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                keys.append(key)
+        return keys
+
+    def row_key(self, row):
+        # Первичный ключ записи в строке row (или None, если строка не выбрана)
+        if 0 <= row < len(self._keys):
+            return self._keys[row]
+        return None
+
+    def column_values(self, column):
+        # Значения колонки для всех загруженных строк, в исходном виде; читаются из базы
+        # при первом обращении и дальше обновляются вместе со строками
+        values = self._column_values.get(column)
+        if values is None:
+            values = self._column_values[column] = self._scan_column(column, self._keys)
+        return values
+
+    def retain_columns(self, columns):
+        # Значения остальных колонок больше не нужны прокси-модели
+        for column in [column for column in self._column_values if column not in columns]:
+            del self._column_values[column]
+
+    # --- Внутренние методы ---
+
+    def _query(self):
+        query = self.query_factory(self.session)
+        if self._filter_condition is not None:
+            query = query.filter(self._filter_condition)
+        return query
+
+    def _fetch(self, limit):
+        query = self._query()
+        if self._filter_keys is not None:
+            # Ключи уже известны: порция - следующие limit ключей после последнего загруженного
+            start = bisect_right(self._filter_keys, self._keys[-1]) if self._keys else 0
+            page_keys = self._filter_keys[start:start + limit]
+            if start + limit >= len(self._filter_keys):
+                self._exhausted = True
+            rows = query.filter(self.key_column.in_(page_keys)).order_by(self.key_column).all() if page_keys else []
+        else:
+            if self._keys:
+                query = query.filter(self.key_column > self._keys[-1])
+            rows = query.order_by(self.key_column).limit(limit).all()
+            if len(rows) < limit:
+                self._exhausted = True
+        if not rows:
+            return
+
+        start = len(self._keys)
+        values = [self._values_of(row) for row in rows]
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._keys.extend(self._key_of(row) for row in rows)
+        for column, column_values in self._column_values.items():
+            column_values.extend(row_values[column] for row_values in values)
+        # В кэш попадают только страницы, начинающиеся внутри новых строк (после удалений
+        # строки могут начаться с середины страницы - такая страница перечитается по ключам)
+        self._drop_pages_from(start)
+        first_page = -(-start // self.page_size)
+        for page_index in range(first_page, (start + len(rows) - 1) // self.page_size + 1):
+            offset = page_index * self.page_size - start
+            self._store_page(page_index, values[offset:offset + self.page_size])
+        self.revision += 1
+        self.endInsertRows()
+
+    def _remaining_keys(self):
+        # Ключи строк после последней загруженной: только колонка ключа, без значений строк
+        after = self._keys[-1] if self._keys else None
+        if self._filter_keys is None:
+            query = self._query().with_entities(self.key_column)
+            if after is not None:
+                query = query.filter(self.key_column > after)
+            return [key for (key,) in query.order_by(self.key_column)]
+        start = bisect_right(self._filter_keys, after) if after is not None else 0
+        keys = []
+        for chunk_start in range(start, len(self._filter_keys), KEY_CHUNK_SIZE):
+            chunk = self._filter_keys[chunk_start:chunk_start + KEY_CHUNK_SIZE]
+            query = self._query().with_entities(self.key_column).filter(self.key_column.in_(chunk))
+            keys.extend(key for (key,) in query.order_by(self.key_column))
+        return keys
+
+    def _scan_column(self, column, keys):
+        # Значения колонки для отсортированного списка ключей: запросы по диапазонам ключей
+        getter = self.columns[column][1]
+        values = []
+        for chunk_start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[chunk_start:chunk_start + KEY_CHUNK_SIZE]
+            rows = self._query().filter(self.key_column.between(chunk[0], chunk[-1]))
+            found = {self._key_of(row): getter(row) for row in rows}
+            values.extend(found.get(key) for key in chunk)
+        return values
+
+    def _key_of(self, row):
+        return getattr(row, self.key_column.key)
+
+    def _values_of(self, row):
+        return tuple(value(row) for _, value in self.columns)
+
+    def _row_values(self, position):
+        page_index, offset = divmod(position, self.page_size)
+        page = self._pages.get(page_index)
+        if page is None:
+            page = self._load_page(page_index)
+        else:
+            self._pages.move_to_end(page_index)
+        return page[offset] if offset < len(page) else None
+
+    def _load_page(self, page_index):
+        # Повторная загрузка вытесненной из кэша страницы по известным ключам
+        keys = self._keys[page_index * self.page_size:(page_index + 1) * self.page_size]
+        rows = self._query().filter(self.key_column.in_(keys)).all() if keys else []
+        by_key = {self._key_of(row): self._values_of(row) for row in rows}
+        page = [by_key.get(key) for key in keys]
+        self._store_page(page_index, page)
+        return page
+
+    def _replace_row(self, position, row):
+        values = self._values_of(row)
+        page_index, offset = divmod(position, self.page_size)
+        page = self._pages.get(page_index)
+        if page is not None and offset < len(page):
+            page[offset] = values
+        for column, column_values in self._column_values.items():
+            column_values[position] = values[column]
+        self.revision += 1
+        self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.columns) - 1))
+
+    def _drop_pages_from(self, position):
+        # После вставки или удаления строки границы следующих страниц сдвигаются:
+        # такие страницы удаляются из кэша
+        first_page = position // self.page_size
+        for page_index in [index for index in self._pages if index >= first_page]:
+            del self._pages[page_index]
+
+    def _store_page(self, page_index, rows):
+        self._pages[page_index] = rows
+        self._pages.move_to_end(page_index)
+        while len(self._pages) > self.max_cached_pages:
+            self._pages.popitem(last=False)
+
+
+class SortFilterProxyModel(QAbstractProxyModel):
+    """Сортировка и фильтры по колонкам для KeysetTableModel в памяти, без запросов к базе.
+
+    Сравниваются исходные значения колонок (KeysetTableModel.column_values), поэтому
+    числа, цены и даты упорядочены как числа и даты. Ключи сортировки и строки для фильтров
+    вычисляются один раз на колонку; при изменении строк исходной модели пересчитываются
+    только значения этих строк, а измененная строка переносится на новое место двоичным поиском.
+    Перед сортировкой или фильтрацией исходная модель загружает ключи всех строк и значения
+    только тех колонок, по которым сортируют или фильтруют.
+
+    В отличие от QSortFilterProxyModel, порядок строк вычисляется одним sorted() по
+    готовым ключам: сравнения не вызывают Python для каждой пары строк.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []        # Строки исходной модели в порядке отображения
+        self._positions = []   # Строка исходной модели -> строка прокси (-1 - скрыта фильтром)
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filters = {}     # колонка -> искомый текст (casefold)
+        self._cache = {}       # (вид, колонка) -> значения по строкам исходной модели
+        self._cache_revision = None
+        self._loading = False  # Исходная модель дозагружает строки внутри сброса прокси
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._source_reset)
+        model.rowsAboutToBeInserted.connect(self._source_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self._source_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._source_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._source_rows_removed)
+        model.dataChanged.connect(self._source_data_changed)
+        self._rebuild()
+        self.endResetModel()
+
+    # --- Интерфейс QAbstractProxyModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self._rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self._rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        position = self._positions[source_index.row()]
+        if position < 0:
+            return QModelIndex()
+        return self.index(position, source_index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        title = self.sourceModel().headerData(section, orientation, role)
+        return f"{title} (фильтр)" if section in self._filters else title
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # column = -1 - порядок исходной модели (по ключу)
+        self._sort_column = column
+        self._sort_order = order
+        self._relayout()
+
+    # --- Публичные методы ---
+
+    def set_column_filter(self, column, text):
+        # Строка остается, если значение колонки содержит text (без учета регистра); пустой text - без фильтра
+        text = (text or "").strip().casefold()
+        if text:
+            self._filters[column] = text
+        else:
+            self._filters.pop(column, None)
+        self._refilter()
+        self.headerDataChanged.emit(Qt.Horizontal, column, column)
+
+    def column_filter(self, column):
+        return self._filters.get(column, "")
+
+    def clear_filters(self):
+        columns = list(self._filters)
+        self._filters.clear()
+        self._refilter()
+        for column in columns:
+            self.headerDataChanged.emit(Qt.Horizontal, column, column)
+
+    def row_key(self, row):
+        # Первичный ключ записи в строке row прокси (или None, если строка не выбрана)
+        if 0 <= row < len(self._rows):
+            return self.sourceModel().row_key(self._rows[row])
+        return None
+
+    # --- Внутренние методы ---
+
+    def _active(self):
+        return self._sort_column >= 0 or bool(self._filters)
+
+    def _column_cache(self, kind, column):
+        source = self.sourceModel()
+        if self._cache_revision != source.revision:
+            self._cache.clear()
+            self._cache_revision = source.revision
+        values = self._cache.get((kind, column))
+        if values is None:
+            values = self._cache[(kind, column)] = [
+                self._cache_value(kind, value) for value in source.column_values(column)
+            ]
+        return values
+
+    def _cache_value(self, kind, value):
+        return sort_key(value) if kind == "key" else format_value(value).casefold()
+
+    def _update_cache(self, update):
+        # Каждый сигнал исходной модели соответствует одной ревизии: кэш обновляется только
+        # по измененным строкам. Если изменение было пропущено, кэш строится заново при обращении
+        source = self.sourceModel()
+        if self._cache_revision != source.revision - 1:
+            return
+        for (kind, column), values in self._cache.items():
+            update(kind, source.column_values(column), values)
+        self._cache_revision = source.revision
+
+    def _cache_rows_inserted(self, first, last):
+        def update(kind, column_values, values):
+            values[first:first] = [self._cache_value(kind, value) for value in column_values[first:last + 1]]
+        self._update_cache(update)
+
+    def _cache_rows_removed(self, first, last):
+        def update(kind, column_values, values):
+            del values[first:last + 1]
+        self._update_cache(update)
+
+    def _cache_rows_changed(self, first, last):
+        def update(kind, column_values, values):
+            for row in range(first, last + 1):
+                values[row] = self._cache_value(kind, column_values[row])
+        self._update_cache(update)
+
+    def _accepts(self, row):
+        return all(text in self._column_cache("text", column)[row] for column, text in self._filters.items())
+
+    def _rebuild(self):
+        count = self.sourceModel().rowCount()
+        rows = range(count)
+        for column, text in self._filters.items():
+            texts = self._column_cache("text", column)
+            rows = [row for row in rows if text in texts[row]]
+        rows = list(rows)
+        if self._sort_column >= 0:
+            keys = self._column_cache("key", self._sort_column)
+            rows.sort(key=keys.__getitem__, reverse=self._sort_order == Qt.DescendingOrder)
+        self._rows = rows
+        self._update_positions(count)
+        # Значения колонок без сортировки и фильтра освобождаются
+        columns = set(self._filters) | {self._sort_column}
+        for kind, column in [item for item in self._cache if item[1] not in columns]:
+            del self._cache[(kind, column)]
+        self.sourceModel().retain_columns(columns)
+
+    def _update_positions(self, count=None):
+        self._positions = [-1] * (self.sourceModel().rowCount() if count is None else count)
+        for position, row in enumerate(self._rows):
+            self._positions[row] = position
+
+    def _renumber(self, first, last):
+        # Номера в прокси только для строк first..last (после вставки, скрытия или переноса строки)
+        for position in range(first, last + 1):
+            self._positions[self._rows[position]] = position
+
+    def _load_all(self):
+        # Сортировать и фильтровать нужно все строки, а не только подгруженные прокруткой
+        self._loading = True
+        try:
+            self.sourceModel().fetch_all()
+        finally:
+            self._loading = False
+
+    def _refilter(self):
+        # Фильтр меняет количество строк, поэтому прокси сбрасывается
+        self.beginResetModel()
+        if self._active():
+            self._load_all()
+        self._rebuild()
+        self.endResetModel()
+
+    def _relayout(self):
+        if self._active() and self.sourceModel().canFetchMore():
+            self._refilter()
+            return
+        # Выделение и текущая строка сохраняются: они переносятся по строкам исходной модели
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        source_indexes = [self.mapToSource(index) for index in persistent]
+        self._rebuild()
+        self.changePersistentIndexList(persistent, [self.mapFromSource(index) for index in source_indexes])
+        self.layoutChanged.emit()
+
+    def _insert_position(self, row):
+        # Место строки исходной модели среди уже показанных (после равных ей)
+        if self._sort_column < 0:
+            return bisect_left(self._rows, row)
+        keys = self._column_cache("key", self._sort_column)
+        key = keys[row]
+        descending = self._sort_order == Qt.DescendingOrder
+        low, high = 0, len(self._rows)
+        while low < high:
+            middle = (low + high) // 2
+            other = keys[self._rows[middle]]
+            if (other < key) if descending else (key < other):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _show_row(self, row):
+        position = self._insert_position(row)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, row)
+        self._renumber(position, len(self._rows) - 1)
+        self.endInsertRows()
+
+    def _hide_row(self, row):
+        position = self._positions[row]
+        self.beginRemoveRows(QModelIndex(), position, position)
+        del self._rows[position]
+        self._positions[row] = -1
+        self._renumber(position, len(self._rows) - 1)
+        self.endRemoveRows()
+
+    # --- Изменения исходной модели ---
+
+    def _source_reset(self):
+        if self._active():
+            self._load_all()
+        self._rebuild()
+        self.endResetModel()
+
+    def _source_rows_about_to_be_inserted(self, parent, first, last):
+        if not self._loading and not self._active():
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _source_rows_inserted(self, parent, first, last):
+        self._cache_rows_inserted(first, last)
+        if self._loading:
+            return
+        count = last - first + 1
+        if not self._active():
+            self._rows = list(range(self.sourceModel().rowCount()))
+            self._update_positions()
+            self.endInsertRows()
+            return
+        self._rows = [row + count if row >= first else row for row in self._rows]
+        self._update_positions()
+        for row in range(first, last + 1):
+            if self._accepts(row):
+                self._show_row(row)
+
+    def _source_rows_about_to_be_removed(self, parent, first, last):
+        if self._loading:
+            return
+        if not self._active():
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+        for row in range(last, first - 1, -1):
+            if self._positions[row] >= 0:
+                self._hide_row(row)
+
+    def _source_rows_removed(self, parent, first, last):
+        self._cache_rows_removed(first, last)
+        if self._loading:
+            return
+        count = last - first + 1
+        if not self._active():
+            self._rows = list(range(self.sourceModel().rowCount()))
+            self._update_positions()
+            self.endRemoveRows()
+            return
+        self._rows = [row - count if row > last else row for row in self._rows]
+        self._update_positions()
+
+    def _source_data_changed(self, top_left, bottom_right, roles=()):
+        self._cache_rows_changed(top_left.row(), bottom_right.row())
+        if self._loading:
+            return
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            position = self._positions[row]
+            if not self._active():
+                self.dataChanged.emit(self.index(position, 0), self.index(position, self.columnCount() - 1))
+                continue
+            accepted = self._accepts(row)
+            if position >= 0 and not accepted:
+                self._hide_row(row)
+            elif position < 0 and accepted:
+                self._show_row(row)
+            elif position >= 0:
+                # Новое значение могло сдвинуть строку: переносим ее, сохраняя выделение
+                del self._rows[position]
+                target = self._insert_position(row)
+                self._rows.insert(position, row)
+                if target != position:
+                    self.beginMoveRows(QModelIndex(), position, position, QModelIndex(),
+                                       target + 1 if target > position else target)
+                    del self._rows[position]
+                    self._rows.insert(target, row)
+                    self._renumber(min(position, target), max(position, target))
+                    self.endMoveRows()
+                position = self._positions[row]
+                self.dataChanged.emit(self.index(position, 0), self.index(position, self.columnCount() - 1))
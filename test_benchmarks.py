@@ -0,0 +1,157 @@
+"""Замеры загрузки таблиц, данных отчетов и построения PDF (pytest-benchmark).
+
+    python -m pytest test_benchmarks.py --benchmark-autosave      # сохранить результаты в .benchmarks/
+    python -m pytest test_benchmarks.py --benchmark-compare --benchmark-compare-fail=mean:20%
+
+Размер данных задает BENCH_SCALE (1k, 100k, 1m; по умолчанию 1k). По умолчанию база SQLite
+создается во временном каталоге; BENCH_DATABASE_URL позволяет указать заранее заполненную
+базу (например, python bench_data.py --scale 1m) или локальный PostgreSQL.
+"""
+import os
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+pytest.importorskip("pytest_benchmark")
+
+from models import Connect, Postavshik, Tovar, Sotrudnik
+from queries import (
+    suppliers_query, products_query, employees_query, SUPPLIER_COLUMNS, PRODUCT_COLUMNS, EMPLOYEE_COLUMNS,
+    report_products, arrival_reports_by_product, loss_report_rows, order_rows_by_product,
+    expiring_stock_query
+)
+from stock_ledger import stock_on_hand, stock_expiry
+from table_models import KeysetTableModel
+from address_service import AddressIndex
+from search import PrefixIndex, SEARCH_COLUMNS, search_filter
+from report_writer import REPORT_FONT_FILE
+from report_templates import (
+    ARRIVAL_REPORT, STOCK_REPORT, LOSS_REPORT, ORDER_CONVERSION_REPORT, EXPIRING_REPORT,
+    GENERAL_ACCOUNTING_REPORT, INVOICE_REPORT, SPECIFICATION_REPORT
+)
+from bench_data import SCALES, BASE_DATE, prepare_database
+
+BENCH_SCALE = os.environ.get("BENCH_SCALE", "1k")
+PAGE_SIZE = 200  # Размер страницы KeysetTableModel по умолчанию
+
+
+@pytest.fixture(scope="module", params=[BENCH_SCALE])
+def bench_session(request, tmp_path_factory):
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if not url:
+        url = f"sqlite:///{tmp_path_factory.mktemp('bench') / f'bench_{request.param}.sqlite'}"
+    # Движок с настройками приложения (пул, PRAGMA для SQLite)
+    engine = Connect.get_engine(url)
+    prepare_database(engine, SCALES[request.param])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    Connect.dispose()
+
+
+# --- Таблицы вкладок (load_*_data: перезагрузка модели и вывод первой страницы) ---
+
+@pytest.mark.benchmark(group="loaders")
+@pytest.mark.parametrize("query_factory, key_column, columns", [
+    (suppliers_query, Postavshik.id, SUPPLIER_COLUMNS),
+    (products_query, Tovar.id, PRODUCT_COLUMNS),
+    (employees_query, Sotrudnik.id, EMPLOYEE_COLUMNS),
+], ids=["suppliers", "products", "employees"])
+def test_load_table(benchmark, bench_session, query_factory, key_column, columns):
+    model = KeysetTableModel(bench_session, query_factory, key_column, columns)
+
+    def load():
+        model.reload()
+        return [
+            model.data(model.index(row, column))
+            for row in range(model.rowCount()) for column in range(model.columnCount())
+        ]
+
+    assert benchmark(load)
+
+
+@pytest.mark.benchmark(group="loaders")
+def test_load_address_index(benchmark, bench_session):
+    index = AddressIndex()
+    benchmark(index.reload, bench_session)
+    assert index.completions(bench_session)
+
+
+# --- Поиск на вкладках: фильтр и первая страница таблицы (индекс в памяти уже построен) ---
+
+@pytest.mark.benchmark(group="search")
+@pytest.mark.parametrize("query_factory, table, text", [
+    (suppliers_query, "postavshik", "поставщик 12"),
+    (products_query, "tovar", "товар 5"),
+    (employees_query, "sotrudnik", "фамилия 3"),
+], ids=["suppliers", "products", "employees"])
+def test_search(benchmark, bench_session, query_factory, table, text):
+    column, key_column = SEARCH_COLUMNS[table]
+    search_filter(bench_session, table, text)
+
+    def search():
+        # То же, что KeysetTableModel.set_filter() и загрузка первой страницы
+        condition, keys = search_filter(bench_session, table, text)
+        query = query_factory(bench_session)
+        if condition is not None:
+            query = query.filter(condition)
+        if keys is not None:
+            query = query.filter(key_column.in_(keys[:PAGE_SIZE]))
+        return query.order_by(key_column).limit(PAGE_SIZE).all()
+
+    assert benchmark(search)
+    # Цель - ответ быстрее 50 мс на каталоге из 100 тысяч товаров (без --benchmark-disable)
+    if benchmark.stats:
+        assert benchmark.stats.stats.median < 0.05
+
+
+@pytest.mark.benchmark(group="search")
+def test_build_prefix_index(benchmark, bench_session):
+    index = PrefixIndex(*SEARCH_COLUMNS["tovar"])
+    benchmark(index.reload, bench_session)
+    assert index.search(bench_session, "товар 1")
+
+
+# --- Данные отчетов (то, что окно загружает в фоновом потоке) ---
+
+REPORT_LOADERS = {
+    "arrival": lambda session: (arrival_reports_by_product(session, BASE_DATE), report_products(session)),
+    "stock": lambda session: (
+        report_products(session), stock_on_hand(session, BASE_DATE), stock_expiry(session, BASE_DATE)
+    ),
+    "loss": lambda session: loss_report_rows(session, BASE_DATE),
+    "order_conversion": lambda session: (report_products(session), order_rows_by_product(session, BASE_DATE)),
+    "expiring": lambda session: expiring_stock_query(session, BASE_DATE, 7).all(),
+}
+
+@pytest.mark.benchmark(group="report-loaders")
+@pytest.mark.parametrize("name", sorted(REPORT_LOADERS))
+def test_report_loader(benchmark, bench_session, name):
+    assert benchmark(REPORT_LOADERS[name], bench_session)
+
+
+# --- Построение PDF ---
+
+PDF_REPORTS = {
+    "arrival": ARRIVAL_REPORT,
+    "stock": STOCK_REPORT,
+    "loss": LOSS_REPORT,
+    "order_conversion": ORDER_CONVERSION_REPORT,
+    "expiring": EXPIRING_REPORT,
+    "general_accounting": GENERAL_ACCOUNTING_REPORT,
+    "invoice": INVOICE_REPORT,
+    "specification": SPECIFICATION_REPORT,
+}
+
+@pytest.mark.skipif(not os.path.exists(REPORT_FONT_FILE), reason=f"Нет файла шрифта {REPORT_FONT_FILE}")
+@pytest.mark.benchmark(group="pdf")
+@pytest.mark.parametrize("name", sorted(PDF_REPORTS))
+def test_pdf_report(benchmark, bench_session, tmp_path, name):
+    filename = str(tmp_path / f"{name}.pdf")
+
+    def build():
+        return PDF_REPORTS[name].render(bench_session, {"report_date": BASE_DATE}, filename=filename)
+
+    # Большие отчеты строятся секундами, поэтому достаточно нескольких повторов
+    benchmark.pedantic(build, rounds=3, iterations=1, warmup_rounds=0)
+    assert os.path.getsize(filename)
@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from models import Base
+from migrations import MIGRATIONS, run_migrations
+
+REPORT_DATE = datetime.date(2025, 4, 12)
+
+# Таблицы отчетов в том виде, в котором их создавали версии без индексов
+OLD_SCHEMA = [
+    "CREATE TABLE tovar (id INTEGER PRIMARY KEY, nazvanie VARCHAR(11) NOT NULL, nomer INTEGER NOT NULL, "
+    "opisanie VARCHAR(100), cena NUMERIC(10, 2), kartinka BLOB, postavshik_id INTEGER)",
+    "CREATE TABLE otchety_po_postupleniju_tovarov (id INTEGER PRIMARY KEY, data_postuplenija DATE NOT NULL, "
+    "kolithestvo_postupivshih_tovarov INTEGER NOT NULL, data_formirovaniya_otcheta DATE NOT NULL, "
+    "tovar_id INTEGER, postavshik_id INTEGER)",
+    "CREATE TABLE otchety_po_ostatkom_tovarov (id INTEGER PRIMARY KEY, kolithestvo_tovara INTEGER NOT NULL, "
+    "data_formirovaniya_otcheta DATE NOT NULL, tovar_id INTEGER)",
+    "CREATE TABLE otchety_po_ubytomu_tovaru (id INTEGER PRIMARY KEY, data_ubytija DATE NOT NULL, "
+    "kolithestvo_ubytogo_tovara INTEGER NOT NULL, data_formirovaniya_otcheta DATE NOT NULL, tovar_id INTEGER)",
+    "CREATE TABLE gorod (id INTEGER PRIMARY KEY, nazvanie VARCHAR(100) NOT NULL, "
+    "sok_nazvanie VARCHAR(100) NOT NULL, oblast_id INTEGER)",
+    "CREATE TABLE ulica (id INTEGER PRIMARY KEY, nazvanie VARCHAR(100) NOT NULL, gorod_id INTEGER)",
+    "CREATE TABLE dom_stroenie (id INTEGER PRIMARY KEY, nomer INTEGER NOT NULL, ulica_id INTEGER)",
+    "CREATE TABLE postavshik (id INTEGER PRIMARY KEY, nazvanie_postavshika VARCHAR(100) NOT NULL, "
+    "tip_postavshika VARCHAR(3) NOT NULL, kontakt_tel VARCHAR(100), email VARCHAR(100), juridicheskij_adres INTEGER)",
+]
+
+# Один и тот же адрес, созданный дважды: два города, две улицы и два дома.
+# Одноименный город другой области - отдельный город
+OLD_ADDRESSES = [
+    "INSERT INTO gorod VALUES (1, 'Москва', 'Мос', 1), (2, 'Москва', 'Мос', 1), (3, 'Москва', 'Мос', 2)",
+    "INSERT INTO ulica VALUES (1, 'Ленина', 1), (2, 'Ленина', 2)",
+    "INSERT INTO dom_stroenie VALUES (1, 5, 1), (2, 5, 2)",
+    "INSERT INTO postavshik (id, nazvanie_postavshika, tip_postavshika, juridicheskij_adres) "
+    "VALUES (1, 'А', 'OOO', 1), (2, 'Б', 'OOO', 2)",
+]
+
+
+def test_migrations_upgrade_old_database_with_duplicates():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA + OLD_ADDRESSES:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO tovar (id, nazvanie, nomer, kartinka) VALUES (1, 'Buket', 1, x'01')"))
+        for quantity in (3, 5):
+            connection.execute(
+                text("INSERT INTO otchety_po_ostatkom_tovarov (kolithestvo_tovara, data_formirovaniya_otcheta, tovar_id) "
+                     "VALUES (:q, :d, 1)"), {"q": quantity, "d": REPORT_DATE})
+            connection.execute(
+                text("INSERT INTO otchety_po_ubytomu_tovaru (data_ubytija, kolithestvo_ubytogo_tovara, "
+                     "data_formirovaniya_otcheta, tovar_id) VALUES (:d, :q, :d, 1)"), {"q": quantity, "d": REPORT_DATE})
+
+    Base.metadata.create_all(engine)
+    assert run_migrations(engine, Base.metadata) == len(MIGRATIONS)
+    assert run_migrations(engine, Base.metadata) == 0  # Повторный запуск ничего не меняет
+
+    with engine.connect() as connection:
+        # Остатки: побеждает последняя запись, убытие: количества складываются
+        assert connection.execute(text("SELECT kolithestvo_tovara FROM otchety_po_ostatkom_tovarov")).scalars().all() == [5]
+        assert connection.execute(text("SELECT kolithestvo_ubytogo_tovara FROM otchety_po_ubytomu_tovaru")).scalars().all() == [8]
+        assert connection.execute(text("SELECT kartinka_hash FROM tovar")).scalar()
+        # Итоги движения товара заполнены по уже существующим отчетам
+        assert connection.execute(text("SELECT ubylo FROM dvizhenie_tovara")).scalars().all() == [8]
+        # Дубли адреса объединены, оба поставщика ссылаются на оставшийся дом
+        assert connection.execute(text("SELECT id FROM gorod ORDER BY id")).scalars().all() == [1, 3]
+        assert connection.execute(text("SELECT COUNT(*) FROM dom_stroenie")).scalar() == 1
+        assert connection.execute(text("SELECT DISTINCT juridicheskij_adres FROM postavshik")).scalars().all() == [1]
+    index_names = {index["name"] for index in inspect(engine).get_indexes("otchety_po_ostatkom_tovarov")}
+    assert {"uq_ostatki_data_tovar", "ix_ostatki_tovar_data"} <= index_names
+
+
+def test_city_names_are_unique_within_oblast():
+    """База, обновленная прежней миграцией 3, теряет глобальную уникальность названия города."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    run_migrations(engine, Base.metadata)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_gorod_oblast_nazvanie"))
+        connection.execute(text("CREATE UNIQUE INDEX uq_gorod_nazvanie ON gorod (nazvanie)"))
+        connection.execute(text("DELETE FROM schema_version WHERE version = 9"))
+    assert run_migrations(engine, Base.metadata) == 1
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO gorod (nazvanie, sok_nazvanie, oblast_id) VALUES ('Киров', 'Кир', 1), ('Киров', 'Кир', 2)"
+        ))
+        with pytest.raises(IntegrityError):
+            with connection.begin_nested():
+                connection.execute(text("INSERT INTO gorod (nazvanie, sok_nazvanie, oblast_id) VALUES ('Киров', 'Кир', 1)"))
+
@@ -0,0 +1,527 @@
+import datetime
+from decimal import Decimal
+from weakref import WeakKeyDictionary
+
+import pytest
+from PySide6.QtCore import Qt
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import (
+    Base, Oblast, Gorod, Ulica, DomStroenie, Postavshik, TipPostavshika, Tovar, TipTovara,
+    OtchetyPoPostuplenijuTovarov, OtchetyPoOstatkamTovarov, OtchetyPoUbytomuTovaru, ZakazTovara
+)
+from queries import (
+    suppliers_query, products_query, PRODUCT_COLUMNS, get_supplier, get_product, report_products,
+    arrival_reports_by_product, stock_reports_by_product, loss_report_rows, iter_stock_report_rows,
+    order_rows_by_product, iter_order_report_rows, delete_rows, expiring_stock_query
+)
+from report_edits import ReportChangeSet, delete_reports
+import table_models
+from table_models import KeysetTableModel, SortFilterProxyModel, sort_key
+from change_events import RowChange, ChangeKind
+import search
+from address_service import AddressIndex, address_index
+from search import PrefixIndex, search_filter, invalidate_prefix_index, word_prefix_pattern
+from migrations import run_migrations
+from stock_ledger import stock_on_hand, stock_expiry, parse_expiry
+from order_model import OrderConversion
+from instrumentation import QueryMonitor, query_screen
+import profiling
+
+REPORT_DATE = datetime.date(2025, 4, 12)
+
+
+@pytest.fixture(autouse=True)
+def fresh_search_indexes(monkeypatch):
+    # Индексы поиска в памяти не переходят из теста в тест
+    monkeypatch.setattr(search, "_prefix_indexes", WeakKeyDictionary())
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def make_session(rows):
+    """Создает базу SQLite в памяти с rows товарами, поставщиками и отчетами."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    oblast = Oblast(nazvanie="Московская")
+    gorod = Gorod(nazvanie="Москва", sok_nazvanie="Мос", oblast=oblast)
+    ulica = Ulica(nazvanie="Ленина", gorod=gorod)
+    for i in range(rows):
+        dom = DomStroenie(nomer=i + 1, ulica=ulica)
+        supplier = Postavshik(
+            nazvanie_postavshika=f"Поставщик {i}", tip_postavshika=TipPostavshika.OOO,
+            juridicheskij_adres_rel=dom
+        )
+        product = Tovar(
+            nazvanie=TipTovara.Buket, nomer=i + 1, opisanie=f"Букет {i}", cena=100 + i,
+            postavshik=supplier
+        )
+        session.add_all([
+            product,
+            OtchetyPoPostuplenijuTovarov(
+                data_postuplenija=REPORT_DATE, kolithestvo_postupivshih_tovarov=i,
+                data_formirovaniya_otcheta=REPORT_DATE, tovar=product, postavshik=supplier
+            ),
+            OtchetyPoOstatkamTovarov(kolithestvo_tovara=i, data_formirovaniya_otcheta=REPORT_DATE, tovar=product),
+            OtchetyPoUbytomuTovaru(
+                data_ubytija=REPORT_DATE, kolithestvo_ubytogo_tovara=1,
+                data_formirovaniya_otcheta=REPORT_DATE, tovar=product
+            ),
+        ])
+    session.commit()
+    session.expunge_all()
+    return session, QueryCounter(engine)
+
+
+def render_suppliers(session):
+    return [tuple(row) for row in suppliers_query(session).all()]
+
+def render_products(session):
+    return [tuple(row) for row in products_query(session).all()]
+
+def render_arrival(session):
+    reports = arrival_reports_by_product(session, REPORT_DATE)
+    return [(p.opisanie, p.nazvanie_postavshika, reports[p.id].kolithestvo_postupivshih_tovarov)
+            for p in report_products(session)]
+
+def render_stock(session):
+    reports = stock_reports_by_product(session, REPORT_DATE)
+    return [(p.opisanie, p.nazvanie_postavshika, reports[p.id].kolithestvo_tovara)
+            for p in report_products(session)]
+
+def render_loss(session):
+    return [(r.kolithestvo_ubytogo_tovara, r.tovar_nazvanie.value) for r in loss_report_rows(session, REPORT_DATE)]
+
+def render_supplier_form(session):
+    supplier = get_supplier(session, 1)
+    adres = supplier.juridicheskij_adres_rel
+    return f"{adres.ulica.gorod.nazvanie}, {adres.ulica.nazvanie}, {adres.nomer}"
+
+def render_product_form(session):
+    return get_product(session, 1).postavshik.nazvanie_postavshika
+
+
+@pytest.mark.parametrize("render, expected_queries", [
+    (render_suppliers, 1),
+    (render_products, 1),
+    (render_arrival, 2),
+    (render_stock, 2),
+    (render_loss, 1),
+    (render_supplier_form, 1),
+    (render_product_form, 1),
+])
+def test_screen_query_count_does_not_depend_on_rows(render, expected_queries):
+    """Каждый экран загружается фиксированным числом запросов (без N+1)."""
+    for rows in (3, 30):
+        session, counter = make_session(rows)
+        result = render(session)
+        assert result
+        assert counter.count == expected_queries, f"{render.__name__}: {counter.count} запросов при {rows} строках"
+        session.close()
+
+
+def test_report_changes_flush_in_fixed_number_of_queries():
+    """Пакет правок отчета сохраняется фиксированным числом запросов, повторные правки схлопываются."""
+    session, counter = make_session(30)
+    changes = ReportChangeSet(OtchetyPoOstatkamTovarov, OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta)
+    new_date = REPORT_DATE + datetime.timedelta(days=1)
+    for tovar_id in range(1, 31):
+        changes.set(tovar_id, REPORT_DATE, kolithestvo_tovara=1)
+        changes.set(tovar_id, REPORT_DATE, kolithestvo_tovara=tovar_id * 10)
+        changes.set(tovar_id, new_date, kolithestvo_tovara=5)
+    assert len(changes) == 60
+
+    counter.count = 0
+    assert changes.flush(session) == 60
+    assert counter.count == 1  # INSERT ... ON CONFLICT DO UPDATE одним запросом
+    assert len(changes) == 0
+
+    stock = stock_reports_by_product(session, REPORT_DATE)
+    assert stock[7].kolithestvo_tovara == 70
+    assert len(stock_reports_by_product(session, new_date)) == 30
+    session.close()
+
+
+def test_report_rows_are_read_in_chunks():
+    """Строки отчета для PDF читаются порциями: число запросов зависит от размера порции."""
+    session, counter = make_session(25)
+    rows = list(iter_stock_report_rows(session, REPORT_DATE, chunk_size=10))
+    assert [row.id for row in rows] == list(range(1, 26))
+    assert rows[4].kolithestvo_tovara == 4
+    assert counter.count == 3
+    session.close()
+
+
+def test_model_applies_row_changes_without_reload():
+    """Изменение одной записи перечитывает только ее, без сброса модели."""
+    session, counter = make_session(30)
+    model = KeysetTableModel(session, products_query, Tovar.id, PRODUCT_COLUMNS, page_size=10)
+    model.fetchMore()
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+
+    session.get(Tovar, 4).opisanie = "Новое описание"
+    session.delete(session.get(Tovar, 2))
+    session.commit()
+    counter.count = 0
+    model.apply_changes([RowChange("tovar", ChangeKind.UPDATED, 4), RowChange("tovar", ChangeKind.DELETED, 2)])
+
+    assert counter.count == 1
+    assert model.rowCount() == 9
+    assert model.row_key(2) == 4
+    assert model.data(model.index(2, 3)) == "Новое описание"
+    assert not resets
+    session.close()
+
+
+def test_search_filters_model_by_word_prefix():
+    """Поиск в SQLite идет по индексу в памяти; страницы модели берутся из найденных ключей."""
+    session, counter = make_session(30)
+    index = PrefixIndex(Tovar.opisanie, Tovar.id)
+    assert index.search(session, "букет 1") == [2] + list(range(11, 21))
+    assert index.search(session, "БУК 2") == [3] + list(range(21, 31))
+    assert index.search(session, "роза") == []
+
+    condition, keys = search_filter(session, "tovar", "  букет 2 ")
+    assert condition is None and keys == [3] + list(range(21, 31))
+    model = KeysetTableModel(session, products_query, Tovar.id, PRODUCT_COLUMNS, page_size=5)
+    model.set_filter(condition, keys)
+    assert [model.row_key(row) for row in range(model.rowCount())] == [3, 21, 22, 23, 24]
+    model.fetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 11 and not model.canFetchMore()
+
+    # Изменения перечитывают только найденные строки; новые совпадения появятся при повторном поиске
+    session.get(Tovar, 21).opisanie = "Корзина"
+    session.commit()
+    model.apply_changes([RowChange("tovar", ChangeKind.UPDATED, 21), RowChange("tovar", ChangeKind.UPDATED, 5)])
+    assert model.rowCount() == 11 and model.data(model.index(1, 3)) == "Корзина"
+
+    model.set_filter()
+    assert model.rowCount() == 5 and model.row_key(0) == 1
+    session.close()
+
+
+def test_search_index_is_kept_per_database():
+    """У каждой базы свой индекс поиска: ключи одной базы не попадают в поиск по другой."""
+    session, _ = make_session(30)
+    other, _ = make_session(5)
+    assert search_filter(session, "tovar", "букет 2")[1] == [3] + list(range(21, 31))
+    assert search_filter(other, "tovar", "букет 2")[1] == [3]
+
+    other.get(Tovar, 4).opisanie = "Букет 25 роз"
+    other.commit()
+    invalidate_prefix_index(other.get_bind(), "tovar")
+    assert search_filter(other, "tovar", "букет 2")[1] == [3, 4]
+    assert search_filter(session, "tovar", "букет 2")[1] == [3] + list(range(21, 31))
+    # В PostgreSQL то же условие - начало слова, "е" совпадает и с "ё"
+    assert word_prefix_pattern("елк") == "\\m[её]лк"
+    session.close()
+    other.close()
+
+
+def test_proxy_sorts_typed_values_without_queries(monkeypatch):
+    """Сортировка и фильтры прокси работают по значениям колонок в памяти: цена 109 больше 99."""
+    session, counter = make_session(25)
+    model = KeysetTableModel(session, products_query, Tovar.id, PRODUCT_COLUMNS, page_size=10)
+    proxy = SortFilterProxyModel()
+    proxy.setSourceModel(model)
+    model.fetchMore()
+    assert proxy.rowCount() == 10
+
+    # Первая сортировка загружает ключи всех строк и значения колонки, дальше запросов нет
+    proxy.sort(4, Qt.DescendingOrder)
+    assert proxy.rowCount() == 25
+    assert [proxy.row_key(row) for row in range(3)] == [25, 24, 23]
+    counter.count = 0
+    proxy.sort(4, Qt.AscendingOrder)
+    assert counter.count == 0
+    # Значения новой колонки читаются одним запросом
+    proxy.set_column_filter(3, "букет 1")
+    assert counter.count == 1
+    assert [proxy.row_key(row) for row in range(proxy.rowCount())] == [2] + list(range(11, 21))
+    assert proxy.data(proxy.index(1, 4)) == "110.00"
+
+    # Изменение цены переносит строку на новое место, удаленная строка исчезает;
+    # ключ сортировки пересчитывается только для измененной строки
+    sort_keys = []
+    monkeypatch.setattr(table_models, "sort_key", lambda value: sort_keys.append(value) or sort_key(value))
+    session.get(Tovar, 11).cena = 1
+    session.delete(session.get(Tovar, 12))
+    session.commit()
+    model.apply_changes([RowChange("tovar", ChangeKind.UPDATED, 11), RowChange("tovar", ChangeKind.DELETED, 12)])
+    assert [proxy.row_key(row) for row in range(proxy.rowCount())] == [11, 2] + list(range(13, 21))
+    assert sort_keys == [1]
+    proxy.sort(4, Qt.DescendingOrder)
+    assert [proxy.row_key(row) for row in range(proxy.rowCount())] == list(range(20, 12, -1)) + [2, 11]
+
+    # Без сортировки и фильтров значения колонок не хранятся
+    proxy.sort(-1)
+    proxy.clear_filters()
+    assert not model._column_values
+    session.close()
+
+
+def test_supplier_rename_refreshes_rows_outside_page_cache():
+    """Кэш страниц ограничен; строки вытесненных страниц находятся и обновляются запросом по ключам."""
+    session, _ = make_session(30)
+    model = KeysetTableModel(session, products_query, Tovar.id, PRODUCT_COLUMNS, page_size=5, max_cached_pages=2)
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == 30 and sorted(model._pages) == [4, 5]
+
+    session.get(Postavshik, 1).nazvanie_postavshika = "Новое название"
+    session.commit()
+    keys = model.loaded_keys_where(Tovar.postavshik_id.in_([1]))
+    assert keys == [1]
+    model.refresh_keys(keys)
+    assert model.data(model.index(0, 5)) == "Новое название"
+    assert len(model._pages) <= 2
+    session.close()
+
+
+def test_stock_on_hand_from_snapshot_and_movement():
+    """Остаток = последняя инвентаризация + поступило - убыло; итоги по дням ведут триггеры."""
+    session, _ = make_session(2)
+    run_migrations(session.get_bind(), Base.metadata)
+    day = datetime.timedelta(days=1)
+    # Инвентаризация за день учитывает движение этого дня
+    assert stock_on_hand(session, REPORT_DATE) == {1: 0, 2: 1}
+    assert stock_on_hand(session, REPORT_DATE - day) == {1: 0, 2: 0}
+
+    session.add_all([
+        OtchetyPoPostuplenijuTovarov(
+            data_postuplenija=REPORT_DATE + day, kolithestvo_postupivshih_tovarov=10,
+            data_formirovaniya_otcheta=REPORT_DATE + day, tovar_id=1
+        ),
+        OtchetyPoUbytomuTovaru(
+            data_ubytija=REPORT_DATE + 2 * day, kolithestvo_ubytogo_tovara=3,
+            data_formirovaniya_otcheta=REPORT_DATE + 2 * day, tovar_id=1
+        ),
+    ])
+    session.commit()
+    assert stock_on_hand(session, REPORT_DATE + 2 * day)[1] == 7
+
+    # Изменение и удаление отчетов пересчитывают итоги дня
+    session.query(OtchetyPoPostuplenijuTovarov).filter_by(data_postuplenija=REPORT_DATE + day).update(
+        {"kolithestvo_postupivshih_tovarov": 20}
+    )
+    session.query(OtchetyPoUbytomuTovaru).filter_by(data_ubytija=REPORT_DATE + 2 * day).delete()
+    session.commit()
+    assert stock_on_hand(session, REPORT_DATE + 2 * day)[1] == 20
+
+    # Новая инвентаризация заменяет все движение до нее
+    session.add(OtchetyPoOstatkamTovarov(kolithestvo_tovara=50, data_formirovaniya_otcheta=REPORT_DATE + day, tovar_id=1))
+    session.commit()
+    assert stock_on_hand(session, REPORT_DATE + 2 * day)[1] == 50
+    assert stock_on_hand(session, REPORT_DATE)[1] == 0
+
+    # Товар удаляется вместе с отчетами: итоги движения не мешают удалению
+    session.query(OtchetyPoPostuplenijuTovarov).filter_by(tovar_id=2).delete()
+    session.query(OtchetyPoUbytomuTovaru).filter_by(tovar_id=2).delete()
+    session.query(OtchetyPoOstatkamTovarov).filter_by(tovar_id=2).delete()
+    session.query(Tovar).filter_by(id=2).delete()
+    session.commit()
+    assert stock_on_hand(session, REPORT_DATE) == {1: 0}
+    session.close()
+
+
+def test_order_totals_are_updated_per_edit_and_saved():
+    """Правка количества меняет итоги заказа на разницу; заказ сохраняется и читается по дате."""
+    session, _ = make_session(4)
+    order = OrderConversion.from_products(report_products(session))
+    assert str(order.price(1)) == "101.00"
+    order.set_quantity(1, 3)
+    order.set_quantity(3, 7)
+    order.set_quantity(1, 5)
+    assert order.line(1) == (Decimal("505.00"), Decimal("15.15"))
+    totals = (order.total_cents, order.discount_total_cents)
+    order.recompute()
+    assert (order.total_cents, order.discount_total_cents) == totals
+    assert order.total == Decimal("1226.00")
+
+    changes = ReportChangeSet(ZakazTovara, ZakazTovara.data_zakaza)
+    for row in (1, 3):
+        changes.set(order.product_ids[row], REPORT_DATE, kolithestvo=order.quantities[row], cena=order.price(row))
+    changes.flush(session)
+    order.remove_rows([3])
+    assert order.total == Decimal("505.00") and len(order) == 3
+
+    # Цена заказа сохраняется: изменение цены товара не меняет уже оформленный заказ
+    session.query(Tovar).filter_by(id=2).update({"cena": 500})
+    session.commit()
+    saved = order_rows_by_product(session, REPORT_DATE)
+    reloaded = OrderConversion.from_products(report_products(session), saved)
+    assert reloaded.line(1)[0] == Decimal("505.00")
+    rows = {row.id: row for row in iter_order_report_rows(session, REPORT_DATE)}
+    assert (rows[4].kolithestvo, rows[1].kolithestvo) == (7, None)
+    session.close()
+
+
+def test_bulk_delete_removes_rows_in_ranges():
+    """Несколько записей удаляются одним DELETE на порцию ключей, строки модели - диапазонами."""
+    session, counter = make_session(30)
+    model = KeysetTableModel(session, products_query, Tovar.id, PRODUCT_COLUMNS, page_size=30)
+    model.fetchMore()
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    counter.count = 0
+    assert delete_rows(session, Tovar, [4, 5, 6, 20, 5]) == 4
+    changes = session.info["row_changes"]
+    session.commit()
+    # Ссылки отчетов на удаленные товары обнулены, как при session.delete()
+    assert {(change.table, change.kind) for change in changes} == {
+        ("tovar", ChangeKind.DELETED), ("otchety_po_postupleniju_tovarov", ChangeKind.UPDATED),
+        ("otchety_po_ostatkom_tovarov", ChangeKind.UPDATED), ("otchety_po_ubytomu_tovaru", ChangeKind.UPDATED),
+    }
+    assert session.query(OtchetyPoOstatkamTovarov).filter_by(tovar_id=None).count() == 4
+    assert counter.count < 15
+
+    model.apply_changes(changes)
+    assert removed == [(19, 19), (3, 5)]
+    assert [model.row_key(row) for row in range(2, 5)] == [3, 7, 8]
+
+    assert delete_reports(
+        session, OtchetyPoUbytomuTovaru, OtchetyPoUbytomuTovaru.data_formirovaniya_otcheta, REPORT_DATE, range(1, 11)
+    ) == 7
+    session.commit()
+    assert session.query(OtchetyPoUbytomuTovaru).count() == 23
+    session.close()
+
+
+def test_expiring_stock_is_selected_by_date_range():
+    """Срок годности хранится в партии; выборка "истекает в ближайшие N дней" - по последним партиям."""
+    session, _ = make_session(5)
+    day = datetime.timedelta(days=1)
+    assert parse_expiry("10 дней", REPORT_DATE) == REPORT_DATE + 10 * day
+    assert parse_expiry("2025-05-01", REPORT_DATE) == datetime.date(2025, 5, 1)
+    assert parse_expiry(" ", REPORT_DATE) is None
+    with pytest.raises(ValueError):
+        parse_expiry("скоро", REPORT_DATE)
+
+    changes = ReportChangeSet(OtchetyPoOstatkamTovarov, OtchetyPoOstatkamTovarov.data_formirovaniya_otcheta)
+    for tovar_id, days in ((1, 1), (2, 2), (3, 30), (4, -1)):
+        changes.set(tovar_id, REPORT_DATE, kolithestvo_tovara=tovar_id - 1, srok_godnosti=REPORT_DATE + days * day)
+    # Новая партия товара 3 с коротким сроком заменяет прежнюю
+    changes.set(3, REPORT_DATE + day, kolithestvo_tovara=5, srok_godnosti=REPORT_DATE + 3 * day)
+    changes.flush(session)
+    assert stock_expiry(session, REPORT_DATE) == {
+        1: REPORT_DATE + day, 2: REPORT_DATE + 2 * day, 3: REPORT_DATE + 30 * day, 4: REPORT_DATE - day
+    }
+
+    # Товар 1 без остатка не попадает в список, просроченный товар 4 попадает
+    rows = expiring_stock_query(session, REPORT_DATE + day, 7).all()
+    assert [(row.id, row.kolithestvo_tovara) for row in rows] == [(4, 3), (2, 1), (3, 5)]
+    assert [row.id for row in expiring_stock_query(session, REPORT_DATE, 7).all()] == [4, 2]
+    session.close()
+
+
+def test_query_monitor_times_queries_per_screen(tmp_path):
+    """Запросы приписываются экрану; медленные пишутся в журнал; для отмеченного экрана доступен EXPLAIN."""
+    session, _ = make_session(5)
+    engine = session.get_bind()
+    monitor = QueryMonitor(slow_query_ms=0)
+    monitor.set_log_file(str(tmp_path / "slow.log"))
+    monitor.install(engine)
+    monitor.set_explain("Товары", True)
+    try:
+        with query_screen("Товары"):
+            products_query(session).all()
+            get_product(session, 1)
+        with query_screen("Поставщики"):
+            with pytest.raises(OperationalError):
+                session.execute(text("SELECT * FROM missing_table"))
+            session.rollback()
+            suppliers_query(session).all()
+            assert "query_start" not in session.connection().info
+    finally:
+        event.remove(engine, "before_cursor_execute", monitor._before_execute)
+        event.remove(engine, "after_cursor_execute", monitor._after_execute)
+        monitor.set_log_file(None)
+
+    stats = dict(monitor.snapshot())
+    assert stats["Товары"].count == 2 and stats["Поставщики"].count == 1
+    assert stats["Товары"].p50 <= stats["Товары"].p95 <= stats["Товары"].max_ms
+    log = (tmp_path / "slow.log").read_text(encoding="utf-8")
+    assert log.count("экран: Товары") == 2 and "экран: Поставщики" in log
+
+    plans = monitor.explain(engine, "Товары")
+    assert len(plans) == 2 and all(plan for _, plan in plans)
+    assert monitor.explain(engine, "Поставщики") == []
+    session.close()
+
+
+def test_profiler_wraps_slots_and_dumps_slow_actions(tmp_path, monkeypatch):
+    """Обработчики окна выполняются под профилировщиком; медленные действия сохраняются в .pstats."""
+    import pstats
+
+    class Window:
+        def load_data(self):
+            return sum(range(10_000))
+
+        def save_data(self, value):
+            return value
+
+        def mark_dirty(self):
+            return "не профилируется"
+
+    profiler = profiling.Profiler()
+    profiler.enabled, profiler.directory = True, str(tmp_path)
+    monkeypatch.setattr(profiling, "DUMP_THRESHOLD_MS", 0)
+    window = Window()
+    profiler.wrap_slots(window)
+    assert "mark_dirty" not in vars(window)
+    # Лишний аргумент сигнала (checked у clicked) отбрасывается
+    assert window.load_data(False) == sum(range(10_000))
+    assert window.save_data(5, False) == 5
+
+    dumps = sorted(tmp_path.glob("*.pstats"))
+    assert [path.name.split("_", 1)[1].rsplit("_", 1)[0] for path in dumps] == ["Window_load_data", "Window_save_data"]
+    assert pstats.Stats(str(dumps[0])).total_calls > 0
+    lines = profiler.summary_lines()
+    assert len(lines) == 3 and {line.split()[0] for line in lines[1:]} == {"Window.load_data", "Window.save_data"}
+    assert profiling.profile_directory(["--profile=out"], {}) == "out"
+    assert profiling.profile_directory([], {"APP_PROFILE": "1"}) == profiling.DEFAULT_PROFILE_DIR
+    assert profiling.profile_directory([], {}) is None
+
+
+def test_existing_address_is_resolved_without_updating_rows():
+    """Адрес, созданный другим пользователем, находится без изменения строк; у каждой базы свой справочник."""
+    session, _ = make_session(3)
+    run_migrations(session.get_bind(), Base.metadata)
+    # Одноименный город другой области - другой город
+    session.add(Gorod(nazvanie="Москва", sok_nazvanie="Мос", oblast=Oblast(nazvanie="Другая")))
+    session.commit()
+    stale = AddressIndex()
+    stale.ensure_loaded(session)
+    with address_index(session).transaction(session):
+        house_id = address_index(session).resolve(session, "Москва", "Ленина", 10)
+    stamp = datetime.datetime(2000, 1, 1)
+    session.query(DomStroenie).filter(DomStroenie.id == house_id).update({"updated_at": stamp})
+    session.commit()
+
+    # Справочник, загруженный раньше, не знает дома 10: при вставке срабатывает конфликт
+    with stale.transaction(session):
+        assert stale.resolve(session, "Москва", "Ленина", 10) == house_id
+    assert session.query(DomStroenie.updated_at).filter(DomStroenie.id == house_id).scalar() == stamp
+    assert session.query(DomStroenie).count() == 4
+    assert session.get(DomStroenie, house_id).ulica.gorod.oblast_id == 1
+
+    other, _ = make_session(1)
+    assert address_index(other) is not address_index(session)
+    assert address_index(session) is address_index(session)
+    session.close()
+    other.close()
+
@@ -0,0 +1,127 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from models import (
+    Connect, Oblast, Gorod, Ulica, DomStroenie, Postavshik, TipPostavshika, Tovar, TipTovara,
+    OtchetyPoPostuplenijuTovarov, DvizhenieTovara
+)
+from replica import Replica
+from change_events import ChangeKind, notifier
+from report_edits import ReportChangeSet
+from stock_ledger import stock_on_hand
+
+
+@pytest.fixture
+def databases(tmp_path):
+    central_url = f"sqlite:///{tmp_path / 'central.sqlite'}"
+    Connect.init_db(central_url)
+    central = sessionmaker(bind=Connect.get_engine(central_url))()
+    ulica = Ulica(nazvanie="Ленина", gorod=Gorod(nazvanie="Москва", sok_nazvanie="Мос", oblast=Oblast(nazvanie="Московская")))
+    supplier = Postavshik(
+        nazvanie_postavshika="Поставщик", tip_postavshika=TipPostavshika.OOO,
+        juridicheskij_adres_rel=DomStroenie(nomer=1, ulica=ulica)
+    )
+    central.add(Tovar(nazvanie=TipTovara.Buket, nomer=1, opisanie="Букет", cena=100, postavshik=supplier))
+    central.commit()
+
+    replica = Replica(tmp_path / "replica.sqlite", central_url)
+    replica.init_db()
+    local = sessionmaker(bind=Connect.get_engine(replica.url))()
+    yield central, local, replica
+    central.close()
+    local.close()
+    Connect.dispose()
+
+
+def test_sync_pulls_catalog_and_pushes_local_rows(databases):
+    central, local, replica = databases
+    replica.sync()
+    assert local.query(Tovar).one().opisanie == "Букет"
+
+    # Без связи: поставщик и товар создаются в реплике, а на сервере тем временем занимают тот же id
+    supplier = Postavshik(nazvanie_postavshika="Новый", tip_postavshika=TipPostavshika.IP, juridicheskij_adres=1)
+    local.add(Tovar(nazvanie=TipTovara.Cvetok, nomer=2, opisanie="Местный", cena=50, postavshik=supplier))
+    local.query(Tovar).filter_by(id=1).update({"cena": 120})
+    local.commit()
+    assert replica.pending_count() == 3
+    central.add(Postavshik(nazvanie_postavshika="Серверный", tip_postavshika=TipPostavshika.OOO, juridicheskij_adres=1))
+    central.commit()
+
+    changes = replica.sync()
+    local.expire_all()
+    assert replica.pending_count() == 0
+    assert {(change.table, change.kind) for change in changes} >= {
+        ("postavshik", ChangeKind.DELETED), ("postavshik", ChangeKind.INSERTED)
+    }
+    # Идентификаторы реплики совпадают с серверными, ссылки перенесены вместе с записями
+    central_rows = {s.nazvanie_postavshika: s.id for s in central.query(Postavshik)}
+    local_rows = {s.nazvanie_postavshika: s.id for s in local.query(Postavshik)}
+    assert local_rows == central_rows
+    product = central.query(Tovar).filter_by(opisanie="Местный").one()
+    assert product.postavshik_id == central_rows["Новый"]
+    assert local.query(Tovar).filter_by(id=product.id).one().postavshik_id == central_rows["Новый"]
+    assert central.query(Tovar).filter_by(id=1).one().cena == 120
+
+
+def test_sync_does_not_change_server_schema(databases):
+    """Синхронизация по таймеру только читает и пишет данные: схему сервера она не проверяет и не меняет."""
+    central, local, replica = databases
+    # Другое рабочее место: в его процессе init_db для сервера не вызывался
+    Connect._initialized_urls.clear()
+    statements = []
+    event.listen(
+        Connect.get_engine(replica.central_url), "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    replica.sync()
+    replica.sync()
+    assert statements
+    assert not [
+        statement for statement in statements
+        if "schema_version" in statement or statement.lstrip().upper().startswith(("CREATE", "ALTER", "DROP", "PRAGMA"))
+    ]
+
+
+def test_sync_applies_server_deletions(databases):
+    central, local, replica = databases
+    replica.sync()
+    central.add(Tovar(nazvanie=TipTovara.Buket, nomer=3, opisanie="Временный", cena=10, postavshik_id=1))
+    central.commit()
+    replica.sync()
+    product_id = local.query(Tovar).filter_by(opisanie="Временный").one().id
+
+    central.query(Tovar).filter_by(id=product_id).delete()
+    central.commit()
+    changes = replica.sync()
+    local.expire_all()
+    assert local.query(Tovar).filter_by(id=product_id).first() is None
+    assert any(change.kind is ChangeKind.DELETED and change.key == product_id for change in changes)
+
+
+def test_offline_report_edits_update_stock_and_notify(databases):
+    """Правки отчетов в реплике сразу меняют остатки и сообщают об изменениях (для синхронизации)."""
+    central, local, replica = databases
+    replica.sync()
+    day = datetime.date(2025, 4, 12)
+    received = []
+    notifier.rows_changed.connect(received.extend)
+    try:
+        changes = ReportChangeSet(OtchetyPoPostuplenijuTovarov, OtchetyPoPostuplenijuTovarov.data_postuplenija)
+        changes.set(1, day, kolithestvo_postupivshih_tovarov=7, data_formirovaniya_otcheta=day)
+        assert changes.flush(local) == 1
+    finally:
+        notifier.rows_changed.disconnect(received.extend)
+    assert [(change.table, change.kind) for change in received] == [
+        ("otchety_po_postupleniju_tovarov", ChangeKind.UPDATED)
+    ]
+    assert stock_on_hand(local, day) == {1: 7}
+
+    # Итоги движения реплика ведет сама: после синхронизации они не удваиваются и не отправляются
+    replica.sync()
+    assert stock_on_hand(local, day) == {1: 7}
+    assert local.query(DvizhenieTovara).count() == 1
+    assert stock_on_hand(central, day) == {1: 7}
+
@@ -0,0 +1,96 @@
+import threading
+import traceback
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from instrumentation import current_screen, query_screen
+from models import Connect
+from profiling import current_action, profiler
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    # Сигналы создаются в GUI-потоке, поэтому обработчики выполняются в нем же
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+    progress = Signal(int, int)  # выполнено, всего (0 - общее количество неизвестно)
+
+
+class Job(QRunnable):
+    """Фоновая задача для QThreadPool.
+
+    Функция fn вызывается в рабочем потоке как fn(job, *args, **kwargs) и может
+    сообщать о ходе работы через job.report_progress() и проверять отмену через
+    job.check_cancelled(). Результат передается в GUI-поток сигналом finished.
+    Запросы задачи приписываются экрану, с которого она запущена (instrumentation).
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+        self.screen = current_screen()
+        self.action = current_action()   # Для профиля: действие пользователя, запустившее задачу
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, done, total=0):
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            self.check_cancelled()
+            with query_screen(self.screen), profiler.span(f"{self.action or 'Задача'}: фоновая задача"):
+                result = self.fn(self, *self.args, **self.kwargs)
+            self.check_cancelled()
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            # Сессия рабочего потока возвращает соединение в общий пул
+            Connect.remove_session()
+
+
+# Ссылки на выполняющиеся задачи, чтобы их не удалил сборщик мусора
+_active_jobs = set()
+
+
+def run_in_background(fn, *args, on_finished=None, on_failed=None, on_cancelled=None, on_progress=None, screen=None,
+                      **kwargs):
+    job = Job(fn, *args, **kwargs)
+    if screen is not None:
+        job.screen = screen
+    if on_finished:
+        job.signals.finished.connect(on_finished)
+    if on_failed:
+        job.signals.failed.connect(on_failed)
+    if on_cancelled:
+        job.signals.cancelled.connect(on_cancelled)
+    if on_progress:
+        job.signals.progress.connect(on_progress)
+    # Ссылка освобождается в GUI-потоке после доставки результата
+    for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+        signal.connect(lambda *args: _active_jobs.discard(job))
+    _active_jobs.add(job)
+    QThreadPool.globalInstance().start(job)
+    return job